@@ -3,25 +3,144 @@ LOAN APPROVAL SYSTEM - FLASK APPLICATION
 Main web application with loan prediction and chatbot
 """
 
-from flask import Flask, render_template, request, jsonify, send_file, session
-from loanPredictor import predictor
-from chatbot import chatbot
+from startupTiming import startup_timer
+
+with startup_timer.phase('import flask'):
+    from flask import Flask, Response, g, render_template, request, jsonify, send_file, session, stream_with_context, url_for
+with startup_timer.phase('import predictor'):
+    from loanPredictor import predictor, validate_application
+from batchScoring import (
+    DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE, iter_csv_records, iter_ndjson_records,
+    score_chunks, to_csv, to_ndjson
+)
+from counterfactuals import ACTIONABLE_FEATURES, MAX_COUNTERFACTUALS, find_counterfactuals
+from metrics import (
+    CHAT_UPSTREAM_IN_FLIGHT, CONTENT_TYPE, ERRORS, REGISTRY, REPORT_JOBS_PENDING,
+    REQUEST_SECONDS, REQUESTS_IN_FLIGHT
+)
+from microBatcher import MicroBatcher
+from modelRegistry import ModelVersionError, model_registry
+from predictionStore import prediction_store
+from profiler import hot_sampler, request_profiler
+from reportJobs import report_jobs, QueueFullError
+from shadowScoring import ShadowScorer
 from datetime import datetime
+import contextlib
 import secrets
+import io
+import json
 import os
+import threading
+import time
 
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(16)
 
 # Initialize predictor at startup
 print("🔄 Loading model and encoder...")
-success = predictor.load_model()
+with startup_timer.phase('load model'):
+    success = predictor.load_model()
 if success:
     print("✓ Model and encoder loaded successfully")
 else:
     print("❌ Failed to load model and encoder")
     print("⚠️  Predictions will not work until model files are added to ./models/")
 
+# The chatbot (HTTP client, FAQ index, history store) loads on the first chat
+# request; LOAN_PRELOAD_CHAT=1 loads it at startup instead
+_chatbot = None
+_chatbot_lock = threading.Lock()
+
+def get_chatbot():
+    """Return the chatbot, importing and building it on first use"""
+    global _chatbot
+    if _chatbot is None:
+        with _chatbot_lock:
+            if _chatbot is None:
+                with startup_timer.phase('load chatbot'):
+                    from chatbot import chatbot
+                _chatbot = chatbot
+    return _chatbot
+
+if os.environ.get('LOAN_PRELOAD_CHAT', '0') == '1':
+    get_chatbot()
+
+# Optional micro-batching of concurrent /api/predict calls (LOAN_MICROBATCH=1)
+batcher = None
+if os.environ.get('LOAN_MICROBATCH', '0') == '1':
+    batcher = MicroBatcher(
+        predictor,
+        max_batch_size=int(os.environ.get('LOAN_MICROBATCH_MAX_ROWS', '32')),
+        max_wait_ms=float(os.environ.get('LOAN_MICROBATCH_WAIT_MS', '2'))
+    )
+    print(f"✓ Micro-batching enabled (window {batcher.max_wait * 1000:g} ms, up to {batcher.max_batch_size} rows)")
+
+# Optional polling of models/CURRENT: every process (each gunicorn worker
+# included) reloads on its own when the active model version changes
+MODEL_WATCH_SECONDS = float(os.environ.get('LOAN_MODEL_WATCH_SECONDS', '0'))
+if MODEL_WATCH_SECONDS > 0:
+    predictor.watch(MODEL_WATCH_SECONDS)
+
+# Optional champion-challenger comparison against LOAN_SHADOW_VERSION
+shadow = ShadowScorer.from_env()
+if shadow is not None:
+    predictor.set_shadow(shadow)
+    print(f"✓ Shadow scoring against model version {shadow.challenger.model_version}")
+
+# Model admin endpoints are disabled unless LOAN_ADMIN_TOKEN is set
+ADMIN_TOKEN = os.environ.get('LOAN_ADMIN_TOKEN') or None
+
+# Optional rolling sampler of the hottest model, report and chat functions
+if os.environ.get('LOAN_PROFILE_SAMPLER', '0') == '1':
+    hot_sampler.start()
+
+# Gauges read at scrape time
+REPORT_JOBS_PENDING.set_function(lambda: report_jobs.stats()['pending'])
+CHAT_UPSTREAM_IN_FLIGHT.set_function(lambda: _chatbot.client.in_flight if _chatbot is not None else 0)
+
+# Under multi-worker gunicorn, /metrics adds up every worker's values
+if os.environ.get('LOAN_METRICS_DIR'):
+    REGISTRY.share(os.environ['LOAN_METRICS_DIR'], float(os.environ.get('LOAN_METRICS_FLUSH_SECONDS', '1')))
+
+@app.before_request
+def _start_request_metrics():
+    g.metrics_endpoint = request.endpoint or 'unknown'
+    g.metrics_started = time.perf_counter()
+    REQUESTS_IN_FLIGHT.labels(g.metrics_endpoint).inc()
+
+@app.before_request
+def _start_request_profile():
+    # Opt-in: X-Profile-Token header or an endpoint armed via /admin/profile
+    if not request_profiler.enabled or g.metrics_endpoint.startswith('admin_'):
+        return
+    if not request_profiler.wanted(g.metrics_endpoint, request.headers.get('X-Profile-Token')):
+        return
+    g.profile_id = request_profiler.acquire(g.metrics_endpoint)
+    if g.profile_id is None:
+        return
+    g.profile = contextlib.ExitStack()
+    g.profile.callback(request_profiler.release)
+    g.profile.enter_context(request_profiler.profile(g.profile_id, f'{request.method} {request.path}'))
+
+@app.after_request
+def _count_server_errors(response):
+    if response.status_code >= 500:
+        ERRORS.labels('http').inc()
+    if 'profile_id' in g:
+        response.headers['X-Profile-Id'] = g.profile_id or 'rate-limited'
+    return response
+
+@app.teardown_request
+def _finish_request_metrics(exc):
+    # Runs after a streamed response has finished, so streams are timed in full
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.close()
+    endpoint = g.pop('metrics_endpoint', None)
+    if endpoint is not None:
+        REQUESTS_IN_FLIGHT.labels(endpoint).dec()
+        REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - g.pop('metrics_started'))
+
 @app.route('/')
 def index():
     """Render main page"""
@@ -34,28 +153,109 @@ def predict():
         data = request.json
 
         # Validate required fields
-        required_fields = [
-            'person_age', 'person_income', 'person_emp_exp', 'loan_amnt',
-            'cb_person_cred_hist_length', 'credit_score', 'person_gender',
-            'person_education', 'person_home_ownership', 'loan_intent',
-            'previous_loan_defaults_on_file'
-        ]
-
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'success': False, 'message': f'Missing field: {field}'}), 400
+        error = validate_application(data)
+        if error:
+            return jsonify({'success': False, 'message': error}), 400
 
         # Make prediction
-        result = predictor.make_prediction(data)
+        if batcher is not None:
+            result = batcher.submit(data)
+        else:
+            result = predictor.make_prediction(data)
 
-        # Store result in session for report generation
-        session['last_prediction'] = result
+        # Keep the result server-side; the session cookie only carries its id
+        prediction_id = prediction_store.put(result)
+        session['prediction_id'] = prediction_id
 
-        return jsonify({'success': True, 'result': result})
+        return jsonify({'success': True, 'result': result, 'prediction_id': prediction_id})
 
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    """Score an NDJSON or CSV upload in chunks and stream the results back"""
+    if predictor.model is None or predictor.encoder is None:
+        return jsonify({'success': False, 'message': 'Model not loaded. Please restart the application.'}), 500
+
+    input_formats = {
+        'application/x-ndjson': 'ndjson',
+        'application/jsonl': 'ndjson',
+        'text/csv': 'csv'
+    }
+    input_format = input_formats.get(request.mimetype)
+    if input_format is None:
+        return jsonify({'success': False, 'message': 'Content-Type must be application/x-ndjson or text/csv'}), 415
+
+    output_format = request.args.get('format', input_format)
+    if output_format not in ('ndjson', 'csv'):
+        return jsonify({'success': False, 'message': 'format must be ndjson or csv'}), 400
+
+    chunk_size = request.args.get('chunk_size', DEFAULT_CHUNK_SIZE, type=int)
+    if not 1 <= chunk_size <= MAX_CHUNK_SIZE:
+        return jsonify({'success': False, 'message': f'chunk_size must be between 1 and {MAX_CHUNK_SIZE}'}), 400
+
+    # Read the body line by line so memory stays flat for any upload size
+    if input_format == 'csv':
+        records = iter_csv_records(request.stream)
+    else:
+        records = iter_ndjson_records(request.stream)
+
+    chunks = score_chunks(records, predictor, chunk_size)
+    if output_format == 'csv':
+        return Response(stream_with_context(to_csv(chunks)), mimetype='text/csv')
+    return Response(stream_with_context(to_ndjson(chunks)), mimetype='application/x-ndjson')
+
+@app.route('/api/counterfactuals', methods=['POST'])
+def counterfactuals():
+    """Smallest changes to actionable features that would get an application approved
+
+    Takes an "application" in the JSON body, or a stored prediction by
+    prediction_id (falling back to the session's last prediction).
+    """
+    body = request.get_json(silent=True) or {}
+    application = body.get('application')
+    if application is None:
+        prediction = prediction_store.get(body.get('prediction_id') or session.get('prediction_id'))
+        if prediction is None:
+            return jsonify({'success': False, 'message': 'No application or prediction provided'}), 400
+        application = prediction['application_data']
+
+    error = validate_application(application)
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+
+    max_results = body.get('max_results', 3)
+    if not isinstance(max_results, int) or not 1 <= max_results <= MAX_COUNTERFACTUALS:
+        return jsonify({'success': False, 'message': f'max_results must be between 1 and {MAX_COUNTERFACTUALS}'}), 400
+
+    features = body.get('features')
+    if features is not None and (not isinstance(features, list) or not set(features) <= set(ACTIONABLE_FEATURES)):
+        return jsonify({'success': False, 'message': f'features must be a subset of {sorted(ACTIONABLE_FEATURES)}'}), 400
+
+    if predictor.model is None or predictor.encoder is None:
+        return jsonify({'success': False, 'message': 'Model not loaded. Please restart the application.'}), 500
+
+    try:
+        result = find_counterfactuals(predictor.pinned(), application, max_results, features)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify(dict(result, success=True))
+
+def _sse(event, payload):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def _chat_events(user_message, session_id, use_cache, prediction):
+    """SSE stream of the chatbot reply: delta events, then done or error"""
+    try:
+        for delta in get_chatbot().stream_response(user_message, session_id, use_cache, prediction):
+            yield _sse('delta', {'text': delta})
+        yield _sse('done', {'success': True})
+    except Exception as e:
+        yield _sse('error', {'success': False, 'message': f"Sorry, I encountered an error: {str(e)}"})
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Handle chatbot request"""
@@ -72,62 +272,126 @@ def chat():
 
         session_id = session['chat_session_id']
 
+        # "cache": false or Cache-Control: no-cache asks for a fresh answer
+        use_cache = data.get('cache', True) is not False and 'no-cache' not in request.headers.get('Cache-Control', '')
+
+        # Lets the local fallback answer questions about the applicant's result
+        prediction = prediction_store.get(session.get('prediction_id'))
+
+        # Stream the reply as Server-Sent Events when the client asks for it
+        if data.get('stream'):
+            return Response(
+                stream_with_context(_chat_events(user_message, session_id, use_cache, prediction)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+
         # Get response from chatbot
-        response = chatbot.get_response(user_message, session_id)
+        response = get_chatbot().get_response(user_message, session_id, use_cache, prediction)
 
         return jsonify(response)
 
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/download-report', methods=['GET'])
-def download_report():
-    """Generate and download visual report"""
-    try:
-        # Get last prediction from session
-        if 'last_prediction' not in session:
-            return jsonify({'success': False, 'message': 'No prediction available. Please submit an application first.'}), 400
-
-        result = session['last_prediction']
+# Seconds /api/download-report holds its request thread waiting for the job
+# before answering 202 with the job links. Kept short so a few legacy downloads
+# can't take every thread /api/predict needs; 0 answers 202 straight away
+REPORT_WAIT_SECONDS = float(os.environ.get('LOAN_REPORT_WAIT_SECONDS', '2'))
 
-        # Check if model is loaded
-        if predictor.model is None or predictor.encoder is None:
-            return jsonify({'success': False, 'message': 'Model not loaded. Please restart the application.'}), 500
+def _submit_report_job():
+    """Start (or join) the report job for a stored prediction
 
-        print("Generating visual report...")
+    The prediction is looked up by the prediction_id in the JSON body or query
+    string, falling back to the session's last prediction.
+    """
+    body = request.get_json(silent=True) or {}
+    prediction_id = body.get('prediction_id') or request.args.get('prediction_id') or session.get('prediction_id')
+    prediction = prediction_store.get(prediction_id)
+    if prediction is None:
+        return None, (jsonify({'success': False, 'message': 'No prediction available. Please submit an application first.'}), 400)
 
-        # Generate visual report (PNG image)
-        from reportGenerator import generate_loan_report
-
-        try:
-            report_buffer = generate_loan_report(
-                result,
-                predictor.model,
-                predictor.encoder,
-                predictor.expected_column_order
-            )
+    # Check if model is loaded
+    if predictor.model is None or predictor.encoder is None:
+        return None, (jsonify({'success': False, 'message': 'Model not loaded. Please restart the application.'}), 500)
 
-            print("Report generated successfully")
+    try:
+        # Keyed (and explained) by the model version that made the prediction
+        fingerprint = prediction.get('model_fingerprint') or predictor.model_fingerprint
+        # A profiled request also profiles its report in the worker process
+        job = report_jobs.submit(prediction, fingerprint, profile_id=g.get('profile_id'))
+    except QueueFullError:
+        response = jsonify({'success': False, 'message': 'Report queue is full. Please try again shortly.'})
+        return None, (response, 429, {'Retry-After': '5'})
+
+    return job, None
+
+def _job_response(job, code=200):
+    """JSON status for a report job, with its polling and download URLs"""
+    status = dict(job.to_dict(), success=job.status != 'failed')
+    status['status_url'] = url_for('report_status', job_id=job.id)
+    status['download_url'] = url_for('report_download', job_id=job.id)
+    return jsonify(status), code
+
+def _send_report(job):
+    filename = f'loan_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png'
+    response = send_file(
+        io.BytesIO(job.png),
+        mimetype='image/png',
+        as_attachment=True,
+        download_name=filename
+    )
+    if job.model_version is not None:
+        response.headers['X-Model-Version'] = job.model_version
+    return response
+
+@app.route('/api/reports', methods=['POST'])
+def create_report():
+    """Queue report generation and return a job id immediately"""
+    job, error = _submit_report_job()
+    if error:
+        return error
+    return _job_response(job, 202)
+
+@app.route('/api/reports/<job_id>', methods=['GET'])
+def report_status(job_id):
+    """Poll a report job"""
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown or expired report job'}), 404
+    return _job_response(job)
+
+@app.route('/api/reports/<job_id>/download', methods=['GET'])
+def report_download(job_id):
+    """Download a finished report"""
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown or expired report job'}), 404
+    if job.status == 'failed':
+        return _job_response(job, 500)
+    if job.status != 'done':
+        return _job_response(job, 202)
+    return _send_report(job)
 
-            # Make sure buffer is at the start
-            report_buffer.seek(0)
+@app.route('/api/download-report', methods=['GET'])
+def download_report():
+    """Generate and download visual report (waits for the report job)"""
+    try:
+        job, error = _submit_report_job()
+        if error:
+            return error
 
-            # Generate filename with timestamp
-            filename = f'loan_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png'
+        # The work runs in the report pool; this thread only waits briefly
+        # (cache hits and quick reports), then hands the client the job links
+        if not job.done.wait(REPORT_WAIT_SECONDS):
+            response, code = _job_response(job, 202)
+            return response, code, {'Retry-After': '1'}
 
-            # Send file as PNG
-            return send_file(
-                report_buffer,
-                mimetype='image/png',
-                as_attachment=True,
-                download_name=filename
-            )
+        if job.status == 'failed':
+            print(f"Report generation error: {job.error}")
+            return jsonify({'success': False, 'message': job.error}), 500
 
-        except Exception as report_error:
-            print(f"Report generation error: {str(report_error)}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({'success': False, 'message': f'Error generating report: {str(report_error)}'}), 500
+        return _send_report(job)
 
     except Exception as e:
         print(f"Download endpoint error: {str(e)}")
@@ -137,8 +401,125 @@ def download_report():
 
 @app.route('/health')
 def health():
-    """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'model_loaded': predictor.model is not None})
+    """Health check endpoint (503 until the model is loaded)"""
+    live = predictor.pinned()
+    model_loaded = live.model is not None
+    status = {'status': 'healthy' if model_loaded else 'unhealthy', 'model_loaded': model_loaded}
+    status['model_version'] = live.model_version
+    status['model_fingerprint'] = live.model_fingerprint
+    status['model_reload'] = predictor.reload_status
+    if shadow is not None:
+        status['shadow'] = shadow.stats()
+    if batcher is not None:
+        status['micro_batcher'] = batcher.stats()
+    status['predictions'] = prediction_store.stats()
+    # Reports are built (and cached) in the report workers
+    status['report_cache'] = report_jobs.cache_stats()
+    status['report_jobs'] = report_jobs.stats()
+    # Don't load the chatbot just to report on it
+    status['chat_loaded'] = _chatbot is not None
+    if _chatbot is not None:
+        status['chat_sessions'] = _chatbot.stats()
+        status['chat_cache'] = _chatbot.cache_stats()
+        status['chat_upstream'] = _chatbot.upstream_stats()
+        status['chat_fallback'] = _chatbot.fallback_stats()
+    status['startup_ms'] = startup_timer.timings()
+    return jsonify(status), 200 if model_loaded else 503
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics for this process (all workers when LOAN_METRICS_DIR is set)"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+def _profile_admin_error():
+    """404 while profiling is disabled, 403 without the right X-Profile-Token"""
+    if not request_profiler.enabled:
+        return jsonify({'success': False, 'message': 'Profiling is disabled'}), 404
+    if not request_profiler.authorized(request.headers.get('X-Profile-Token')):
+        return jsonify({'success': False, 'message': 'Invalid profiling token'}), 403
+    return None
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """Profiler status and recent profiles; POST arms profiling of the next requests to an endpoint"""
+    error = _profile_admin_error()
+    if error:
+        return error
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        endpoint = body.get('endpoint', 'download_report')
+        count = body.get('count', 1)
+        if endpoint not in app.view_functions or endpoint.startswith('admin_'):
+            return jsonify({'success': False, 'message': f'Unknown endpoint: {endpoint}'}), 400
+        if not isinstance(count, int) or not 1 <= count <= 100:
+            return jsonify({'success': False, 'message': 'count must be between 1 and 100'}), 400
+        request_profiler.arm(endpoint, count)
+    return jsonify(dict(request_profiler.stats(), success=True, recent=request_profiler.recent()))
+
+@app.route('/admin/profile/hot')
+def admin_profile_hot():
+    """Hottest functions of the model, report and chat modules (rolling window)"""
+    error = _profile_admin_error()
+    if error:
+        return error
+    return jsonify(hot_sampler.hottest(request.args.get('top', 20, type=int)))
+
+def _model_admin_error():
+    """404 while model admin is disabled, 403 without the right X-Admin-Token"""
+    if ADMIN_TOKEN is None:
+        return jsonify({'success': False, 'message': 'Model admin is disabled'}), 404
+    token = request.headers.get('X-Admin-Token')
+    if token is None or not secrets.compare_digest(token, ADMIN_TOKEN):
+        return jsonify({'success': False, 'message': 'Invalid admin token'}), 403
+    return None
+
+def _model_status():
+    live = predictor.pinned()
+    return {
+        'success': True,
+        'model_version': live.model_version,
+        'model_fingerprint': live.model_fingerprint,
+        'loaded_at': datetime.fromtimestamp(live.loaded_at).isoformat(timespec='seconds') if live.loaded_at else None,
+        'active_version': model_registry.active_version(),
+        'versions': model_registry.versions(),
+        'reload': predictor.reload_status,
+        'watch_seconds': MODEL_WATCH_SECONDS,
+        'shadow': shadow.stats() if shadow is not None else None
+    }
+
+@app.route('/admin/model')
+def admin_model():
+    """Live model version, registry contents and the last reload"""
+    error = _model_admin_error()
+    if error:
+        return error
+    return jsonify(_model_status())
+
+@app.route('/admin/model/reload', methods=['POST'])
+def admin_model_reload():
+    """Make a version active and load it in the background; requests keep being served meanwhile"""
+    error = _model_admin_error()
+    if error:
+        return error
+    body = request.get_json(silent=True) or {}
+    version = body.get('version')
+    if version is not None:
+        # Activating also moves every process that watches models/CURRENT
+        try:
+            model_registry.activate(version)
+        except ModelVersionError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+    if not predictor.reload_in_background(version):
+        return jsonify(dict(_model_status(), success=False, message='A reload is already running')), 409
+    return jsonify(_model_status()), 202
+
+@app.route('/ready')
+def ready():
+    """Readiness probe: 503 until the model and encoder have loaded"""
+    live = predictor.pinned()
+    if live.model is None or live.encoder is None:
+        return jsonify({'ready': False, 'message': 'Model not loaded'}), 503
+    return jsonify({'ready': True, 'model': live.model_fingerprint, 'model_version': live.model_version})
 
 if __name__ == '__main__':
     # Get script directory
@@ -0,0 +1,157 @@
+"""
+BATCH SCORING MODULE
+Chunked scoring of large application uploads (NDJSON / CSV)
+"""
+
+import csv
+import io
+import json
+from itertools import islice
+from loanPredictor import validate_application
+
+DEFAULT_CHUNK_SIZE = 1024
+MAX_CHUNK_SIZE = 100000
+
+# Fields parsed as numbers when reading CSV text
+NUMERIC_FIELDS = [
+    'person_age', 'person_income', 'person_emp_exp', 'loan_amnt',
+    'cb_person_cred_hist_length', 'credit_score'
+]
+
+CSV_OUTPUT_COLUMNS = ['line', 'id', 'success', 'prediction', 'probability', 'risk_factors', 'model_version', 'message']
+
+
+def _decode_lines(lines):
+    """Decode a binary line stream (e.g. request.stream) to text lines"""
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        yield line
+
+
+def _parse_number(value):
+    """Parse a CSV cell as int when possible, otherwise float"""
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def iter_ndjson_records(lines):
+    """Yield (line, record, error) for each non-blank NDJSON line"""
+    for line_no, line in enumerate(_decode_lines(lines), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f'Invalid JSON: {str(e)}'
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, 'Each line must be a JSON object'
+            continue
+        yield line_no, record, None
+
+
+def iter_csv_records(lines):
+    """Yield (line, record, error) for each CSV data row (header required)"""
+    reader = csv.DictReader(_decode_lines(lines))
+    for row in reader:
+        line_no = reader.line_num
+        # Empty cells count as missing so validation reports them
+        record = {k: v for k, v in row.items() if k is not None and v not in (None, '')}
+        try:
+            for field in NUMERIC_FIELDS:
+                if field in record:
+                    record[field] = _parse_number(record[field])
+        except ValueError:
+            yield line_no, None, f'Invalid number for {field}: {record[field]}'
+            continue
+        yield line_no, record, None
+
+
+def _result_row(line_no, record, result=None, error=None):
+    """Build the streamed output row for one input record"""
+    row = {'line': line_no}
+    if record is not None and 'id' in record:
+        row['id'] = record['id']
+    if error is not None:
+        row['success'] = False
+        row['message'] = error
+        return row
+    row['success'] = True
+    row['prediction'] = result['prediction']
+    row['probability'] = result['probability']
+    row['risk_factors'] = result['risk_factors']
+    row['model_version'] = result['model_version']
+    return row
+
+
+def score_chunks(records, predictor, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Score (line, record, error) tuples in fixed-size chunks
+
+    Each chunk is validated, scored with one predict_proba call and yielded as
+    a list of output rows in input order. If a chunk fails to encode (e.g. an
+    unknown category), its rows are rescored one by one to isolate the bad rows.
+    The whole stream is scored by the model version live when it started.
+    """
+    predictor = predictor.pinned()
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+
+        rows = [None] * len(chunk)
+        valid = []
+        for i, (line_no, record, error) in enumerate(chunk):
+            if error is None:
+                error = validate_application(record)
+            if error is not None:
+                rows[i] = _result_row(line_no, record, error=error)
+            else:
+                valid.append(i)
+
+        applications = [chunk[i][1] for i in valid]
+        try:
+            results = predictor.predict_batch(applications)
+        except Exception:
+            results = []
+            for application in applications:
+                try:
+                    results.append(predictor.make_prediction(application))
+                except Exception as e:
+                    results.append(e)
+
+        for i, result in zip(valid, results):
+            line_no, record, _ = chunk[i]
+            if isinstance(result, Exception):
+                rows[i] = _result_row(line_no, record, error=str(result))
+            else:
+                rows[i] = _result_row(line_no, record, result)
+
+        yield rows
+
+
+def to_ndjson(chunks):
+    """Serialize scored chunks as NDJSON text, one string per chunk"""
+    for rows in chunks:
+        yield ''.join(json.dumps(row) + '\n' for row in rows)
+
+
+def to_csv(chunks):
+    """Serialize scored chunks as CSV text, one string per chunk"""
+    header = True
+    for rows in chunks:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=CSV_OUTPUT_COLUMNS)
+        if header:
+            writer.writeheader()
+            header = False
+        for row in rows:
+            if 'risk_factors' in row:
+                row = dict(row, risk_factors='; '.join(row['risk_factors']))
+            writer.writerow(row)
+        yield buffer.getvalue()
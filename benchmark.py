@@ -0,0 +1,318 @@
+"""
+BENCHMARK SUITE
+Latency, throughput and memory of the prediction, explanation, report and chat paths
+
+Usage:
+    python benchmark.py                                # every suite, benchmark_results.json
+    python benchmark.py --suites predict,render --quick
+    python benchmark.py --output new.json --compare baseline.json --threshold 0.15
+
+Each case reports p50/p95/p99 latency, throughput and the peak Python heap
+(tracemalloc) of a separate traced pass. With --compare, cases whose p50 or
+p95 grew (or throughput fell) by more than --threshold are flagged and the
+exit status is 1.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from benchmarkBackends import make_corpus
+
+SUITES = ('predict', 'explain', 'render', 'api', 'chat')
+
+CHAT_QUESTIONS = [
+    "How can I improve my credit score?",
+    "What is a good debt-to-income ratio for a personal loan?",
+    "Should I pay off my credit card or save for an emergency fund?",
+    "How much of my income should go to rent?",
+    "What is the difference between APR and interest rate?",
+    "Is it better to consolidate debt with a personal loan?",
+    "How do I start budgeting my monthly salary?",
+    "How long does a late payment stay on my credit report?"
+]
+
+
+def synthetic_applications(predictor, n, seed=0):
+    """n random applicant dicts, as /api/predict would receive them"""
+    columns = make_corpus(predictor, n, seed)
+    return [
+        {feature: values[i].item() if hasattr(values[i], 'item') else values[i]
+         for feature, values in columns.items()}
+        for i in range(n)
+    ]
+
+
+def measure(fn, iterations, warmup=1, rows=1, trace_iterations=3):
+    """Time fn() iterations times; rows is how many items one call handles"""
+    for _ in range(warmup):
+        fn()
+
+    timings = np.empty(iterations)
+    started = time.perf_counter()
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings[i] = time.perf_counter() - start
+    elapsed = time.perf_counter() - started
+
+    # Separate traced pass: tracemalloc slows calls down, so it is not timed
+    tracemalloc.start()
+    for _ in range(min(trace_iterations, iterations)):
+        fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(timings * 1000.0, [50, 95, 99])
+    return {
+        'iterations': iterations,
+        'rows_per_call': rows,
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'mean_ms': float(timings.mean() * 1000.0),
+        'throughput_per_s': iterations * rows / elapsed,
+        'peak_heap_mb': peak / (1024.0 * 1024.0)
+    }
+
+
+def _cycle(items):
+    """Callable returning the next item of items on every call"""
+    state = {'i': -1}
+
+    def next_item():
+        state['i'] = (state['i'] + 1) % len(items)
+        return items[state['i']]
+    return next_item
+
+
+def bench_predict(predictor, scale):
+    applications = synthetic_applications(predictor, 2000)
+    next_application = _cycle(applications)
+    results = {
+        'predict.single': measure(lambda: predictor.make_prediction(next_application()), 1000 * scale)
+    }
+    for size in (100, 10000):
+        batch = synthetic_applications(predictor, size, seed=size)
+        results[f'predict.batch_{size}'] = measure(
+            lambda: predictor.predict_batch(batch), max(3, 20 * scale * 100 // size), rows=size
+        )
+    return results
+
+
+def bench_explain(predictor, scale):
+    from reportGenerator import LoanExplainer
+    applications = synthetic_applications(predictor, 50, seed=1)
+    results = {}
+    for backend, iterations in (('lime', 5 * scale), ('shap', 100 * scale)):
+        explainer = LoanExplainer(predictor.model, predictor.encoder, predictor.expected_column_order, backend=backend)
+        explainer.initialize_explainer()
+        pairs = _cycle([(a, predictor.make_prediction(a)) for a in applications])
+
+        def explain():
+            application, prediction = pairs()
+            explainer.explain_prediction(application, prediction)
+        results[f'explain.{backend}'] = measure(explain, iterations)
+    return results
+
+
+def bench_render(predictor, scale):
+    from reportGenerator import LoanExplainer, UltraModernVisualizer
+    applications = synthetic_applications(predictor, 20, seed=2)
+    explainer = LoanExplainer(predictor.model, predictor.encoder, predictor.expected_column_order, backend='shap')
+    reports = _cycle([
+        (explainer.explain_prediction(a, predictor.make_prediction(a)), a) for a in applications
+    ])
+    visualizer = UltraModernVisualizer()
+    results = {}
+    for dpi in (72, 150, 300):
+        results[f'render.dpi_{dpi}'] = measure(
+            lambda: visualizer.create_report(*reports(), dpi=dpi), 5 * scale
+        )
+    return results
+
+
+def bench_api(predictor, scale):
+    from app import app, report_jobs
+    client = app.test_client()
+    applications = synthetic_applications(predictor, 1000, seed=3)
+    next_application = _cycle(applications)
+
+    def predict():
+        response = client.post('/api/predict', json=next_application())
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    def download_report():
+        # A fresh applicant each time, so the report cache never answers
+        predict()
+        response = client.get('/api/download-report')
+        # Slower reports answer 202 with the job links; follow them to the PNG
+        while response.status_code == 202:
+            time.sleep(0.05)
+            response = client.get(response.get_json()['download_url'])
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    try:
+        return {
+            'api.predict': measure(predict, 500 * scale),
+            # The report is built in the report worker pool; its memory is not traced here
+            'api.download_report': measure(download_report, 5 * scale, warmup=2, trace_iterations=1)
+        }
+    finally:
+        report_jobs.shutdown()
+
+
+class _StubChatHandler(BaseHTTPRequestHandler):
+    """OpenAI-style chat completion endpoint with a fixed delay"""
+    latency = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.latency)
+        body = json.dumps({'choices': [{'message': {'role': 'assistant', 'content': 'Keep your DTI below 36%.'}}]})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+
+def bench_chat(predictor, scale, latency_ms=0.0):
+    from chatbot import FinanceChatbot
+    from inferenceClient import ChatCompletionClient
+    from conversationStore import InMemoryConversationStore
+
+    _StubChatHandler.latency = latency_ms / 1000.0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        bot = FinanceChatbot(store=InMemoryConversationStore())
+        bot.client = ChatCompletionClient(url=f'http://127.0.0.1:{server.server_port}/v1/chat/completions')
+        question = _cycle(CHAT_QUESTIONS)
+        turn = {'n': 0}
+
+        def first_turn(use_cache):
+            # A new session per call, so history never grows
+            turn['n'] += 1
+            response = bot.get_response(question(), f'bench-{turn["n"]}', use_cache=use_cache)
+            assert response['success'] and not response.get('fallback'), response
+
+        return {
+            'chat.get_response': measure(lambda: first_turn(False), 200 * scale),
+            'chat.get_response_cached': measure(lambda: first_turn(True), 200 * scale)
+        }
+    finally:
+        server.shutdown()
+
+
+def compare(results, baseline, threshold):
+    """Cases that got slower (or lost throughput) by more than threshold"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            if current[key] > previous[key] * (1.0 + threshold):
+                regressions.append((name, key, previous[key], current[key]))
+        if current['throughput_per_s'] < previous['throughput_per_s'] / (1.0 + threshold):
+            regressions.append((name, 'throughput_per_s', previous['throughput_per_s'], current['throughput_per_s']))
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark prediction, explanation, report and chat paths')
+    parser.add_argument('--suites', default=','.join(SUITES), help=f'comma-separated subset of {",".join(SUITES)}')
+    parser.add_argument('--quick', action='store_true', help='fewer iterations (smoke run)')
+    parser.add_argument('--output', default='benchmark_results.json', help='where to write the JSON results')
+    parser.add_argument('--compare', help='baseline JSON from an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative slowdown flagged as a regression')
+    parser.add_argument('--chat-latency-ms', type=float, default=0.0, help='delay added by the stub chat server')
+    args = parser.parse_args()
+
+    suites = [s.strip() for s in args.suites.split(',') if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+    scale = 1 if args.quick else 4
+
+    from loanPredictor import LoanPredictor
+    predictor = LoanPredictor()
+    if not predictor.load_model():
+        print("❌ Failed to load model and encoder")
+        return 1
+
+    runners = {
+        'predict': bench_predict,
+        'explain': bench_explain,
+        'render': bench_render,
+        'api': bench_api,
+        'chat': lambda p, s: bench_chat(p, s, args.chat_latency_ms)
+    }
+    results = {}
+    for suite in suites:
+        print(f"▶ {suite}...", flush=True)
+        # The app and report generator print progress for every call
+        with contextlib.redirect_stdout(io.StringIO()):
+            results.update(runners[suite](predictor, scale))
+
+    print(f"\n{'case':<28}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'per s':>12}{'heap MB':>10}")
+    for name, r in results.items():
+        print(f"{name:<28}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+              f"{r['throughput_per_s']:>12,.1f}{r['peak_heap_mb']:>10.1f}")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'model_backend': predictor.backend,
+            'model_fingerprint': predictor.model_fingerprint,
+            'quick': args.quick,
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for name, key, before, after in regressions:
+                print(f"   • {name} {key}: {before:.3f} → {after:.3f}")
+            return 1
+        print(f"✓ No regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
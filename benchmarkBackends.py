@@ -0,0 +1,159 @@
+"""
+MODEL BACKEND BENCHMARK
+Checks that the compiled NumPy backend matches XGBoost and compares latency and memory
+
+Usage:
+    python benchmarkBackends.py [--rows 100000] [--single 2000] [--tolerance 1e-4]
+
+Each backend runs in its own fresh process, so the reported RSS only includes
+what that backend imports and loads.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+
+BACKENDS = ('xgboost', 'compiled')
+
+
+def make_corpus(predictor, n_rows, seed=0):
+    """Random applications covering every category and wide numeric ranges"""
+    rng = np.random.default_rng(seed)
+    columns = {
+        'person_age': rng.integers(18, 80, n_rows),
+        'person_income': rng.integers(8000, 400000, n_rows),
+        'person_emp_exp': rng.integers(0, 40, n_rows),
+        'loan_amnt': rng.integers(500, 60000, n_rows),
+        'cb_person_cred_hist_length': rng.integers(0, 30, n_rows),
+        'credit_score': rng.integers(300, 851, n_rows)
+    }
+    for feature, categories in predictor._category_index.items():
+        columns[feature] = rng.choice(np.array(list(categories), dtype=object), n_rows)
+    return columns
+
+
+def _rss_mb():
+    """Resident set size of this process in MB"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024.0
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_backend(backend, n_rows, n_single, output_path):
+    """Time one backend in this process and save its probabilities and margins"""
+    import time
+    from loanPredictor import LoanPredictor
+
+    started = time.perf_counter()
+    predictor = LoanPredictor(backend=backend)
+    if not predictor.load_model():
+        raise RuntimeError(f"Failed to load the {backend} backend")
+    predictor.model.set_params(n_jobs=1)
+    load_seconds = time.perf_counter() - started
+
+    columns = make_corpus(predictor, n_rows)
+    matrix = predictor.encode_columns(columns)
+
+    started = time.perf_counter()
+    probabilities, _ = predictor.score_matrix(matrix)
+    batch_seconds = time.perf_counter() - started
+
+    # The base_score each backend actually serves with, to explain a mismatch
+    if backend == 'compiled':
+        base_score = 1.0 / (1.0 + np.exp(-predictor.model.base_margin))
+    else:
+        config = json.loads(predictor.model.get_booster().save_config())
+        base_score = float(str(config['learner']['learner_model_param']['base_score']).strip('[]'))
+    np.savez(output_path, probability=probabilities, decision=probabilities >= predictor.THRESHOLD)
+
+    applications = [
+        {feature: values[i].item() if hasattr(values[i], 'item') else values[i] for feature, values in columns.items()}
+        for i in range(min(n_single, n_rows))
+    ]
+    predictor.make_prediction(applications[0])
+    timings = []
+    for application in applications:
+        started = time.perf_counter()
+        predictor.make_prediction(application)
+        timings.append(time.perf_counter() - started)
+    timings = np.array(timings) * 1000.0
+
+    return {
+        'backend': backend,
+        'base_score': float(base_score),
+        'xgboost_imported': 'xgboost' in sys.modules,
+        'load_ms': load_seconds * 1000.0,
+        'batch_rows_per_s': n_rows / batch_seconds,
+        'single_p50_ms': float(np.percentile(timings, 50)),
+        'single_p99_ms': float(np.percentile(timings, 99)),
+        'rss_mb': _rss_mb()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the xgboost and compiled model backends')
+    parser.add_argument('--rows', type=int, default=100000, help='rows in the batch corpus')
+    parser.add_argument('--single', type=int, default=2000, help='single-row predictions to time')
+    parser.add_argument('--tolerance', type=float, default=1e-4, help='largest allowed probability difference')
+    parser.add_argument('--worker', choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_backend(args.worker, args.rows, args.single, args.output)))
+        return 0
+
+    results = {}
+    outputs = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in BACKENDS:
+            output = os.path.join(tmp, f'{backend}.npz')
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--worker', backend,
+                 '--rows', str(args.rows), '--single', str(args.single), '--output', output],
+                capture_output=True, text=True
+            )
+            if completed.returncode != 0:
+                print(completed.stderr, file=sys.stderr)
+                return 1
+            results[backend] = json.loads(completed.stdout.strip().splitlines()[-1])
+            with np.load(output) as saved:
+                outputs[backend] = dict(saved)
+
+    print(f"{'':<22}" + ''.join(f"{backend:>14}" for backend in BACKENDS))
+    rows = [
+        ('load (ms)', 'load_ms', '{:14.1f}'),
+        ('batch (rows/s)', 'batch_rows_per_s', '{:14,.0f}'),
+        ('single p50 (ms)', 'single_p50_ms', '{:14.3f}'),
+        ('single p99 (ms)', 'single_p99_ms', '{:14.3f}'),
+        ('RSS (MB)', 'rss_mb', '{:14.1f}'),
+        ('xgboost imported', 'xgboost_imported', '{!s:>14}')
+    ]
+    for label, key, fmt in rows:
+        print(f"{label:<22}" + ''.join(fmt.format(results[backend][key]) for backend in BACKENDS))
+
+    xgb, compiled = outputs['xgboost'], outputs['compiled']
+    difference = np.abs(xgb['probability'] - compiled['probability']).max()
+    flipped = int(np.count_nonzero(xgb['decision'] != compiled['decision']))
+    print(f"\nmax |p_xgboost - p_compiled| over {len(xgb['probability']):,} rows: {difference:.2e}")
+    print(f"approve/reject decisions that differ: {flipped:,}")
+
+    base_scores = results['xgboost']['base_score'], results['compiled']['base_score']
+    if not np.isclose(*base_scores, rtol=1e-6):
+        print(f"base_score served: xgboost {base_scores[0]:g}, compiled {base_scores[1]:g}")
+
+    if flipped or difference > args.tolerance:
+        print(f"❌ Backends differ (tolerance {args.tolerance:g}, {flipped:,} different decisions)")
+        return 1
+    print(f"✓ Backends agree within {args.tolerance:g} with identical decisions")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,13 +3,19 @@ FINANCIAL CHATBOT MODULE
 Provides chatbot functionality for Flask application
 """
 
-from huggingface_hub import InferenceClient
+import os
+from conversationStore import store_from_env, trim_history
+from inferenceClient import ChatCompletionClient, UpstreamError
+from fallbackResponder import FallbackResponder
+from responseCache import ResponseCache
 
 # Your HuggingFace API token
 API_TOKEN = "YOUR_API_TOKEN"
 
+OFF_TOPIC_MESSAGE = "I'm a finance-focused assistant. I can only help with financial topics like budgeting, investing, loans, taxes, etc. Do you have any finance-related questions?"
+
 # Finance-only system instruction
-SYSTEM_PROMPT = """You are a financial advisor chatbot. You ONLY answer questions related to:
+SYSTEM_PROMPT = f"""You are a financial advisor chatbot. You ONLY answer questions related to:
 - Personal finance (budgeting, saving, investing)
 - Banking and loans
 - Stock market and trading
@@ -19,58 +25,181 @@ SYSTEM_PROMPT = """You are a financial advisor chatbot. You ONLY answer question
 - Financial planning
 - Credit cards and debt
 
-If someone asks a non-finance question, politely tell them: "I'm a finance-focused assistant. I can only help with financial topics like budgeting, investing, loans, taxes, etc. Do you have any finance-related questions?"
+If someone asks a non-finance question, politely tell them: "{OFF_TOPIC_MESSAGE}"
 
 Be helpful, accurate, and professional. Keep responses concise and clear."""
 
+CHAT_MODEL = "meta-llama/Llama-3.2-3B-Instruct"
 
-class FinanceChatbot:
-    def __init__(self):
-        self.client = InferenceClient(token=API_TOKEN)
-        self.conversation_history = {}
+# Per-session history budget in characters (about 4 characters per token);
+# the system prompt is sent on every call and does not count against it
+MAX_HISTORY_CHARS = int(os.environ.get('LOAN_CHAT_MAX_HISTORY_CHARS', '6000'))
+
+# Seconds to wait for the remote model (first chunk when streaming) before
+# answering from the local fallback instead
+RESPONSE_DEADLINE = float(os.environ.get('LOAN_CHAT_DEADLINE', '8'))
 
-    def get_response(self, user_message, session_id="default"):
+
+class FinanceChatbot:
+    def __init__(self, store=None, max_history_chars=MAX_HISTORY_CHARS, cache=None,
+                 fallback=None, deadline=RESPONSE_DEADLINE):
+        self.client = ChatCompletionClient.from_env(token=API_TOKEN)
+        self.store = store if store is not None else store_from_env()
+        self.max_history_chars = max_history_chars
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+        self.fallback = fallback if fallback is not None else FallbackResponder()
+        self.deadline = deadline
+
+    def _start_turn(self, user_message, session_id):
+        """Stored history plus the new user turn, trimmed to budget"""
+        history = self.store.get(session_id)
+        history.append({
+            "role": "user",
+            "content": user_message
+        })
+        return trim_history(history, self.max_history_chars)
+
+    def _finish_turn(self, session_id, history, bot_message):
+        """Save the completed turn"""
+        history.append({
+            "role": "assistant",
+            "content": bot_message
+        })
+        self.store.save(session_id, trim_history(history, self.max_history_chars))
+
+    def _messages(self, history):
+        return [{"role": "system", "content": SYSTEM_PROMPT}] + history
+
+    def _cached_answer(self, history, use_cache):
+        """Cached reply for a first-turn question (the model sees only the system prompt and it)"""
+        if len(history) != 1:
+            return None
+        if not use_cache:
+            self.cache.record_bypass()
+            return None
+        return self.cache.get(history[0]['content'])
+
+    def _local_answer(self, history):
+        """Answer without a remote call when the question is clearly off-topic"""
+        if len(history) == 1 and self.fallback.is_off_topic(history[0]['content']):
+            return OFF_TOPIC_MESSAGE
+        return None
+
+    def _remember_answer(self, history, bot_message):
+        if len(history) == 1:
+            self.cache.put(history[0]['content'], bot_message)
+
+    def get_response(self, user_message, session_id="default", use_cache=True, prediction=None):
         """Send message to chatbot and get response"""
         try:
-            # Initialize conversation history for this session if not exists
-            if session_id not in self.conversation_history:
-                self.conversation_history[session_id] = []
-                self.conversation_history[session_id].append({
-                    "role": "system",
-                    "content": SYSTEM_PROMPT
-                })
-
-            # Add user message
-            self.conversation_history[session_id].append({
-                "role": "user",
-                "content": user_message
-            })
-
-            # Get response from model
-            response = self.client.chat_completion(
-                model="meta-llama/Llama-3.2-3B-Instruct",
-                messages=self.conversation_history[session_id],
-                max_tokens=500,
-                temperature=0.7
-            )
-
-            bot_message = response.choices[0].message.content
+            # Stored history holds only user/assistant turns, trimmed to budget
+            history = self._start_turn(user_message, session_id)
+
+            # A local refusal is not saved, so the model never sees it as its own turn
+            local = self._local_answer(history)
+            if local is not None:
+                return {"success": True, "message": local}
+
+            cached = self._cached_answer(history, use_cache)
+            if cached is not None:
+                self._finish_turn(session_id, history, cached)
+                return {"success": True, "message": cached, "cached": True}
+
+            # Get response from model, or from the local fallback if it is late or down
+            try:
+                response = self.client.chat_completion(
+                    model=CHAT_MODEL,
+                    messages=self._messages(history),
+                    max_tokens=500,
+                    temperature=0.7,
+                    timeout=self.deadline
+                )
+            except UpstreamError:
+                bot_message = self.fallback.answer(user_message, prediction)
+                self._finish_turn(session_id, history, bot_message)
+                return {"success": True, "message": bot_message, "fallback": True}
+
+            bot_message = response['choices'][0]['message']['content']
 
             # Add bot response to history
-            self.conversation_history[session_id].append({
-                "role": "assistant",
-                "content": bot_message
-            })
+            self._remember_answer(history, bot_message)
+            self._finish_turn(session_id, history, bot_message)
 
             return {"success": True, "message": bot_message}
 
         except Exception as e:
             return {"success": False, "message": f"Sorry, I encountered an error: {str(e)}"}
 
+    def stream_response(self, user_message, session_id="default", use_cache=True, prediction=None):
+        """
+        Yield the reply in pieces as the model generates them.
+
+        The turn is saved to the history only once the stream has finished, so
+        an error or a client disconnect mid-reply leaves the history unchanged.
+        If the model fails before its first chunk the local fallback answer is
+        yielded instead; later errors are raised to the caller.
+        """
+        history = self._start_turn(user_message, session_id)
+
+        local = self._local_answer(history)
+        if local is not None:
+            yield local
+            return
+
+        cached = self._cached_answer(history, use_cache)
+        if cached is not None:
+            yield cached
+            self._finish_turn(session_id, history, cached)
+            return
+
+        stream = self.client.chat_completion(
+            model=CHAT_MODEL,
+            messages=self._messages(history),
+            max_tokens=500,
+            temperature=0.7,
+            stream=True,
+            timeout=self.deadline
+        )
+
+        parts = []
+        try:
+            for chunk in stream:
+                choices = chunk.get('choices') or [{}]
+                delta = choices[0].get('delta', {}).get('content')
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except UpstreamError:
+            if parts:
+                raise
+            bot_message = self.fallback.answer(user_message, prediction)
+            yield bot_message
+            self._finish_turn(session_id, history, bot_message)
+            return
+
+        bot_message = ''.join(parts)
+        self._remember_answer(history, bot_message)
+        self._finish_turn(session_id, history, bot_message)
+
     def clear_history(self, session_id="default"):
         """Clear conversation history for a session"""
-        if session_id in self.conversation_history:
-            del self.conversation_history[session_id]
+        self.store.delete(session_id)
+
+    def stats(self):
+        """Session store counters plus the history budget"""
+        return dict(self.store.stats(), max_history_chars=self.max_history_chars)
+
+    def cache_stats(self):
+        """First-turn response cache counters"""
+        return self.cache.stats()
+
+    def fallback_stats(self):
+        """Local fallback and off-topic counters"""
+        return self.fallback.stats()
+
+    def upstream_stats(self):
+        """Inference client counters and circuit breaker state"""
+        return self.client.stats()
 
 
 # Create global instance
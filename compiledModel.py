@@ -0,0 +1,294 @@
+"""
+COMPILED MODEL MODULE
+Scores the XGBoost loan model with NumPy only, from flattened tree arrays
+"""
+
+import importlib.metadata
+import re
+import numpy as np
+
+# UBJSON scalar markers used by XGBoost's .ubj format (all big-endian)
+_UBJ_NUMBERS = {
+    'i': np.dtype('>i1'), 'U': np.dtype('>u1'), 'I': np.dtype('>i2'),
+    'l': np.dtype('>i4'), 'L': np.dtype('>i8'), 'd': np.dtype('>f4'), 'D': np.dtype('>f8')
+}
+
+# Objectives whose margin goes through the logistic function
+_LOGISTIC_OBJECTIVES = ('binary:logistic', 'reg:logistic')
+
+# XGBoost 3.1+ writes base_score as a one-element vector ("[2.2E-1]"); older
+# releases can't parse that form and silently fall back to the default 0.5
+DEFAULT_BASE_SCORE = 0.5
+_VECTOR_BASE_SCORE_VERSION = (3, 1)
+
+
+def installed_xgboost_version():
+    """(major, minor) of the installed xgboost package, read without importing it; None if absent"""
+    try:
+        version = importlib.metadata.version('xgboost')
+    except importlib.metadata.PackageNotFoundError:
+        return None
+    return tuple(int(part) for part in re.findall(r'\d+', version)[:2])
+
+
+def served_base_score(raw, xgboost_version):
+    """The base_score an xgboost release serves for a stored learner_model_param value
+
+    With xgboost_version None (not installed) the stored value is used as is.
+    """
+    raw = str(raw)
+    if raw.startswith('['):
+        if xgboost_version is not None and xgboost_version < _VECTOR_BASE_SCORE_VERSION:
+            return DEFAULT_BASE_SCORE
+        raw = raw.strip('[]')
+    return float(raw)
+
+
+class _UBJReader:
+    """Minimal UBJSON decoder; typed arrays come back as NumPy arrays"""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def _marker(self):
+        marker = chr(self.data[self.pos])
+        self.pos += 1
+        return marker
+
+    def _number(self, marker):
+        dtype = _UBJ_NUMBERS[marker]
+        value = np.frombuffer(self.data, dtype, 1, self.pos)[0]
+        self.pos += dtype.itemsize
+        return value.item()
+
+    def _length(self):
+        return int(self._number(self._marker()))
+
+    def _string(self):
+        length = self._length()
+        value = self.data[self.pos:self.pos + length].decode('utf-8')
+        self.pos += length
+        return value
+
+    def value(self, marker=None):
+        marker = marker or self._marker()
+        if marker in _UBJ_NUMBERS:
+            return self._number(marker)
+        if marker == 'S':
+            return self._string()
+        if marker == '{':
+            return self._object()
+        if marker == '[':
+            return self._array()
+        if marker in 'TF':
+            return marker == 'T'
+        if marker == 'Z':
+            return None
+        raise ValueError(f"Unsupported UBJSON marker {marker!r} at byte {self.pos - 1}")
+
+    def _container_header(self):
+        """Optional $type and #count of an optimized container"""
+        item_type = count = None
+        if chr(self.data[self.pos]) == '$':
+            self.pos += 1
+            item_type = self._marker()
+        if chr(self.data[self.pos]) == '#':
+            self.pos += 1
+            count = self._length()
+        return item_type, count
+
+    def _array(self):
+        item_type, count = self._container_header()
+        if count is not None and item_type in _UBJ_NUMBERS:
+            dtype = _UBJ_NUMBERS[item_type]
+            values = np.frombuffer(self.data, dtype, count, self.pos).astype(dtype.newbyteorder('='))
+            self.pos += dtype.itemsize * count
+            return values
+        if count is not None:
+            return [self.value(item_type) for _ in range(count)]
+        values = []
+        while chr(self.data[self.pos]) != ']':
+            values.append(self.value())
+        self.pos += 1
+        return values
+
+    def _object(self):
+        item_type, count = self._container_header()
+        result = {}
+        if count is not None:
+            for _ in range(count):
+                key = self._string()
+                result[key] = self.value(item_type)
+            return result
+        while chr(self.data[self.pos]) != '}':
+            key = self._string()
+            result[key] = self.value()
+        self.pos += 1
+        return result
+
+
+def read_ubj(path):
+    """Decode an XGBoost .ubj model file into nested dicts and arrays"""
+    with open(path, 'rb') as f:
+        return _UBJReader(f.read()).value()
+
+
+# Trees are padded to complete binary trees, so memory grows as 2 ** depth
+MAX_DEPTH = 16
+
+
+class CompiledForest:
+    """
+    A gradient-boosted binary classifier flattened into node arrays.
+
+    Every tree is padded to a complete binary tree of the forest's depth and
+    stored level by level, so the children of node i are 2i+1 and 2i+2 and a
+    row is routed through all trees at once with a few NumPy gathers per
+    level, without importing xgboost. Splits follow XGBoost's rule: go left
+    when x < threshold (float32), or when x is missing and default_left is set.
+    Padding nodes always go left and copy their leaf value to both sides.
+    """
+
+    def __init__(self, feature, threshold, default_left, value, depth, base_margin,
+                 feature_names=None, chunk_size=128):
+        self.feature = feature
+        self.threshold = threshold
+        self.default_left = default_left
+        self.value = value
+        self.depth = depth
+        self.base_margin = base_margin
+        self.feature_names = feature_names
+        self.n_features = None if feature_names is None else len(feature_names)
+        self.chunk_size = chunk_size
+
+        # Offsets of each tree in the flattened node and leaf arrays
+        n_trees, n_internal = feature.shape
+        self._node_base = np.arange(n_trees, dtype=np.intp) * n_internal
+        self._leaf_base = np.arange(n_trees, dtype=np.intp) * value.shape[1] - n_internal
+        self._feature = feature.ravel()
+        self._threshold = threshold.ravel()
+        self._default_left = default_left.ravel()
+        self._value = value.ravel()
+
+    @classmethod
+    def from_json_model(cls, model, xgboost_version='installed'):
+        """Compile a parsed XGBoost model (save_raw('json') or .ubj contents)
+
+        base_score is read the way the installed xgboost reads it, so both
+        backends serve the same probabilities from the same file; pass
+        xgboost_version=None to use the stored value regardless.
+        """
+        learner = model['learner']
+        objective = learner['objective']['name']
+        if objective not in _LOGISTIC_OBJECTIVES:
+            raise ValueError(f"Unsupported objective: {objective}")
+        booster = learner['gradient_booster']
+        if booster['name'] != 'gbtree':
+            raise ValueError(f"Unsupported booster: {booster['name']}")
+        params = learner['learner_model_param']
+        if int(params.get('num_class', 0)) > 1 or int(params.get('num_target', 1)) > 1:
+            raise ValueError("Only single-output binary models are supported")
+
+        trees = booster['model']['trees']
+        for tree in trees:
+            if np.any(np.asarray(tree['split_type']) != 0):
+                raise ValueError("Categorical splits are not supported")
+        depth = max(cls._tree_depth(tree['left_children']) for tree in trees)
+        if depth > MAX_DEPTH:
+            raise ValueError(f"Trees deeper than {MAX_DEPTH} levels are not supported (got {depth})")
+
+        n_internal = 2 ** depth - 1
+        feature = np.zeros((len(trees), n_internal), dtype=np.intp)
+        threshold = np.full((len(trees), n_internal), np.inf, dtype=np.float32)
+        default_left = np.ones((len(trees), n_internal), dtype=bool)
+        value = np.zeros((len(trees), n_internal + 1), dtype=np.float32)
+
+        for t, tree in enumerate(trees):
+            left = tree['left_children']
+            right = tree['right_children']
+            # For leaves, split_conditions holds the leaf weight
+            conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+            # (source node, position in the complete tree, level)
+            stack = [(0, 0, 0)]
+            while stack:
+                node, position, level = stack.pop()
+                if left[node] != -1:
+                    feature[t, position] = tree['split_indices'][node]
+                    threshold[t, position] = conditions[node]
+                    default_left[t, position] = bool(tree['default_left'][node])
+                    stack.append((left[node], 2 * position + 1, level + 1))
+                    stack.append((right[node], 2 * position + 2, level + 1))
+                else:
+                    # Every complete-tree leaf under this position gets the weight
+                    span = 2 ** (depth - level)
+                    first = (position + 1) * span - 1 - n_internal
+                    value[t, first:first + span] = conditions[node]
+
+        # base_score is stored in probability space for logistic objectives
+        if xgboost_version == 'installed':
+            xgboost_version = installed_xgboost_version()
+        base_score = served_base_score(params['base_score'], xgboost_version)
+        stored = served_base_score(params['base_score'], None)
+        if base_score != stored:
+            print(f"⚠️  Model file has base_score {stored:g}, but xgboost "
+                  f"{'.'.join(map(str, xgboost_version))} serves it with {base_score:g}; "
+                  "the compiled backend follows xgboost")
+        base_margin = float(np.log(base_score / (1.0 - base_score)))
+
+        feature_names = learner.get('feature_names') or None
+        return cls(feature, threshold, default_left, value, depth, base_margin, feature_names)
+
+    @classmethod
+    def from_ubj(cls, path, xgboost_version='installed'):
+        """Compile straight from a .ubj model file"""
+        return cls.from_json_model(read_ubj(path), xgboost_version)
+
+    @staticmethod
+    def _tree_depth(left):
+        """Longest root-to-leaf path (in splits) of one tree, from its left-child array"""
+        left = np.asarray(left)
+        depth = np.zeros(len(left), dtype=np.intp)
+        # XGBoost numbers children after their parents
+        for node in np.flatnonzero(left != -1):
+            depth[left[node]] = depth[left[node] + 1] = depth[node] + 1
+        return int(depth.max())
+
+    @property
+    def n_trees(self):
+        return len(self.feature)
+
+    def _margin_chunk(self, matrix):
+        position = np.zeros((len(matrix), self.n_trees), dtype=np.intp)
+        has_missing = np.isnan(matrix).any()
+        for _ in range(self.depth):
+            node = position + self._node_base
+            x = np.take_along_axis(matrix, self._feature[node], axis=1)
+            go_right = x >= self._threshold[node]
+            if has_missing:
+                go_right = np.where(np.isnan(x), ~self._default_left[node], go_right)
+            position *= 2
+            position += 1
+            position += go_right
+        return self._value[position + self._leaf_base].sum(axis=1, dtype=np.float64) + self.base_margin
+
+    def predict_margin(self, matrix):
+        """Raw (log-odds) scores for an encoded model matrix"""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if matrix.ndim != 2 or (self.n_features is not None and matrix.shape[1] != self.n_features):
+            raise ValueError(f"Expected a matrix with {self.n_features} columns, got shape {matrix.shape}")
+        # Small row chunks keep the (rows x trees) working arrays in cache
+        margins = np.empty(len(matrix), dtype=np.float64)
+        for start in range(0, len(matrix), self.chunk_size):
+            stop = start + self.chunk_size
+            margins[start:stop] = self._margin_chunk(matrix[start:stop])
+        return margins
+
+    def predict_proba(self, matrix):
+        """Class probabilities, shaped like XGBClassifier.predict_proba"""
+        positive = 1.0 / (1.0 + np.exp(-self.predict_margin(matrix)))
+        return np.column_stack([1.0 - positive, positive])
+
+    def set_params(self, **params):
+        """Accepts XGBClassifier parameters such as n_jobs; NumPy scoring ignores them"""
+        return self
@@ -0,0 +1,171 @@
+"""
+CONVERSATION STORE MODULE
+Bounded chat history storage for the financial chatbot
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqliteConnection import ForkSafeSQLite
+
+
+def history_chars(messages):
+    """Size of a message list in characters (roughly 4 characters per token)"""
+    return sum(len(message['content']) for message in messages)
+
+
+def trim_history(messages, max_chars):
+    """
+    Drop the oldest turns until the history fits in max_chars.
+
+    The most recent message is always kept, and a leading assistant reply is
+    dropped with its user message so the history still starts with a user turn.
+    """
+    messages = list(messages)
+    total = history_chars(messages)
+    while len(messages) > 1 and total > max_chars:
+        total -= len(messages.pop(0)['content'])
+        while len(messages) > 1 and messages[0]['role'] != 'user':
+            total -= len(messages.pop(0)['content'])
+    return messages
+
+
+class InMemoryConversationStore:
+    """In-process store with a session limit, idle TTL and LRU eviction"""
+
+    def __init__(self, max_sessions=1000, idle_ttl=1800):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self.expired = 0
+        self.evicted = 0
+
+    def _expire(self, now):
+        # Least recently used sessions sit at the front
+        while self._sessions:
+            session_id, (last_access, _) = next(iter(self._sessions.items()))
+            if now - last_access <= self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self.expired += 1
+
+    def get(self, session_id):
+        """Return the stored messages for a session (empty list if none)"""
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return []
+            self._sessions[session_id] = (now, entry[1])
+            self._sessions.move_to_end(session_id)
+            return list(entry[1])
+
+    def save(self, session_id, messages):
+        """Replace a session's messages, evicting the least recently used sessions"""
+        with self._lock:
+            now = time.time()
+            self._sessions[session_id] = (now, list(messages))
+            self._sessions.move_to_end(session_id)
+            self._expire(now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            chars = sum(history_chars(messages) for _, messages in self._sessions.values())
+            return {
+                'backend': 'memory',
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'history_chars': chars,
+                'expired': self.expired,
+                'evicted': self.evicted
+            }
+
+
+class SQLiteConversationStore(ForkSafeSQLite):
+    """SQLite-backed store with the same limits, shareable between processes"""
+
+    def __init__(self, path, max_sessions=1000, idle_ttl=1800):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS chat_sessions ('
+            'session_id TEXT PRIMARY KEY, messages TEXT NOT NULL, '
+            'chars INTEGER NOT NULL, last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_last_access ON chat_sessions (last_access)')
+        self._conn.commit()
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, session_id):
+        with self._lock:
+            now = time.time()
+            row = self._conn.execute(
+                'SELECT messages FROM chat_sessions WHERE session_id = ? AND last_access >= ?',
+                (session_id, now - self.idle_ttl)
+            ).fetchone()
+            if row is None:
+                return []
+            self._conn.execute('UPDATE chat_sessions SET last_access = ? WHERE session_id = ?', (now, session_id))
+            self._conn.commit()
+            return json.loads(row[0])
+
+    def save(self, session_id, messages):
+        with self._lock:
+            now = time.time()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO chat_sessions (session_id, messages, chars, last_access) VALUES (?, ?, ?, ?)',
+                (session_id, json.dumps(messages), history_chars(messages), now)
+            )
+            cursor = self._conn.execute('DELETE FROM chat_sessions WHERE last_access < ?', (now - self.idle_ttl,))
+            self.expired += cursor.rowcount
+            cursor = self._conn.execute(
+                'DELETE FROM chat_sessions WHERE session_id IN ('
+                'SELECT session_id FROM chat_sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+                (self.max_sessions,)
+            )
+            self.evicted += cursor.rowcount
+            self._conn.commit()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._conn.execute('DELETE FROM chat_sessions WHERE session_id = ?', (session_id,))
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            sessions, chars = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(chars), 0) FROM chat_sessions'
+            ).fetchone()
+            return {
+                'backend': 'sqlite',
+                'sessions': sessions,
+                'max_sessions': self.max_sessions,
+                'history_chars': chars,
+                'expired': self.expired,
+                'evicted': self.evicted
+            }
+
+
+def store_from_env():
+    """Build the conversation store from LOAN_CHAT_* environment variables"""
+    max_sessions = int(os.environ.get('LOAN_CHAT_MAX_SESSIONS', '1000'))
+    idle_ttl = float(os.environ.get('LOAN_CHAT_IDLE_TTL', '1800'))
+    if os.environ.get('LOAN_CHAT_STORE', 'memory') == 'sqlite':
+        path = os.environ.get('LOAN_CHAT_SQLITE_PATH', 'chat_sessions.db')
+        return SQLiteConversationStore(path, max_sessions, idle_ttl)
+    return InMemoryConversationStore(max_sessions, idle_ttl)
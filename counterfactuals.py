@@ -0,0 +1,255 @@
+"""
+COUNTERFACTUALS MODULE
+Finds the smallest changes to actionable features that would get an application approved
+"""
+
+import itertools
+import time
+import numpy as np
+from loanPredictor import FEATURE_NAMES
+from metrics import STAGE_SECONDS
+
+_COUNTERFACTUAL_SECONDS = STAGE_SECONDS.labels('counterfactual')
+
+
+def _loan_fine(v):
+    return np.round(v * (1.0 - 0.05 * np.arange(1, 19)), -2)
+
+
+def _income_fine(v):
+    return np.round(v * (1.0 + 0.05 * np.arange(1, 21)), -3)
+
+
+# What an applicant can change, and in which direction. 'fine' grids are
+# searched one feature at a time, 'coarse' grids in combinations; 'unit' is
+# one step of effort (10% of the loan, 20 credit points, a year, ...)
+ACTIONABLE_FEATURES = {
+    'loan_amnt': {
+        'label': 'Loan amount', 'direction': -1, 'minimum': 500,
+        'fine': _loan_fine,
+        'coarse': lambda v: np.round(v * (1.0 - np.array([0.1, 0.25, 0.4, 0.6])), -2),
+        'unit': lambda v: 0.1 * v
+    },
+    'credit_score': {
+        'label': 'Credit score', 'direction': 1, 'maximum': 850,
+        'fine': lambda v: v + 10 * np.arange(1, 56),
+        'coarse': lambda v: v + np.array([25, 50, 100, 150]),
+        'unit': lambda v: 20.0
+    },
+    'cb_person_cred_hist_length': {
+        'label': 'Credit history', 'direction': 1, 'maximum': 30,
+        'fine': lambda v: v + np.arange(1, 11),
+        'coarse': lambda v: v + np.array([1, 2, 4, 6]),
+        'unit': lambda v: 1.0
+    },
+    'person_income': {
+        'label': 'Annual income', 'direction': 1,
+        'fine': _income_fine,
+        'coarse': lambda v: np.round(v * np.array([1.1, 1.25, 1.5]), -3),
+        'unit': lambda v: 0.1 * v
+    },
+    'person_emp_exp': {
+        'label': 'Employment', 'direction': 1, 'maximum': 50,
+        'fine': lambda v: v + np.arange(1, 11),
+        'coarse': lambda v: v + np.array([1, 2, 4]),
+        'unit': lambda v: 1.0
+    }
+}
+
+# Features that only grow with time; the applicant ages by the largest wait
+_YEARS_FEATURES = ('cb_person_cred_hist_length', 'person_emp_exp')
+
+# Extra cost per changed feature, so one bigger change beats several small ones
+CHANGE_PENALTY = 1.0
+
+# Rows per predict_proba call
+BATCH_SIZE = 4096
+
+# Most options one search returns
+MAX_COUNTERFACTUALS = 10
+
+
+def _grid(feature, base, kind):
+    """Candidate values of one feature, moving away from base in its direction only"""
+    spec = ACTIONABLE_FEATURES[feature]
+    values = np.asarray(spec[kind](float(base)), dtype=np.float64)
+    values = np.clip(values, spec.get('minimum', -np.inf), spec.get('maximum', np.inf))
+    values = np.unique(values)
+    return values[values < base] if spec['direction'] < 0 else values[values > base]
+
+
+def _candidate_grid(base, features, max_changes):
+    """Changed-value arrays for every single-feature step and coarse combination"""
+    fine = {f: _grid(f, base[f], 'fine') for f in features}
+    coarse = {f: _grid(f, base[f], 'coarse') for f in features}
+
+    blocks = [{f: fine[f]} for f in features if len(fine[f])]
+    for k in range(2, max_changes + 1):
+        for combo in itertools.combinations(features, k):
+            grids = [coarse[f] for f in combo]
+            if all(len(g) for g in grids):
+                mesh = np.meshgrid(*grids, indexing='ij')
+                blocks.append({f: m.ravel() for f, m in zip(combo, mesh)})
+
+    n_rows = sum(len(next(iter(block.values()))) for block in blocks)
+    values = {f: np.full(n_rows, float(base[f])) for f in features}
+    offset = 0
+    for block in blocks:
+        size = len(next(iter(block.values())))
+        for f, v in block.items():
+            values[f][offset:offset + size] = v
+        offset += size
+    return values
+
+
+class _Scorer:
+    """Encodes candidate columns and scores them in large predict_proba batches"""
+
+    def __init__(self, predictor, application):
+        self.predictor = predictor
+        self.application = application
+        self.rows = 0
+        self.batches = 0
+
+    def __call__(self, values):
+        n_rows = len(next(iter(values.values())))
+        columns = {}
+        for feature in FEATURE_NAMES:
+            if feature == 'loan_percent_income':
+                continue
+            if feature in values:
+                columns[feature] = values[feature]
+            elif isinstance(self.application[feature], str):
+                columns[feature] = np.full(n_rows, self.application[feature], dtype=object)
+            else:
+                columns[feature] = np.full(n_rows, float(self.application[feature]))
+
+        # Waiting for more history or experience makes the applicant older too
+        waited = np.zeros(n_rows)
+        for feature in _YEARS_FEATURES:
+            if feature in values:
+                waited = np.maximum(waited, values[feature] - float(self.application[feature]))
+        columns['person_age'] = columns['person_age'] + waited
+
+        matrix = self.predictor.encode_columns(columns)
+        probabilities = np.empty(n_rows)
+        for start in range(0, n_rows, BATCH_SIZE):
+            probabilities[start:start + BATCH_SIZE] = self.predictor.model.predict_proba(
+                matrix[start:start + BATCH_SIZE]
+            )[:, 1]
+            self.batches += 1
+        self.rows += n_rows
+        return probabilities
+
+
+def _costs(values, base, units):
+    cost = np.zeros(len(next(iter(values.values()))))
+    changed = np.zeros_like(cost)
+    for f, v in values.items():
+        delta = np.abs(v - float(base[f]))
+        cost += delta / units[f]
+        changed += delta > 0
+    return cost + CHANGE_PENALTY * changed
+
+
+def find_counterfactuals(predictor, application, max_results=3, features=None, max_changes=3):
+    """
+    Cheapest ways to move an application over predictor.THRESHOLD.
+
+    Every single-feature step and coarse combinations of up to max_changes
+    features are scored together, the cheapest approved candidates with
+    different sets of changed features are kept, and each is then tightened
+    one feature at a time (one batch per round) to the smallest change that
+    still gets approved. Returns the current probability and a list of
+    options, each with its changes, probability and cost.
+    """
+    started = time.perf_counter()
+    with _COUNTERFACTUAL_SECONDS.time():
+        features = [f for f in (features or ACTIONABLE_FEATURES) if f in ACTIONABLE_FEATURES]
+        base = {f: float(application[f]) for f in features}
+        units = {f: ACTIONABLE_FEATURES[f]['unit'](base[f]) for f in features}
+        score = _Scorer(predictor, application)
+
+        values = _candidate_grid(base, features, max_changes)
+        # Row 0 is the application as submitted
+        values = {f: np.concatenate([[base[f]], v]) for f, v in values.items()}
+        probabilities = score(values)
+        probability = float(probabilities[0])
+        threshold = predictor.THRESHOLD
+
+        options = []
+        if probability < threshold:
+            approved = np.flatnonzero(probabilities >= threshold)
+            costs = _costs(values, base, units)
+            chosen_sets = []
+            for i in approved[np.argsort(costs[approved], kind='stable')]:
+                changed = frozenset(f for f in features if values[f][i] != base[f])
+                # A cheaper option already covers a subset of these changes
+                if any(s <= changed for s in chosen_sets):
+                    continue
+                chosen_sets.append(changed)
+                options.append({'values': {f: values[f][i] for f in features},
+                                'probability': float(probabilities[i])})
+                if len(options) == max_results:
+                    break
+            _tighten(options, base, features, score, threshold)
+
+    for option in options:
+        cost = _costs({f: np.array([option['values'][f]]) for f in features}, base, units)[0]
+        option['cost'] = round(float(cost), 3)
+    options.sort(key=lambda option: option['cost'])
+
+    return {
+        'approved': probability >= threshold,
+        'probability': probability,
+        'threshold': threshold,
+        'model_version': predictor.model_version,
+        'counterfactuals': [
+            {
+                'changes': [
+                    {'feature': f, 'label': ACTIONABLE_FEATURES[f]['label'],
+                     'from': _plain(base[f]), 'to': _plain(option['values'][f])}
+                    for f in features if option['values'][f] != base[f]
+                ],
+                'probability': option['probability'],
+                'cost': option['cost']
+            }
+            for option in options
+        ],
+        'candidates_scored': score.rows,
+        'batches': score.batches,
+        'search_ms': round((time.perf_counter() - started) * 1000.0, 2)
+    }
+
+
+def _tighten(options, base, features, score, threshold):
+    """Per feature, pull each option back to the smallest fine-grid change still approved"""
+    for feature in features:
+        rows = []
+        for index, option in enumerate(options):
+            current = option['values'][feature]
+            if current == base[feature]:
+                continue
+            steps = _grid(feature, base[feature], 'fine')
+            # Values between the application and the option's current value
+            steps = steps[steps > current] if ACTIONABLE_FEATURES[feature]['direction'] < 0 else steps[steps < current]
+            rows.extend((index, step) for step in steps)
+        if not rows:
+            continue
+
+        values = {f: np.array([options[index]['values'][f] for index, _ in rows]) for f in features}
+        values[feature] = np.array([step for _, step in rows])
+        probabilities = score(values)
+
+        # Smallest change per option: grids run outward from the application
+        for (index, step), p in zip(rows, probabilities):
+            option = options[index]
+            if p >= threshold and abs(step - base[feature]) < abs(option['values'][feature] - base[feature]):
+                option['values'][feature] = step
+                option['probability'] = float(p)
+
+
+def _plain(value):
+    """JSON-friendly number: int when whole"""
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 2)
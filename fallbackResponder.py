@@ -0,0 +1,190 @@
+"""
+FALLBACK RESPONDER MODULE
+Local answers for the chatbot when the remote model is slow or unavailable
+"""
+
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+import numpy as np
+
+FAQ_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'finance_faq.json')
+
+FALLBACK_NOTICE = "Our advisor model is busy right now, so here is a quick answer from our finance guide:"
+
+UNAVAILABLE_MESSAGE = (
+    "I couldn't find a ready answer to that in our finance guide. "
+    "Please try again in a moment, or ask about credit scores, loans, budgeting, investing, insurance or taxes."
+)
+
+STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be because been before being below between both but
+by can could did do does doing down during each few for from further had has have having he her here hers
+how i if in into is it its just me more most my no nor not now of off on once only or other our out over
+own same she should so some such than that the their them then there these they this those through to too
+under until up very was we were what when where which while who whom why will with would you your yours
+hi hello hey thanks thank please ok okay tell know explain get give want need much many really
+""".split())
+
+# Words that on their own mark a question as finance-related
+FINANCE_TERMS = frozenset("""
+account accounts afford annual apr approval approve approved asset assets bank banking banks bill bills
+bitcoin bond bonds borrow borrowing broker budget budgeting business capital car card cards cash charge
+collateral consolidate consolidation cosigner cost costs credit crypto cryptocurrency currency debt debts
+decline declined deduction default defaults deposit dividend dividends dollar dollars down dti earn earning
+economy education eligibility eligible emergency employment equity etf expense expenses fee fees finance
+financial financing fund funds home house income inflation installment insurance interest invest investing
+investment investments ira lend lender lenders lending loan loans market medical money mortgage mortgages
+net owe own payment payments pay paycheck pension personal portfolio premium price principal profit rate
+rates refinance reject rejected rent rental retire retirement return returns risk salary save saving
+savings score scores spend spending stock stocks student tax taxes trade trading tuition venture wage
+wages wealth worth
+""".split())
+
+# Words that clearly place a question outside finance. Only these let a
+# question be refused locally; anything else goes to the model, which knows
+# the finance topics (tickers, coins, account types, tax forms) no list covers
+OFF_TOPIC_TERMS = frozenset("""
+recipe recipes baking ingredient ingredients dessert pizza pasta
+movie movies film films actor actress celebrity celebrities song songs lyrics singer album poem poems poetry
+joke jokes riddle riddles football soccer basketball baseball cricket tennis golf nba nfl fifa olympics
+horoscope zodiac astrology dinosaur dinosaurs galaxy planet planets
+puppy puppies kitten kittens anime cartoon cartoons videogame videogames minecraft fortnite
+""".split())
+
+# Words that suggest the question is about the applicant's own result
+APPLICATION_WORDS = frozenset("""
+my me i mine application approval approved approve chance chances eligible eligibility rejected reject
+declined denied result results risk why prediction assessment
+""".split())
+
+_WORD = re.compile(r"[a-z0-9%$]+")
+
+
+def _words(text):
+    return _WORD.findall(text.lower())
+
+
+def _stem(word):
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def _terms(words):
+    return [_stem(w) for w in words if w not in STOPWORDS]
+
+
+class FallbackResponder:
+    """
+    TF-IDF retrieval over a bundled finance FAQ, plus a summary of the
+    applicant's last prediction. Everything runs in-process in well under a
+    millisecond, so it can answer when the remote model misses its deadline.
+    """
+
+    def __init__(self, faq_path=FAQ_PATH, min_score=0.2):
+        self.min_score = min_score
+        self._finance_stems = frozenset(_stem(w) for w in FINANCE_TERMS)
+        self._off_topic_stems = frozenset(_stem(w) for w in OFF_TOPIC_TERMS)
+        self._lock = threading.Lock()
+        self.answered = 0
+        self.off_topic = 0
+
+        try:
+            with open(faq_path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Chat fallback FAQ not loaded: {str(e)}")
+            self.entries = []
+        self._build_index()
+
+    def _build_index(self):
+        """Unit-length TF-IDF rows, one per FAQ entry; question words count three times"""
+        documents = [
+            Counter(_terms(_words(entry['question'])) * 3 + _terms(_words(entry['answer'])))
+            for entry in self.entries
+        ]
+        document_frequency = Counter(term for document in documents for term in document)
+        self._vocabulary = {term: i for i, term in enumerate(sorted(document_frequency))}
+        n_documents = max(len(documents), 1)
+        self._idf = np.array([
+            math.log((1 + n_documents) / (1 + document_frequency[term])) + 1.0
+            for term in sorted(document_frequency)
+        ])
+        self._matrix = np.zeros((len(documents), len(self._vocabulary)))
+        for row, document in enumerate(documents):
+            for term, count in document.items():
+                self._matrix[row, self._vocabulary[term]] = 1.0 + math.log(count)
+        self._matrix *= self._idf
+        norms = np.linalg.norm(self._matrix, axis=1, keepdims=True)
+        self._matrix /= np.where(norms > 0, norms, 1.0)
+
+    def search(self, question):
+        """Best matching FAQ entry and its cosine similarity, or (None, 0.0)"""
+        query = np.zeros(len(self._vocabulary))
+        for term, count in Counter(_terms(_words(question))).items():
+            index = self._vocabulary.get(term)
+            if index is not None:
+                query[index] = 1.0 + math.log(count)
+        query *= self._idf
+        norm = np.linalg.norm(query)
+        if norm == 0 or not len(self.entries):
+            return None, 0.0
+        scores = self._matrix @ (query / norm)
+        best = int(np.argmax(scores))
+        return self.entries[best], float(scores[best])
+
+    def is_off_topic(self, question):
+        """True only for questions with a clearly non-finance word, no finance word and no FAQ match"""
+        terms = _terms(_words(question))
+        if not any(term in self._off_topic_stems for term in terms):
+            return False
+        if any(term in self._finance_stems for term in terms):
+            return False
+        if self.search(question)[1] >= self.min_score:
+            return False
+        with self._lock:
+            self.off_topic += 1
+        return True
+
+    @staticmethod
+    def prediction_summary(prediction):
+        """Plain-language summary of a prediction result"""
+        outcome = 'likely to be approved' if prediction['prediction'] == 1 else 'unlikely to be approved'
+        summary = (f"Based on your latest assessment, your application is {outcome} "
+                   f"(estimated approval probability {prediction['probability']:.1%}).")
+        risk_factors = prediction.get('risk_factors') or []
+        if risk_factors:
+            summary += "\n\nKey risk factors:\n" + "\n".join(f"- {factor}" for factor in risk_factors)
+        else:
+            summary += " No major risk factors were flagged."
+        return summary
+
+    def answer(self, question, prediction=None):
+        """Local reply from the FAQ and, when relevant, the last prediction"""
+        entry, score = self.search(question)
+        parts = []
+        if entry is not None and score >= self.min_score:
+            parts.append(entry['answer'])
+        if prediction is not None and (not parts or APPLICATION_WORDS.intersection(_words(question))):
+            parts.append(self.prediction_summary(prediction))
+
+        with self._lock:
+            self.answered += 1
+
+        if not parts:
+            return UNAVAILABLE_MESSAGE
+        return FALLBACK_NOTICE + "\n\n" + "\n\n".join(parts)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'faq_entries': len(self.entries),
+                'answered': self.answered,
+                'off_topic': self.off_topic
+            }
@@ -0,0 +1,74 @@
+"""
+GUNICORN CONFIGURATION - Production serving
+Run with: gunicorn -c gunicorn.conf.py wsgi:app
+
+The app (model, encoder, session secret) is loaded once in the master and
+shared copy-on-write by the forked workers. Send SIGHUP to replace the
+workers gracefully; in-flight requests finish before the old ones exit.
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get('LOAN_BIND', '0.0.0.0:5000')
+
+# Load wsgi.py (and the model) in the master before forking
+preload_app = True
+
+workers = int(os.environ.get('LOAN_WORKERS', str(multiprocessing.cpu_count())))
+
+# Consecutive requests from one browser can land on different workers, so
+# predictions, report jobs and chat history go to SQLite files all workers
+# share instead of per-process memory (set before the app is preloaded)
+SHARED_STATE = ('LOAN_PREDICTION_STORE', 'LOAN_REPORT_JOB_STORE', 'LOAN_CHAT_STORE')
+if workers > 1:
+    for variable in SHARED_STATE:
+        os.environ.setdefault(variable, 'sqlite')
+
+# Each worker also keeps its own metrics; they write them to this directory
+# and /metrics adds them up. A temporary one is removed when gunicorn exits
+_metrics_dir_created = workers > 1 and 'LOAN_METRICS_DIR' not in os.environ
+if _metrics_dir_created:
+    os.environ['LOAN_METRICS_DIR'] = tempfile.mkdtemp(prefix='loan-metrics-')
+worker_class = 'gthread'
+threads = int(os.environ.get('LOAN_THREADS', '4'))
+
+# Report downloads and streamed chat replies can hold a request for a while
+timeout = int(os.environ.get('LOAN_WORKER_TIMEOUT', '120'))
+graceful_timeout = int(os.environ.get('LOAN_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+
+# Optional periodic worker recycling (0 disables)
+max_requests = int(os.environ.get('LOAN_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    # Files left by a previous run would be added to this run's totals
+    if os.environ.get('LOAN_METRICS_DIR'):
+        for name in os.listdir(os.environ['LOAN_METRICS_DIR']):
+            if name.endswith('.json'):
+                os.remove(os.path.join(os.environ['LOAN_METRICS_DIR'], name))
+
+
+def when_ready(server):
+    server.log.info("Model loaded in master; starting %d workers x %d threads", server.cfg.workers, server.cfg.threads)
+    if server.cfg.workers > 1:
+        for variable in SHARED_STATE:
+            if os.environ.get(variable) != 'sqlite':
+                server.log.warning("%s=%s keeps state per worker; requests served by another worker "
+                                   "won't find it", variable, os.environ.get(variable))
+
+
+def post_fork(server, worker):
+    server.log.info("Worker %s ready", worker.pid)
+
+
+def on_exit(server):
+    if _metrics_dir_created:
+        shutil.rmtree(os.environ['LOAN_METRICS_DIR'], ignore_errors=True)
@@ -0,0 +1,314 @@
+"""
+INFERENCE CLIENT MODULE
+Pooled HTTP client for the chat completion API with timeouts, retries,
+a concurrency cap and a circuit breaker
+"""
+
+import json
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import ERRORS, STAGE_SECONDS
+
+DEFAULT_API_URL = "https://router.huggingface.co/v1/chat/completions"
+
+# Upstream statuses worth another attempt; anything else is returned as an error
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+_UPSTREAM_SECONDS = STAGE_SECONDS.labels('chat_upstream')
+_FIRST_CHUNK_SECONDS = STAGE_SECONDS.labels('chat_upstream_first_chunk')
+_UPSTREAM_ERRORS = ERRORS.labels('chat_upstream')
+
+
+class UpstreamError(Exception):
+    """The inference API failed or could not be reached"""
+
+    def __init__(self, message, status=None, retryable=False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+class CircuitOpenError(UpstreamError):
+    """Calls are being refused because the inference API is unhealthy"""
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failed calls and refuses calls
+    for reset_timeout seconds. Then a single trial call is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self.opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+    def allow(self):
+        """Whether a call may go ahead now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_running:
+                    self.opened += 1
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class ChatCompletionClient:
+    """
+    Client for an OpenAI-compatible chat completion endpoint.
+
+    Connections are reused from a pool of pool_size. At most max_in_flight
+    calls run at once; callers wait up to queue_timeout for a slot and are
+    then refused, so a slow upstream cannot hold every server thread.
+    Connection errors, timeouts and RETRYABLE_STATUSES are retried up to
+    max_retries times with jittered exponential backoff, all within
+    total_timeout seconds. Streams are only retried before the first chunk.
+    """
+
+    def __init__(self, url=DEFAULT_API_URL, token=None, pool_size=8, max_in_flight=8,
+                 queue_timeout=1.0, connect_timeout=3.05, read_timeout=30.0, total_timeout=60.0,
+                 max_retries=2, backoff=0.25, max_backoff=4.0, breaker=None):
+        self.url = url
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._session.headers['Content-Type'] = 'application/json'
+        if token:
+            self._session.headers['Authorization'] = f'Bearer {token}'
+
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._stats_lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+        self.short_circuited = 0
+
+    @classmethod
+    def from_env(cls, token=None):
+        """Build the client from LOAN_CHAT_* environment variables"""
+        return cls(
+            url=os.environ.get('LOAN_CHAT_API_URL', DEFAULT_API_URL),
+            token=token,
+            pool_size=int(os.environ.get('LOAN_CHAT_MAX_IN_FLIGHT', '8')),
+            max_in_flight=int(os.environ.get('LOAN_CHAT_MAX_IN_FLIGHT', '8')),
+            read_timeout=float(os.environ.get('LOAN_CHAT_READ_TIMEOUT', '30')),
+            total_timeout=float(os.environ.get('LOAN_CHAT_TOTAL_TIMEOUT', '60')),
+            max_retries=int(os.environ.get('LOAN_CHAT_RETRIES', '2')),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.environ.get('LOAN_CHAT_BREAKER_FAILURES', '5')),
+                reset_timeout=float(os.environ.get('LOAN_CHAT_BREAKER_RESET', '30'))
+            )
+        )
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._count('rejected')
+            raise UpstreamError("Too many chat requests in progress", retryable=True)
+        if not self.breaker.allow():
+            self._slots.release()
+            self._count('short_circuited')
+            raise CircuitOpenError("Chat service is temporarily unavailable")
+        self._count('in_flight')
+        self._count('requests')
+
+    def _release(self):
+        self._count('in_flight', -1)
+        self._slots.release()
+
+    def _post(self, payload, deadline, stream):
+        """POST with retries; returns a response with a 2xx status"""
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise UpstreamError("Chat service timed out", retryable=True)
+            try:
+                response = self._session.post(
+                    self.url,
+                    data=json.dumps(payload),
+                    timeout=(min(self.connect_timeout, remaining), min(self.read_timeout, remaining)),
+                    stream=stream
+                )
+            except requests.RequestException as e:
+                error = UpstreamError(f"Chat service unreachable: {str(e)}", retryable=True)
+                retry_after = None
+            else:
+                if response.status_code < 400:
+                    return response
+                retryable = response.status_code in RETRYABLE_STATUSES
+                error = UpstreamError(
+                    f"Chat service returned {response.status_code}: {response.text[:200]}",
+                    status=response.status_code,
+                    retryable=retryable
+                )
+                retry_after = response.headers.get('Retry-After')
+                response.close()
+
+            if not error.retryable or attempt >= self.max_retries:
+                raise error
+
+            # Full jitter keeps clients that failed together from retrying together
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+            if retry_after is not None:
+                try:
+                    delay = max(delay, min(float(retry_after), self.max_backoff))
+                except ValueError:
+                    pass
+            if time.monotonic() + delay >= deadline:
+                raise error
+            time.sleep(delay)
+            attempt += 1
+            self._count('retries')
+
+    def _record(self, error):
+        """Feed the outcome of a call to the circuit breaker"""
+        if error is None:
+            self.breaker.record_success()
+            return
+        self._count('failures')
+        _UPSTREAM_ERRORS.inc()
+        # Client errors (bad request, bad token) say nothing about upstream health
+        if error.retryable or error.status is None:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def chat_completion(self, model, messages, max_tokens=500, temperature=0.7, stream=False, timeout=None):
+        """
+        Request a completion. Returns the parsed response dict, or with
+        stream=True a generator of parsed chunk dicts.
+
+        timeout (default total_timeout) bounds the whole call including
+        retries; for streams it bounds the wait for the first chunk and each
+        gap between chunks, while the stream as a whole gets total_timeout.
+        """
+        timeout = self.total_timeout if timeout is None else min(timeout, self.total_timeout)
+        payload = {
+            'model': model,
+            'messages': messages,
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+            'stream': stream
+        }
+        if stream:
+            return self._stream(payload, timeout)
+
+        self._acquire()
+        try:
+            with _UPSTREAM_SECONDS.time():
+                deadline = time.monotonic() + timeout
+                response = self._post(payload, deadline, stream=False)
+                try:
+                    result = response.json()
+                except ValueError:
+                    raise UpstreamError("Chat service returned invalid JSON", retryable=True)
+        except UpstreamError as e:
+            self._record(e)
+            raise
+        finally:
+            self._release()
+        self._record(None)
+        return result
+
+    def _stream(self, payload, timeout):
+        self._acquire()
+        error = None
+        try:
+            started = time.monotonic()
+            response = self._post(payload, started + timeout, stream=True)
+            deadline = started + self.total_timeout
+            first_chunk = True
+            done = False
+            with response:
+                try:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if time.monotonic() > deadline:
+                            raise UpstreamError("Chat service timed out", retryable=True)
+                        if done or not line or not line.startswith('data:'):
+                            continue
+                        data = line[5:].strip()
+                        if data == '[DONE]':
+                            # Read on to the end of the body so the connection goes back to the pool
+                            done = True
+                            continue
+                        chunk = json.loads(data)
+                        if 'error' in chunk:
+                            raise UpstreamError(f"Chat service error: {chunk['error']}", retryable=True)
+                        if first_chunk:
+                            _FIRST_CHUNK_SECONDS.observe(time.monotonic() - started)
+                            first_chunk = False
+                        yield chunk
+                except (requests.RequestException, ValueError) as e:
+                    raise UpstreamError(f"Chat stream interrupted: {str(e)}", retryable=True)
+        except UpstreamError as e:
+            error = e
+            raise
+        finally:
+            _UPSTREAM_SECONDS.observe(time.monotonic() - started)
+            self._release()
+            self._record(error)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'requests': self.requests,
+                'retries': self.retries,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'short_circuited': self.short_circuited,
+                'circuit': self.breaker.state,
+                'circuit_opened': self.breaker.opened
+            }
@@ -3,45 +3,183 @@ LOAN APPROVAL PREDICTION MODULE
 Provides prediction functionality for Flask application
 """
 
-import pandas as pd
 import numpy as np
-from xgboost import XGBClassifier
 import joblib
 import os
+import threading
+import time
+from metrics import ERRORS, STAGE_SECONDS
+from modelRegistry import ModelVersionError, model_registry
+
+# Raw application features in the order the model was trained on
+FEATURE_NAMES = [
+    'person_age', 'person_gender', 'person_education', 'person_income',
+    'person_emp_exp', 'person_home_ownership', 'loan_amnt', 'loan_intent',
+    'loan_percent_income', 'cb_person_cred_hist_length', 'credit_score',
+    'previous_loan_defaults_on_file'
+]
+
+# Metric children bound once so the hot path skips the label lookup
+_ENCODE_SECONDS = STAGE_SECONDS.labels('encode')
+_PREPROCESS_SECONDS = STAGE_SECONDS.labels('preprocess_input')
+_PREDICT_PROBA_SECONDS = STAGE_SECONDS.labels('predict_proba')
+_PREDICT_ERRORS = ERRORS.labels('predict')
+
+# Fields an application must provide (loan_percent_income is derived)
+REQUIRED_FIELDS = [
+    'person_age', 'person_income', 'person_emp_exp', 'loan_amnt',
+    'cb_person_cred_hist_length', 'credit_score', 'person_gender',
+    'person_education', 'person_home_ownership', 'loan_intent',
+    'previous_loan_defaults_on_file'
+]
+
+# Rule-based risk factors; each test works on scalars and NumPy column arrays alike
+RISK_RULES = [
+    ("Low credit score (< 600)", lambda d: d['credit_score'] < 600),
+    ("Previous loan defaults on file", lambda d: d['previous_loan_defaults_on_file'] == 'Yes'),
+    ("High debt-to-income ratio (> 40%)", lambda d: (d['loan_amnt'] / d['person_income']) > 0.4),
+    ("No employment experience", lambda d: d['person_emp_exp'] == 0),
+    ("Short credit history (< 2 years)", lambda d: d['cb_person_cred_hist_length'] < 2)
+]
+
+
+def validate_application(data):
+    """Return an error message if a required field is missing, else None"""
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            return f'Missing field: {field}'
+    return None
+
+
+def build_feature_layout(encoder, column_order=None):
+    """Map raw features and categories to their column in the model input
+
+    Returns (columns, numeric_index, category_index) where numeric_index maps a
+    numerical feature to its column and category_index maps a categorical
+    feature to {category: column}. Categories dropped by the encoder map to None.
+    """
+    cat_features = list(encoder.feature_names_in_)
+    encoded_names = list(encoder.get_feature_names_out(cat_features))
+    drop_idx = getattr(encoder, 'drop_idx_', None)
+
+    if column_order is None:
+        numerical = [f for f in FEATURE_NAMES if f not in cat_features]
+        columns = encoded_names + numerical
+    else:
+        columns = list(column_order)
+        numerical = [c for c in columns if c not in encoded_names]
+    position = {name: i for i, name in enumerate(columns)}
+
+    numeric_index = {feature: position[feature] for feature in numerical}
+
+    # get_feature_names_out lists the kept categories of each feature in order
+    category_index = {}
+    names = iter(encoded_names)
+    for i, feature in enumerate(cat_features):
+        dropped = None if drop_idx is None else drop_idx[i]
+        category_index[feature] = {}
+        for j, category in enumerate(encoder.categories_[i]):
+            if dropped is not None and j == dropped:
+                category_index[feature][category] = None
+            else:
+                category_index[feature][category] = position[next(names)]
+
+    return columns, numeric_index, category_index
+
 
 class LoanPredictor:
-    def __init__(self):
+    def __init__(self, backend=None):
         # Get the directory where this script is located
         script_dir = os.path.dirname(os.path.abspath(__file__))
 
-        # Build absolute paths to model files
+        # Build absolute paths to model files (replaced by the loaded version's)
         self.MODEL_PATH = os.path.join(script_dir, 'models', 'loan_model.ubj')
         self.ENCODER_PATH = os.path.join(script_dir, 'models', 'loan_encoder.joblib')
         self.THRESHOLD = 0.5
+        # 'xgboost' (XGBClassifier) or 'compiled' (NumPy tree walk, no xgboost import)
+        self.backend = backend or os.environ.get('LOAN_MODEL_BACKEND', 'xgboost')
         self.model = None
         self.encoder = None
         self.expected_column_order = None
+        self.n_columns = None
+        self.columns = None
+        self.model_fingerprint = None
+        self.model_version = None
+        self.loaded_at = None
+        self.load_error = None
+        self._numeric_index = None
+        self._category_index = None
+        self._local = threading.local()
+        # Optional ShadowScorer fed every scored row (see shadowScoring.py)
+        self.shadow = None
 
-    def load_model(self):
-        """Load XGBoost model and encoder"""
+    def load_model(self, version=None):
+        """Load XGBoost model and encoder of a registry version (default: the active one)"""
         try:
-            # Load XGBoost model
-            self.model = XGBClassifier()
-            self.model.load_model(self.MODEL_PATH)
+            version = version or model_registry.active_version()
+            self.MODEL_PATH, self.ENCODER_PATH = model_registry.paths(version)
+            # Checks the manifest checksums before anything is unpickled
+            fingerprint = model_registry.verify(version)
+
+            if self.backend == 'compiled':
+                # Flatten the trees into NumPy arrays; xgboost is never imported
+                from compiledModel import CompiledForest
+                self.model = CompiledForest.from_ubj(self.MODEL_PATH)
+                self.expected_column_order = self.model.feature_names
+            elif self.backend == 'xgboost':
+                # Load XGBoost model
+                from xgboost import XGBClassifier
+                self.model = XGBClassifier()
+                self.model.load_model(self.MODEL_PATH)
+
+                # Get expected column order from model
+                self.expected_column_order = self.model.get_booster().feature_names
+            else:
+                raise ValueError(f"Unknown model backend: {self.backend}")
 
             # Load encoder
             self.encoder = joblib.load(self.ENCODER_PATH)
 
-            # Get expected column order from model
-            self.expected_column_order = self.model.get_booster().feature_names
+            # Read the one-hot layout once so requests skip pandas and the encoder
+            columns, self._numeric_index, self._category_index = build_feature_layout(
+                self.encoder, self.expected_column_order
+            )
+            self.n_columns = len(columns)
+            self.columns = columns
+
+            # Content hash of model + encoder, used to key cached reports
+            self.model_fingerprint = fingerprint
+            self.model_version = version
+            self.loaded_at = time.time()
 
             return True
         except Exception as e:
+            self.load_error = str(e)
             print(f"Error loading model: {str(e)}")
             return False
 
+    def warm_up(self, rows=64):
+        """Score dummy rows so the first request skips lazy set-up; rejects non-finite output"""
+        matrix = np.zeros((rows, self.n_columns), dtype=np.float32)
+        for batch in (matrix[:1], matrix):
+            probabilities = self.model.predict_proba(batch)[:, 1]
+            if not np.all(np.isfinite(probabilities)):
+                raise ValueError("Model produced non-finite probabilities")
+
+    def pinned(self):
+        """The predictor to use for multi-step work (see LivePredictor.pinned)"""
+        return self
+
     def preprocess_input(self, data):
         """Apply same preprocessing as training"""
+        with _PREPROCESS_SECONDS.time():
+            return self._preprocess_input(data)
+
+    def _preprocess_input(self, data):
+        # This module only needs pandas here; the xgboost backend imports it at
+        # load time anyway (xgboost imports pandas), the compiled backend never does
+        import pandas as pd
+
         # Separate categorical and numerical features
         cat_columns = data.select_dtypes(include=['object']).columns
 
@@ -62,55 +200,275 @@ class LoanPredictor:
 
         return final_data
 
+    def encode_application(self, application_data, out=None):
+        """Encode one application into a float32 model input row"""
+        row = np.zeros(self.n_columns, dtype=np.float32) if out is None else out
+        row[:] = 0.0
+
+        for feature, col in self._numeric_index.items():
+            if feature == 'loan_percent_income':
+                row[col] = application_data['loan_amnt'] / application_data['person_income']
+            else:
+                row[col] = application_data[feature]
+
+        for feature, categories in self._category_index.items():
+            value = application_data[feature]
+            if value not in categories:
+                raise ValueError(f"Unknown category '{value}' for {feature}")
+            col = categories[value]
+            if col is not None:
+                row[col] = 1.0
+
+        return row
+
+    def encode_columns(self, columns, out=None):
+        """Encode column arrays (feature name -> values) into a float32 model matrix"""
+        n_rows = len(columns['person_income'])
+        if out is None:
+            matrix = np.zeros((n_rows, self.n_columns), dtype=np.float32)
+        else:
+            matrix = out
+            matrix[:] = 0.0
+
+        for feature, col in self._numeric_index.items():
+            if feature == 'loan_percent_income':
+                matrix[:, col] = (np.asarray(columns['loan_amnt'], dtype=np.float64) /
+                                  np.asarray(columns['person_income'], dtype=np.float64))
+            else:
+                matrix[:, col] = np.asarray(columns[feature], dtype=np.float64)
+
+        for feature, categories in self._category_index.items():
+            values = np.asarray(columns[feature], dtype=object)
+            known = np.zeros(n_rows, dtype=bool)
+            for category, col in categories.items():
+                mask = values == category
+                known |= mask
+                if col is not None:
+                    matrix[mask, col] = 1.0
+            if not known.all():
+                bad = values[~known][0]
+                raise ValueError(f"Unknown category '{bad}' for {feature}")
+
+        return matrix
+
+    def encode_batch(self, applications):
+        """Encode a list of application dicts into a float32 model matrix"""
+        columns = {
+            feature: [application[feature] for application in applications]
+            for feature in FEATURE_NAMES if feature != 'loan_percent_income'
+        }
+        return self.encode_columns(columns)
+
+    def identify_risk_factors(self, application_data):
+        """Rule-based risk factors shown alongside the model decision"""
+        return [message for message, rule in RISK_RULES if rule(application_data)]
+
+    def risk_factor_labels(self, columns, sep='; '):
+        """Vectorized identify_risk_factors: one joined label string per row"""
+        arrays = {
+            'credit_score': np.asarray(columns['credit_score'], dtype=np.float64),
+            'previous_loan_defaults_on_file': np.asarray(columns['previous_loan_defaults_on_file'], dtype=object),
+            'loan_amnt': np.asarray(columns['loan_amnt'], dtype=np.float64),
+            'person_income': np.asarray(columns['person_income'], dtype=np.float64),
+            'person_emp_exp': np.asarray(columns['person_emp_exp'], dtype=np.float64),
+            'cb_person_cred_hist_length': np.asarray(columns['cb_person_cred_hist_length'], dtype=np.float64)
+        }
+
+        # Pack the rule hits into a bitmask per row, then look up the label
+        codes = np.zeros(len(arrays['credit_score']), dtype=np.intp)
+        for bit, (_, rule) in enumerate(RISK_RULES):
+            codes |= np.asarray(rule(arrays), dtype=np.intp) << bit
+
+        labels = np.array([
+            sep.join(message for bit, (message, _) in enumerate(RISK_RULES) if code >> bit & 1)
+            for code in range(1 << len(RISK_RULES))
+        ], dtype=object)
+        return labels[codes]
+
+    def score_matrix(self, matrix):
+        """Approval probabilities and decisions for an encoded model matrix"""
+        with _PREDICT_PROBA_SECONDS.time():
+            probabilities = self.model.predict_proba(matrix)[:, 1]
+        if self.shadow is not None:
+            self.shadow.offer(matrix, probabilities, self.columns)
+        return probabilities, (probabilities >= self.THRESHOLD).astype(np.int8)
+
+    def _row_buffer(self):
+        """Preallocated single-row input matrix, one per thread"""
+        row = getattr(self._local, 'row', None)
+        if row is None or row.shape[1] != self.n_columns:
+            row = np.zeros((1, self.n_columns), dtype=np.float32)
+            self._local.row = row
+        return row
+
+    def build_result(self, application_data, probability):
+        """Result dict returned for one scored application"""
+        return {
+            'prediction': int(probability >= self.THRESHOLD),
+            'probability': float(probability),
+            'risk_factors': self.identify_risk_factors(application_data),
+            'application_data': application_data,
+            'model_version': self.model_version,
+            'model_fingerprint': self.model_fingerprint
+        }
+
     def make_prediction(self, application_data):
         """Make prediction using loaded model"""
         try:
-            # Create DataFrame
-            data = pd.DataFrame({
-                'person_age': [application_data['person_age']],
-                'person_gender': [application_data['person_gender']],
-                'person_education': [application_data['person_education']],
-                'person_income': [application_data['person_income']],
-                'person_emp_exp': [application_data['person_emp_exp']],
-                'person_home_ownership': [application_data['person_home_ownership']],
-                'loan_amnt': [application_data['loan_amnt']],
-                'loan_intent': [application_data['loan_intent']],
-                'loan_percent_income': [application_data['loan_amnt'] / application_data['person_income']],
-                'cb_person_cred_hist_length': [application_data['cb_person_cred_hist_length']],
-                'credit_score': [application_data['credit_score']],
-                'previous_loan_defaults_on_file': [application_data['previous_loan_defaults_on_file']]
-            })
-
-            # Preprocess
-            processed_data = self.preprocess_input(data)
-
-            # Get probability
-            probability = self.model.predict_proba(processed_data)[:, 1][0]
-
-            # Apply threshold
-            prediction = int(probability >= self.THRESHOLD)
-
-            # Identify risk factors
-            risk_factors = []
-            if application_data['credit_score'] < 600:
-                risk_factors.append("Low credit score (< 600)")
-            if application_data['previous_loan_defaults_on_file'] == 'Yes':
-                risk_factors.append("Previous loan defaults on file")
-            if (application_data['loan_amnt'] / application_data['person_income']) > 0.4:
-                risk_factors.append("High debt-to-income ratio (> 40%)")
-            if application_data['person_emp_exp'] == 0:
-                risk_factors.append("No employment experience")
-            if application_data['cb_person_cred_hist_length'] < 2:
-                risk_factors.append("Short credit history (< 2 years)")
-
-            return {
-                'prediction': prediction,
-                'probability': float(probability),
-                'risk_factors': risk_factors,
-                'application_data': application_data
-            }
+            # Encode straight into the preallocated row
+            row = self._row_buffer()
+            with _ENCODE_SECONDS.time():
+                self.encode_application(application_data, out=row[0])
+
+            # Get probability and apply threshold
+            with _PREDICT_PROBA_SECONDS.time():
+                probabilities = self.model.predict_proba(row)[:, 1]
+            if self.shadow is not None:
+                self.shadow.offer(row, probabilities, self.columns)
+            probability = probabilities[0]
+
+            return self.build_result(application_data, probability)
+        except Exception as e:
+            _PREDICT_ERRORS.inc()
+            raise Exception(f"Prediction error: {str(e)}")
+
+    def predict_batch(self, applications):
+        """Make predictions for many applications with one model call"""
+        try:
+            if not applications:
+                return []
+
+            with _ENCODE_SECONDS.time():
+                matrix = self.encode_batch(applications)
+            probabilities, _ = self.score_matrix(matrix)
+
+            return [
+                self.build_result(application_data, probability)
+                for application_data, probability in zip(applications, probabilities)
+            ]
         except Exception as e:
+            _PREDICT_ERRORS.inc()
             raise Exception(f"Prediction error: {str(e)}")
 
+class LivePredictor:
+    """
+    The serving LoanPredictor, replaced in one step when a new model version loads.
+
+    Attribute access is forwarded to the current predictor, so it is used like
+    a LoanPredictor. reload() loads and warms up a complete new predictor off
+    to the side and then swaps the reference: a request that already started
+    keeps the predictor it began with and finishes on the old version. Work
+    spanning several calls should hold on to pinned() so it sees one version.
+    """
+
+    def __init__(self, backend=None):
+        self._live = LoanPredictor(backend)
+        self._backend = backend
+        # set_params applied to every loaded model (e.g. n_jobs per worker)
+        self.model_params = {}
+        self.reload_status = {'state': 'idle'}
+        self.shadow = None
+        self._reload_lock = threading.Lock()
+        self._watch_interval = None
+        self._failed_version = None
+
+    def __getattr__(self, name):
+        return getattr(self._live, name)
+
+    def pinned(self):
+        """The LoanPredictor serving right now"""
+        return self._live
+
+    def set_shadow(self, scorer):
+        """Feed every row the live model scores (this and later versions) to a ShadowScorer"""
+        self.shadow = scorer
+        self._live.shadow = scorer
+
+    def load_model(self, version=None):
+        """Load a version and make it live; False (old model kept) on failure"""
+        try:
+            self.reload(version)
+            return True
+        except Exception:
+            self._failed_version = version or model_registry.active_version()
+            return False
+
+    def reload(self, version=None):
+        """Load, check and warm up a model version, then swap it in"""
+        with self._reload_lock:
+            return self._swap_in(version)
+
+    def _swap_in(self, version):
+        # Caller holds _reload_lock
+        candidate = LoanPredictor(self._backend)
+        if not candidate.load_model(version):
+            raise ModelVersionError(candidate.load_error)
+        if self.model_params:
+            candidate.model.set_params(**self.model_params)
+        candidate.warm_up()
+        candidate.shadow = self.shadow
+        self._live = candidate
+        return candidate
+
+    def _start_reload(self, version):
+        """Take the reload lock without waiting and mark the reload as loading; False if one is running"""
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        self.reload_status = {'state': 'loading', 'version': version, 'started': time.time()}
+        return True
+
+    def _reload_and_record(self, version):
+        """Finish a reload begun by _start_reload: swap in, record the outcome, release the lock"""
+        started = self.reload_status['started']
+        try:
+            candidate = self._swap_in(version)
+            self._failed_version = None
+            self.reload_status = {
+                'state': 'done', 'version': candidate.model_version,
+                'fingerprint': candidate.model_fingerprint, 'seconds': round(time.time() - started, 3)
+            }
+            print(f"✓ Model version {candidate.model_version} ({candidate.model_fingerprint}) is live")
+        except Exception as e:
+            self._failed_version = version
+            self.reload_status = {'state': 'failed', 'version': version, 'message': str(e)}
+            print(f"❌ Model reload failed, still serving {self._live.model_version}: {str(e)}")
+        finally:
+            self._reload_lock.release()
+
+    def reload_in_background(self, version=None):
+        """Start reloading in a thread; False if a reload is already running"""
+        version = version or model_registry.active_version()
+        if not self._start_reload(version):
+            return False
+        threading.Thread(target=self._reload_and_record, args=(version,), name='model-reload', daemon=True).start()
+        return True
+
+    def watch(self, interval):
+        """Reload whenever the registry's active version changes (checked every interval seconds)"""
+        self._watch_interval = interval
+        threading.Thread(target=self._watch, args=(interval,), name='model-watcher', daemon=True).start()
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                active = model_registry.active_version()
+            except OSError:
+                continue
+            # A version that failed is retried only through an explicit reload
+            if active != self._live.model_version and active != self._failed_version:
+                if self._start_reload(active):
+                    self._reload_and_record(active)
+
+    def _after_fork(self):
+        # Threads don't survive fork; gunicorn workers keep watching on their own
+        self._reload_lock = threading.Lock()
+        if self.reload_status['state'] == 'loading':
+            self.reload_status = {'state': 'idle'}
+        if self._watch_interval is not None:
+            self.watch(self._watch_interval)
+
+
 # Create global instance
-predictor = LoanPredictor()
\ No newline at end of file
+predictor = LivePredictor()
+os.register_at_fork(after_in_child=predictor._after_fork)
\ No newline at end of file
@@ -5,26 +5,27 @@ Initializes and runs the complete loan approval system
 
 import sys
 import os
+from importlib.util import find_spec
 
 
 def check_dependencies():
-    """Check if all required packages are installed"""
+    """Check if all required packages are installed (without importing them)"""
     required_packages = [
         'flask',
         'pandas',
         'numpy',
         'xgboost',
+        'sklearn',
         'joblib',
-        'huggingface_hub',
-        'reportlab'
+        'requests',
+        'matplotlib',
+        'lime'
     ]
 
     missing_packages = []
 
     for package in required_packages:
-        try:
-            __import__(package)
-        except ImportError:
+        if find_spec(package) is None:
             missing_packages.append(package)
 
     if missing_packages:
@@ -85,9 +86,12 @@ def main():
 
     try:
         from app import app
+        from startupTiming import startup_timer
 
         print("✓ Application started successfully!")
         print()
+        startup_timer.report()
+        print()
         print("📱 Access the application at:")
         print("   • http://localhost:5000")
         print("   • http://127.0.0.1:5000")
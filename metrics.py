@@ -0,0 +1,500 @@
+"""
+METRICS MODULE
+In-process counters, gauges and latency histograms rendered as Prometheus text
+"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+try:
+    import fcntl
+except ImportError:  # Windows: dead workers' files are never compacted
+    fcntl = None
+
+# Latency buckets in seconds, from sub-millisecond scoring to multi-second reports
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _CaptureState(threading.local):
+    # Class default keeps the hot-path lookup cheap when nothing is capturing
+    observations = None
+
+
+# Observations made inside capture() are also appended here (per thread), so a
+# worker process can send them back to the web process to be replayed
+_capture = _CaptureState()
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child(())
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values):
+        """The child for one set of label values (bind it once for hot paths)"""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child(values))
+        return child
+
+    def _new_child(self, values):
+        raise NotImplementedError
+
+    def snapshot(self):
+        """Plain-data state of every child, keyed by label values"""
+        return {values: child.snapshot() for values, child in list(self._children.items())}
+
+    def reset(self):
+        """Forget every value (a forked worker starts from zero)"""
+        for child in list(self._children.values()):
+            child.reset()
+
+    def merge(self, states):
+        """Combine one child's state from several processes"""
+        raise NotImplementedError
+
+    def render(self, snapshot=None):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, state in sorted((snapshot if snapshot is not None else self.snapshot()).items()):
+            if state is not None:
+                lines.extend(self._format(values, state))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ('metric', 'values', 'value', '_lock')
+
+    def __init__(self, metric, values):
+        self.metric = metric
+        self.values = values
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+        captured = _capture.observations
+        if captured is not None:
+            captured.append((self.metric.name, self.values, amount))
+
+    def snapshot(self):
+        return self.value
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = 'counter'
+
+    def _new_child(self, values):
+        return _CounterChild(self, values)
+
+    def merge(self, states):
+        return sum(states)
+
+    def _format(self, values, value):
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}']
+
+    def inc(self, amount=1.0):
+        self.labels().inc(amount)
+
+    def replay(self, values, amount):
+        self.labels(*values).inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ('value', 'function', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1.0):
+        self.inc(-amount)
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time instead"""
+        self.function = function
+
+    def snapshot(self):
+        if self.function is None:
+            return self.value
+        try:
+            return self.function()
+        except Exception:
+            return None
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+
+class Gauge(_Metric):
+    """Value that goes up and down (in-flight requests, queue depth)"""
+    kind = 'gauge'
+
+    def _new_child(self, values):
+        return _GaugeChild()
+
+    def merge(self, states):
+        # Gauges here count things (requests, jobs, calls), so workers add up
+        states = [state for state in states if state is not None]
+        return sum(states) if states else None
+
+    def _format(self, values, value):
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}']
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+
+class _Timer:
+    __slots__ = ('child', 'started')
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.started)
+        return False
+
+
+class _HistogramChild:
+    __slots__ = ('metric', 'values', 'buckets', 'counts', 'sum', '_lock')
+
+    def __init__(self, metric, values, buckets):
+        self.metric = metric
+        self.values = values
+        self.buckets = buckets
+        # One slot per bucket plus the +Inf overflow; made cumulative when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+        captured = _capture.observations
+        if captured is not None:
+            captured.append((self.metric.name, self.values, value))
+
+    def observe_counts(self, counts, total):
+        """Add already-bucketed observations: one count per bucket plus +Inf, and their sum"""
+        with self._lock:
+            for index, count in enumerate(counts):
+                self.counts[index] += int(count)
+            self.sum += total
+
+    def time(self):
+        """Context manager observing the duration of its block"""
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return [list(self.counts), self.sum]
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    """Latency distribution in fixed buckets"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(float(b) for b in buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self, values):
+        return _HistogramChild(self, values, self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def replay(self, values, value):
+        self.labels(*values).observe(value)
+
+    def merge(self, states):
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        for state_counts, state_sum in states:
+            # Skip a file written by a build with different buckets
+            if len(state_counts) == len(counts):
+                counts = [a + b for a, b in zip(counts, state_counts)]
+                total += state_sum
+        return [counts, total]
+
+    def _format(self, values, state):
+        counts, total = state
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, ('le', _format_value(float(bound))))
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class _Capture:
+    def __init__(self):
+        self.observations = []
+
+    def __enter__(self):
+        self._previous = _capture.observations
+        _capture.observations = self.observations
+        return self.observations
+
+    def __exit__(self, *exc):
+        _capture.observations = self._previous
+        return False
+
+
+class Registry:
+    """All metrics of this process, rendered together for /metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        # Set by share(): the directory every process writes its values to
+        self._directory = None
+        self._interval = 1.0
+        self._path = None
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        snapshots = self._read_shared() if self._directory is not None else {}
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render(snapshots.get(metric.name)))
+        return '\n'.join(lines) + '\n'
+
+    def share(self, directory, interval=1.0):
+        """
+        Add up every process's values in render(), through files in directory.
+
+        Each gunicorn worker keeps its own values, so without this a scrape
+        only sees the worker that answered it. Call before forking: the
+        master writes its values once per fork, each forked worker starts
+        from zero and writes <pid>-<id>.json every interval seconds (and
+        right before it answers a scrape). Counters and histograms of exited
+        workers are folded into exited.json so totals never go backwards;
+        gauges only count live processes.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._interval = interval
+        os.register_at_fork(before=self._write_snapshot, after_in_child=self._start_worker)
+
+    def _start_worker(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+        self._path = None
+        atexit.register(self._write_snapshot)
+        threading.Thread(target=self._flush, name='metrics-flush', daemon=True).start()
+
+    def _flush(self):
+        while True:
+            time.sleep(self._interval)
+            try:
+                self._write_snapshot()
+            except OSError:
+                pass
+
+    def _write_snapshot(self):
+        if self._path is None or not self._path.startswith(os.path.join(self._directory, f'{os.getpid()}-')):
+            # The random part keeps a reused pid from overwriting an exited worker's file
+            self._path = os.path.join(self._directory, f'{os.getpid()}-{os.urandom(4).hex()}.json')
+        with self._lock:
+            metrics = list(self._metrics.values())
+        data = {metric.name: [[list(values), state] for values, state in metric.snapshot().items()]
+                for metric in metrics}
+        _write_json(self._path, data)
+
+    def _read_shared(self):
+        """Merged snapshots of every process writing to the shared directory"""
+        self._write_snapshot()
+        with open(os.path.join(self._directory, '.lock'), 'a') as lock:
+            # One scrape at a time, so nothing is read while exited files are folded in
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self._compact()
+            files = []
+            for path in glob.glob(os.path.join(self._directory, '*.json')):
+                data = _read_json(path)
+                if data is not None:
+                    files.append((_process_alive(path), data))
+
+        states = {}
+        for alive, data in files:
+            for name, children in data.items():
+                metric = self._metrics.get(name)
+                if metric is None or (metric.kind == 'gauge' and not alive):
+                    continue
+                for values, state in children:
+                    states.setdefault(name, {}).setdefault(tuple(values), []).append(state)
+        return {name: {values: self._metrics[name].merge(child_states) for values, child_states in children.items()}
+                for name, children in states.items()}
+
+    def _compact(self):
+        """Fold the counters and histograms of exited processes into exited.json"""
+        exited = [path for path in glob.glob(os.path.join(self._directory, '*-*.json'))
+                  if not _process_alive(path)]
+        if not exited:
+            return
+        archive_path = os.path.join(self._directory, 'exited.json')
+        archive = _read_json(archive_path) or {}
+        for path in exited:
+            for name, children in (_read_json(path) or {}).items():
+                metric = self._metrics.get(name)
+                if metric is None or metric.kind == 'gauge':
+                    continue
+                merged = {tuple(values): state for values, state in archive.get(name, [])}
+                for values, state in children:
+                    values = tuple(values)
+                    merged[values] = metric.merge([merged[values], state]) if values in merged else state
+                archive[name] = [[list(values), state] for values, state in merged.items()]
+        _write_json(archive_path, archive)
+        for path in exited:
+            os.remove(path)
+
+    def capture(self):
+        """Collect this thread's counter and histogram updates while recording them"""
+        return _Capture()
+
+    def replay(self, observations):
+        """Apply updates captured in another process"""
+        for name, values, value in observations:
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric.replay(values, value)
+
+
+def _write_json(path, data):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(data, f)
+    os.replace(temporary, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _process_alive(path):
+    """Whether the process that writes path (<pid>-<id>.json) is still running"""
+    pid = os.path.basename(path).split('-', 1)[0]
+    if not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# Create global instance
+REGISTRY = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Stage latencies: encode, preprocess_input, predict_proba, explain_lime,
+# explain_shap, render, savefig, chat_upstream
+STAGE_SECONDS = Histogram(
+    'loan_stage_duration_seconds', 'Time spent in each processing stage', ['stage']
+)
+REQUEST_SECONDS = Histogram(
+    'loan_http_request_duration_seconds', 'HTTP request latency by endpoint', ['endpoint']
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'loan_http_requests_in_flight', 'HTTP requests currently being served', ['endpoint']
+)
+ERRORS = Counter(
+    'loan_errors_total', 'Errors by stage', ['stage']
+)
+CACHE_REQUESTS = Counter(
+    'loan_cache_requests_total', 'Cache lookups by cache and result (hit or miss)', ['cache', 'result']
+)
+REPORT_JOBS_PENDING = Gauge(
+    'loan_report_jobs_pending', 'Report jobs queued or running'
+)
+CHAT_UPSTREAM_IN_FLIGHT = Gauge(
+    'loan_chat_upstream_in_flight', 'Chat completion calls currently in flight'
+)
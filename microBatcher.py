@@ -0,0 +1,155 @@
+"""
+MICRO-BATCHING MODULE
+Coalesces concurrent single-application predictions into one model call
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+from metrics import STAGE_SECONDS
+
+
+class _PendingPrediction:
+    """One caller waiting in the micro-batch queue"""
+    __slots__ = ('application_data', 'future', 'enqueued')
+
+    def __init__(self, application_data):
+        self.application_data = application_data
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Collects concurrent prediction requests for up to max_wait_ms (or until
+    max_batch_size rows are waiting), scores them as one matrix and hands each
+    caller its own result. max_wait_ms caps the latency added to any request;
+    when the queue is full callers fall back to a direct make_prediction.
+    """
+
+    def __init__(self, predictor, max_batch_size=32, max_wait_ms=2.0, max_queue_size=1024,
+                 stats_window=10000):
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_size = max_queue_size
+
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._matrix = None
+
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=stats_window)
+        self._queue_times = deque(maxlen=stats_window)
+        self.batches = 0
+        self.requests = 0
+        self.fallbacks = 0
+        self.max_seen_batch = 0
+
+    def _ensure_started(self):
+        """Start the scoring thread lazily (and again in a forked child)"""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._thread = threading.Thread(target=self._run, name='loan-microbatcher', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def submit(self, application_data, timeout=None):
+        """Score one application; blocks until its batch has been scored"""
+        self._ensure_started()
+        pending = _PendingPrediction(application_data)
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            with self._stats_lock:
+                self.fallbacks += 1
+            return self.predictor.make_prediction(application_data)
+        return pending.future.result(timeout)
+
+    def _collect(self):
+        """Wait for the first request, then gather more until the window closes"""
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._score(batch)
+            except Exception as e:
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(Exception(f"Prediction error: {str(e)}"))
+
+    def _score(self, batch):
+        started = time.perf_counter()
+        # One model version for the whole batch, even if a reload lands meanwhile
+        predictor = self.predictor.pinned()
+        n_columns = predictor.n_columns
+        if self._matrix is None or self._matrix.shape[1] != n_columns:
+            self._matrix = np.zeros((self.max_batch_size, n_columns), dtype=np.float32)
+
+        # Encode each row into the shared matrix; a bad row only fails its caller
+        encoded = []
+        with STAGE_SECONDS.labels('encode').time():
+            for pending in batch:
+                try:
+                    predictor.encode_application(pending.application_data, out=self._matrix[len(encoded)])
+                    encoded.append(pending)
+                except Exception as e:
+                    pending.future.set_exception(Exception(f"Prediction error: {str(e)}"))
+
+        if encoded:
+            probabilities, _ = predictor.score_matrix(self._matrix[:len(encoded)])
+            for pending, probability in zip(encoded, probabilities):
+                pending.future.set_result(
+                    predictor.build_result(pending.application_data, probability)
+                )
+
+        with self._stats_lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.max_seen_batch = max(self.max_seen_batch, len(batch))
+            self._batch_sizes.append(len(batch))
+            self._queue_times.extend(started - pending.enqueued for pending in batch)
+
+    def stats(self):
+        """Batch size and queue time metrics over the recent window"""
+        with self._stats_lock:
+            batch_sizes = np.array(self._batch_sizes, dtype=float)
+            queue_times = np.array(self._queue_times, dtype=float) * 1000.0
+            stats = {
+                'batches': self.batches,
+                'requests': self.requests,
+                'fallbacks': self.fallbacks,
+                'max_batch_size': self.max_seen_batch,
+                'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+                'max_wait_ms': self.max_wait * 1000.0
+            }
+        if len(batch_sizes):
+            stats['mean_batch_size'] = float(batch_sizes.mean())
+        if len(queue_times):
+            p50, p99 = np.percentile(queue_times, [50, 99])
+            stats['queue_time_ms'] = {'p50': float(p50), 'p99': float(p99), 'max': float(queue_times.max())}
+        return stats
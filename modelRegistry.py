@@ -0,0 +1,214 @@
+"""
+MODEL REGISTRY MODULE
+Versioned model directories with checksum manifests and an active-version pointer
+
+Layout (under models/, or LOAN_MODEL_DIR):
+
+    models/
+    ├── loan_model.ubj              # version "default" (the original flat layout)
+    ├── loan_encoder.joblib
+    ├── CURRENT                     # name of the active version (absent: "default")
+    └── versions/
+        └── 2026-03-01/
+            ├── loan_model.ubj
+            ├── loan_encoder.joblib
+            └── manifest.json       # sha256 of each file and the fingerprint
+
+Usage:
+    python modelRegistry.py list
+    python modelRegistry.py publish 2026-03-01 new_model.ubj new_encoder.joblib [--activate]
+    python modelRegistry.py activate 2026-03-01
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+MODEL_FILE = 'loan_model.ubj'
+ENCODER_FILE = 'loan_encoder.joblib'
+MANIFEST_FILE = 'manifest.json'
+
+# The model files directly under models/, as shipped before versioning
+DEFAULT_VERSION = 'default'
+
+_VERSION_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$')
+
+
+class ModelVersionError(Exception):
+    """Raised for unknown, malformed or corrupted model versions"""
+
+
+def _hash_file(digest, path):
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest
+
+
+def file_sha256(path):
+    return _hash_file(hashlib.sha256(), path).hexdigest()
+
+
+def model_fingerprint(model_path, encoder_path):
+    """Content hash of model + encoder, used to key cached reports"""
+    digest = hashlib.sha256()
+    for path in (model_path, encoder_path):
+        _hash_file(digest, path)
+    return digest.hexdigest()[:16]
+
+
+class ModelRegistry:
+    """Finds, verifies, publishes and activates model versions in one directory"""
+
+    def __init__(self, root=MODELS_DIR):
+        self.root = os.path.abspath(root)
+        self.versions_dir = os.path.join(self.root, 'versions')
+        self.current_file = os.path.join(self.root, 'CURRENT')
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.environ.get('LOAN_MODEL_DIR', MODELS_DIR))
+
+    def _check_name(self, version):
+        if version != DEFAULT_VERSION and not _VERSION_NAME.match(version or ''):
+            raise ModelVersionError(f"Invalid model version name: {version!r}")
+
+    def version_dir(self, version):
+        self._check_name(version)
+        if version == DEFAULT_VERSION:
+            return self.root
+        return os.path.join(self.versions_dir, version)
+
+    def paths(self, version):
+        """(model_path, encoder_path) of a version; raises if it doesn't exist"""
+        directory = self.version_dir(version)
+        model_path = os.path.join(directory, MODEL_FILE)
+        encoder_path = os.path.join(directory, ENCODER_FILE)
+        if not (os.path.isfile(model_path) and os.path.isfile(encoder_path)):
+            raise ModelVersionError(f"Model version {version!r} not found in {directory}")
+        return model_path, encoder_path
+
+    def active_version(self):
+        """The version named in CURRENT, or "default" when there is none"""
+        try:
+            with open(self.current_file) as f:
+                return f.read().strip() or DEFAULT_VERSION
+        except FileNotFoundError:
+            return DEFAULT_VERSION
+
+    def verify(self, version):
+        """Check a version's files against its manifest and return its fingerprint"""
+        model_path, encoder_path = self.paths(version)
+        manifest_path = os.path.join(self.version_dir(version), MANIFEST_FILE)
+        if os.path.isfile(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            for name, expected in manifest.get('sha256', {}).items():
+                if file_sha256(os.path.join(self.version_dir(version), name)) != expected:
+                    raise ModelVersionError(f"Checksum mismatch for {name} in model version {version!r}")
+        return model_fingerprint(model_path, encoder_path)
+
+    def versions(self):
+        """Every available version with its manifest details, oldest first"""
+        names = []
+        if os.path.isdir(self.versions_dir):
+            names = sorted(n for n in os.listdir(self.versions_dir) if _VERSION_NAME.match(n))
+        active = self.active_version()
+        found = []
+        for name in [DEFAULT_VERSION] + names:
+            try:
+                self.paths(name)
+            except ModelVersionError:
+                continue
+            entry = {'version': name, 'active': name == active}
+            manifest_path = os.path.join(self.version_dir(name), MANIFEST_FILE)
+            if os.path.isfile(manifest_path):
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+                entry['fingerprint'] = manifest.get('fingerprint')
+                entry['created'] = manifest.get('created')
+            found.append(entry)
+        return found
+
+    def publish(self, version, model_path, encoder_path, activate=False):
+        """Copy model files into a new version directory with a checksum manifest"""
+        if version == DEFAULT_VERSION:
+            raise ModelVersionError(f"{DEFAULT_VERSION!r} is reserved for the flat models/ layout")
+        target = self.version_dir(version)
+        if os.path.exists(target):
+            raise ModelVersionError(f"Model version {version!r} already exists")
+        os.makedirs(self.versions_dir, exist_ok=True)
+
+        # Build the version next to its final place, then rename it in one step
+        staging = tempfile.mkdtemp(prefix=f'.{version}-', dir=self.versions_dir)
+        try:
+            shutil.copyfile(model_path, os.path.join(staging, MODEL_FILE))
+            shutil.copyfile(encoder_path, os.path.join(staging, ENCODER_FILE))
+            manifest = {
+                'version': version,
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'sha256': {name: file_sha256(os.path.join(staging, name)) for name in (MODEL_FILE, ENCODER_FILE)},
+                'fingerprint': model_fingerprint(os.path.join(staging, MODEL_FILE), os.path.join(staging, ENCODER_FILE))
+            }
+            with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.rename(staging, target)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if activate:
+            self.activate(version)
+        return manifest
+
+    def activate(self, version):
+        """Point CURRENT at a verified version (workers watching it reload)"""
+        self.verify(version)
+        fd, temporary = tempfile.mkstemp(prefix='.CURRENT-', dir=self.root)
+        with os.fdopen(fd, 'w') as f:
+            f.write(version + '\n')
+        os.replace(temporary, self.current_file)
+
+
+# Create global instance
+model_registry = ModelRegistry.from_env()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage versioned loan model files')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='show available versions')
+    publish = commands.add_parser('publish', help='add a new version')
+    publish.add_argument('version')
+    publish.add_argument('model', help='XGBoost .ubj model file')
+    publish.add_argument('encoder', help='joblib OneHotEncoder file')
+    publish.add_argument('--activate', action='store_true', help='make it the active version')
+    activate = commands.add_parser('activate', help='make a version the active one')
+    activate.add_argument('version')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'publish':
+            manifest = model_registry.publish(args.version, args.model, args.encoder, args.activate)
+            print(f"✓ Published {args.version} (fingerprint {manifest['fingerprint']})")
+        elif args.command == 'activate':
+            model_registry.activate(args.version)
+            print(f"✓ {args.version} is now the active model version")
+        for entry in model_registry.versions():
+            marker = '*' if entry['active'] else ' '
+            print(f" {marker} {entry['version']:<24} {entry.get('fingerprint') or '':<18} {entry.get('created') or ''}")
+    except ModelVersionError as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+PREDICTION STORE MODULE
+Keeps prediction results server-side under short opaque ids
+"""
+
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from sqliteConnection import ForkSafeSQLite
+
+
+def new_prediction_id():
+    """Unguessable id; it is the only thing that grants access to a result"""
+    return secrets.token_urlsafe(12)
+
+
+class InMemoryPredictionStore:
+    """In-process store with an entry limit and a TTL; the oldest entries are evicted first"""
+
+    def __init__(self, max_entries=10000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.expired = 0
+        self.evicted = 0
+
+    def put(self, result):
+        """Store a prediction result and return its id"""
+        prediction_id = new_prediction_id()
+        with self._lock:
+            now = time.time()
+            self._entries[prediction_id] = (now, result)
+            # Oldest entries sit at the front
+            while self._entries:
+                oldest_id, (stored_at, _) = next(iter(self._entries.items()))
+                if now - stored_at <= self.ttl:
+                    break
+                del self._entries[oldest_id]
+                self.expired += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+        return prediction_id
+
+    def get(self, prediction_id):
+        """Return the stored result, or None if unknown or expired"""
+        if not prediction_id:
+            return None
+        with self._lock:
+            entry = self._entries.get(prediction_id)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl:
+                del self._entries[prediction_id]
+                self.expired += 1
+                return None
+            return entry[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'expired': self.expired,
+                'evicted': self.evicted
+            }
+
+
+class SQLitePredictionStore(ForkSafeSQLite):
+    """SQLite-backed store with the same limits, shareable between processes"""
+
+    def __init__(self, path, max_entries=10000, ttl=3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS predictions ('
+            'prediction_id TEXT PRIMARY KEY, result TEXT NOT NULL, stored_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_predictions_stored_at ON predictions (stored_at)')
+        self._conn.commit()
+        self.expired = 0
+        self.evicted = 0
+
+    def put(self, result):
+        prediction_id = new_prediction_id()
+        with self._lock:
+            now = time.time()
+            self._conn.execute(
+                'INSERT INTO predictions (prediction_id, result, stored_at) VALUES (?, ?, ?)',
+                (prediction_id, json.dumps(result), now)
+            )
+            cursor = self._conn.execute('DELETE FROM predictions WHERE stored_at < ?', (now - self.ttl,))
+            self.expired += cursor.rowcount
+            cursor = self._conn.execute(
+                'DELETE FROM predictions WHERE prediction_id IN ('
+                'SELECT prediction_id FROM predictions ORDER BY stored_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+            self.evicted += cursor.rowcount
+            self._conn.commit()
+        return prediction_id
+
+    def get(self, prediction_id):
+        if not prediction_id:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT result FROM predictions WHERE prediction_id = ? AND stored_at >= ?',
+                (prediction_id, time.time() - self.ttl)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+            return {
+                'backend': 'sqlite',
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'expired': self.expired,
+                'evicted': self.evicted
+            }
+
+
+def store_from_env():
+    """Build the prediction store from LOAN_PREDICTION_* environment variables"""
+    max_entries = int(os.environ.get('LOAN_PREDICTION_MAX', '10000'))
+    ttl = float(os.environ.get('LOAN_PREDICTION_TTL', '3600'))
+    if os.environ.get('LOAN_PREDICTION_STORE', 'memory') == 'sqlite':
+        path = os.environ.get('LOAN_PREDICTION_SQLITE_PATH', 'predictions.db')
+        return SQLitePredictionStore(path, max_entries, ttl)
+    return InMemoryPredictionStore(max_entries, ttl)
+
+
+# Create global instance
+prediction_store = store_from_env()
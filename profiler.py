@@ -0,0 +1,395 @@
+"""
+PROFILER MODULE
+On-demand per-request CPU / allocation profiles and a rolling hot-function sampler
+"""
+
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# Modules whose functions the background sampler ranks
+HOT_MODULES = ('loanPredictor', 'reportGenerator', 'chatbot')
+
+# Deepest stack kept per sample
+MAX_STACK_DEPTH = 64
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{code.co_qualname}"
+
+
+def folded_stack(frame):
+    """One stack as 'outer;...;inner' (the collapsed format flame graph tools read)"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def write_folded(path, counts):
+    """Write 'stack count' lines, largest first"""
+    with open(path, 'w') as f:
+        for stack, count in counts.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+class StackSampler:
+    """Samples one thread's stack every interval seconds from a helper thread"""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.counts[folded_stack(frame)] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+
+@contextmanager
+def profile_block(profile_id, directory, label='', interval=0.005, nframes=32):
+    """
+    Profile the calling thread for the duration of the block.
+
+    Writes <profile_id>.cpu.folded (stack samples), <profile_id>.alloc.folded
+    (bytes still allocated at the end, by allocation traceback),
+    <profile_id>.tracemalloc (a snapshot for tracemalloc.Snapshot.load) and a
+    <profile_id>.json summary. tracemalloc sees every thread of the process,
+    and slows them all while it runs.
+    """
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, profile_id)
+
+    was_tracing = tracemalloc.is_tracing()
+    if was_tracing:
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.start(nframes)
+    sampler = StackSampler(threading.get_ident(), interval).start()
+    started = time.perf_counter()
+    try:
+        yield base
+    finally:
+        elapsed = time.perf_counter() - started
+        counts = sampler.stop()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if not was_tracing:
+            tracemalloc.stop()
+
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__)
+        ])
+        allocations = Counter()
+        for stat in snapshot.statistics('traceback'):
+            stack = ';'.join(f"{os.path.basename(frame.filename)}:{frame.lineno}" for frame in stat.traceback)
+            allocations[stack] += stat.size
+
+        write_folded(f'{base}.cpu.folded', counts)
+        write_folded(f'{base}.alloc.folded', allocations)
+        snapshot.dump(f'{base}.tracemalloc')
+        with open(f'{base}.json', 'w') as f:
+            json.dump({
+                'profile_id': profile_id,
+                'label': label,
+                'pid': os.getpid(),
+                'seconds': round(elapsed, 6),
+                'cpu_samples': sampler.samples,
+                'sample_interval_ms': interval * 1000.0,
+                'traced_current_mb': round(current / (1024.0 * 1024.0), 3),
+                'traced_peak_mb': round(peak / (1024.0 * 1024.0), 3),
+                'top_allocations': [
+                    {'site': str(stat.traceback[-1]), 'kb': round(stat.size / 1024.0, 1), 'count': stat.count}
+                    for stat in snapshot.statistics('lineno')[:20]
+                ]
+            }, f, indent=2)
+
+
+class RequestProfiler:
+    """
+    Opt-in profiling of individual requests.
+
+    Disabled unless a token is configured. A request is profiled when it
+    carries the token in X-Profile-Token, or when its endpoint was armed
+    through the admin endpoint. At most one profile runs per process at a
+    time, and a new one starts no sooner than min_interval seconds after the
+    previous one began; other requests are served unprofiled.
+    """
+
+    def __init__(self, token=None, directory='profiles', min_interval=30.0, interval=0.005):
+        self.token = token or None
+        self.directory = os.path.abspath(directory)
+        self.min_interval = min_interval
+        self.interval = interval
+
+        self._lock = threading.Lock()
+        self._busy = False
+        self._last_started = None
+        self._armed = {}
+
+        self.captured = 0
+        self.rate_limited = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build the profiler from LOAN_PROFILE_* environment variables"""
+        return cls(
+            token=os.environ.get('LOAN_PROFILE_TOKEN'),
+            directory=os.environ.get('LOAN_PROFILE_DIR', 'profiles'),
+            min_interval=float(os.environ.get('LOAN_PROFILE_MIN_INTERVAL', '30')),
+            interval=float(os.environ.get('LOAN_PROFILE_SAMPLE_MS', '5')) / 1000.0
+        )
+
+    @property
+    def enabled(self):
+        return self.token is not None
+
+    def authorized(self, token):
+        return self.enabled and token is not None and secrets.compare_digest(token, self.token)
+
+    def arm(self, endpoint, count=1):
+        """Profile the next count requests to endpoint (rate limits still apply)"""
+        with self._lock:
+            self._armed[endpoint] = self._armed.get(endpoint, 0) + count
+            return dict(self._armed)
+
+    def wanted(self, endpoint, token):
+        """Whether this request asked (or was armed) to be profiled"""
+        if self.authorized(token):
+            return True
+        if not self._armed:
+            return False
+        with self._lock:
+            remaining = self._armed.get(endpoint, 0)
+            if remaining <= 0:
+                return False
+            if remaining == 1:
+                del self._armed[endpoint]
+            else:
+                self._armed[endpoint] = remaining - 1
+            return True
+
+    def acquire(self, endpoint):
+        """A new profile id, or None if another profile is running or one ran too recently"""
+        now = time.monotonic()
+        with self._lock:
+            if self._busy or (self._last_started is not None and now - self._last_started < self.min_interval):
+                self.rate_limited += 1
+                return None
+            self._busy = True
+            self._last_started = now
+            self.captured += 1
+        return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{endpoint}-{os.getpid()}-{secrets.token_hex(3)}"
+
+    def release(self):
+        with self._lock:
+            self._busy = False
+
+    def profile(self, profile_id, label=''):
+        """Context manager profiling the calling thread into the profile directory"""
+        return profile_block(profile_id, self.directory, label, self.interval)
+
+    def recent(self, limit=20):
+        """Summaries of the newest profiles in the directory (any process)"""
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith('.json')]
+        except FileNotFoundError:
+            return []
+        summaries = []
+        for name in sorted(names, reverse=True)[:limit]:
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summary.pop('top_allocations', None)
+            summaries.append(summary)
+        return summaries
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'directory': self.directory,
+                'captured': self.captured,
+                'rate_limited': self.rate_limited,
+                'armed': dict(self._armed)
+            }
+
+
+class HotFunctionSampler:
+    """
+    Low-rate wall-clock sampler of every thread, ranking functions of
+    HOT_MODULES over a rolling window.
+
+    "self" counts samples where the function was the innermost frame from
+    those modules, "total" counts samples where it was anywhere on the stack.
+    The window is kept as a ring of slots, so old samples age out in steps of
+    window / slots seconds.
+
+    Report workers run their own sampler; drain() there and merge() here
+    bring their counts into this ranking.
+    """
+
+    def __init__(self, interval=0.1, window=600.0, slots=10, modules=HOT_MODULES):
+        self.interval = interval
+        self.window = window
+        self.slot_seconds = window / slots
+        self.modules = frozenset(modules)
+
+        self._lock = threading.Lock()
+        self._slots = deque(maxlen=slots)
+        self._thread = None
+        self._stop = threading.Event()
+        self._pid = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            interval=float(os.environ.get('LOAN_PROFILE_SAMPLER_MS', '100')) / 1000.0,
+            window=float(os.environ.get('LOAN_PROFILE_SAMPLER_WINDOW', '600'))
+        )
+
+    @property
+    def running(self):
+        return self._thread is not None and self._pid == os.getpid()
+
+    def start(self):
+        """Start sampling in a daemon thread (idempotent)"""
+        if self.running:
+            return self
+        self._stop = threading.Event()
+        self._slots.clear()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='hot-function-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self.running:
+            self._stop.set()
+            self._thread.join()
+        self._thread = None
+
+    def _after_fork(self):
+        # Threads don't survive fork; keep sampling in the child (gunicorn workers)
+        if self._thread is not None:
+            self._lock = threading.Lock()
+            self._thread = None
+            self.start()
+
+    def _current_slot(self, now):
+        started = now - now % self.slot_seconds
+        if not self._slots or self._slots[-1][0] != started:
+            self._slots.append((started, Counter(), Counter(), [0]))
+        return self._slots[-1]
+
+    def _run(self):
+        own = threading.get_ident()
+        modules = self.modules
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                _, self_counts, total_counts, samples = self._current_slot(time.time())
+                samples[0] += 1
+                for thread_id, frame in frames.items():
+                    if thread_id == own:
+                        continue
+                    seen = set()
+                    innermost = None
+                    depth = 0
+                    while frame is not None and depth < MAX_STACK_DEPTH:
+                        if frame.f_globals.get('__name__') in modules:
+                            name = _frame_name(frame)
+                            if innermost is None:
+                                innermost = name
+                            seen.add(name)
+                        frame = frame.f_back
+                        depth += 1
+                    if innermost is not None:
+                        self_counts[innermost] += 1
+                        total_counts.update(seen)
+            del frames
+
+    def drain(self):
+        """Take and clear everything sampled so far, as (self counts, total counts)"""
+        self_counts, total_counts = Counter(), Counter()
+        with self._lock:
+            for _, slot_self, slot_total, _ in self._slots:
+                self_counts.update(slot_self)
+                total_counts.update(slot_total)
+            self._slots.clear()
+        return dict(self_counts), dict(total_counts)
+
+    def merge(self, self_counts, total_counts):
+        """Add another process's drained counts (sampled at the same interval)
+
+        Its ticks are not added, so 'share' stays the average number of
+        threads in a function per tick, across all processes.
+        """
+        with self._lock:
+            _, slot_self, slot_total, _ = self._current_slot(time.time())
+            slot_self.update(self_counts)
+            slot_total.update(total_counts)
+
+    def hottest(self, top=20):
+        """Functions of HOT_MODULES with the most samples in the window"""
+        cutoff = time.time() - self.window
+        self_counts, total_counts = Counter(), Counter()
+        ticks = 0
+        with self._lock:
+            for started, slot_self, slot_total, samples in self._slots:
+                if started + self.slot_seconds <= cutoff:
+                    continue
+                self_counts.update(slot_self)
+                total_counts.update(slot_total)
+                ticks += samples[0]
+        return {
+            'running': self.running,
+            'interval_ms': self.interval * 1000.0,
+            'window_seconds': self.window,
+            'ticks': ticks,
+            'functions': [
+                {
+                    'function': name,
+                    'total': count,
+                    'self': self_counts.get(name, 0),
+                    # Threads inside the function per tick, on average
+                    'share': round(count / ticks, 4) if ticks else 0.0
+                }
+                for name, count in total_counts.most_common(top)
+            ]
+        }
+
+
+# Create global instances
+request_profiler = RequestProfiler.from_env()
+hot_sampler = HotFunctionSampler.from_env()
+os.register_at_fork(after_in_child=hot_sampler._after_fork)
@@ -0,0 +1,185 @@
+"""
+REPORT CACHE MODULE
+Bounded, content-addressed cache for LIME explanations and rendered reports
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from loanPredictor import REQUIRED_FIELDS
+
+
+def application_key(application_data, model_fingerprint):
+    """Canonical hash of the report inputs: application fields plus model version"""
+    canonical = {}
+    for field in REQUIRED_FIELDS:
+        value = application_data[field]
+        # 30 and 30.0 from different clients describe the same applicant
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+        canonical[field] = value
+    payload = json.dumps([model_fingerprint, canonical], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ReportCache:
+    """
+    LRU cache of byte strings bounded by total size, with an optional on-disk
+    tier. Memory misses fall through to disk and are promoted on hit.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None, max_disk_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._disk_entries = OrderedDict()
+        self._disk_bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    @classmethod
+    def from_env(cls):
+        """Build the cache from LOAN_REPORT_CACHE_* environment variables"""
+        return cls(
+            max_bytes=int(float(os.environ.get('LOAN_REPORT_CACHE_MB', '64')) * 1024 * 1024),
+            disk_dir=os.environ.get('LOAN_REPORT_CACHE_DIR') or None,
+            max_disk_bytes=int(float(os.environ.get('LOAN_REPORT_CACHE_DISK_MB', '512')) * 1024 * 1024)
+        )
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def _load_disk_index(self):
+        """Rebuild the disk LRU order from file modification times"""
+        files = []
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            if not name.endswith('.tmp') and os.path.isfile(path):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(files):
+            self._disk_entries[path] = size
+            self._disk_bytes += size
+
+    def get(self, key):
+        """Return cached bytes for key, or None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+            if self.disk_dir:
+                # Other worker processes may have written the file since startup
+                path = self._disk_path(key)
+                if path in self._disk_entries or os.path.isfile(path):
+                    try:
+                        with open(path, 'rb') as f:
+                            value = f.read()
+                    except OSError:
+                        self._drop_disk_entry(path)
+                    else:
+                        if path not in self._disk_entries:
+                            self._disk_bytes += len(value)
+                        self._disk_entries[path] = len(value)
+                        self._disk_entries.move_to_end(path)
+                        self.disk_hits += 1
+                        self._put_memory(key, value)
+                        return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Store bytes under key, evicting least recently used entries"""
+        with self._lock:
+            self._put_memory(key, value)
+            if self.disk_dir:
+                self._put_disk(key, value)
+
+    def _put_memory(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._entries[key] = value
+        self._bytes += len(value)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def _put_disk(self, key, value):
+        if len(value) > self.max_disk_bytes:
+            return
+        path = self._disk_path(key)
+        # Write then rename so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Report cache disk write failed: {str(e)}")
+            return
+        self._drop_disk_entry(path, remove=False)
+        self._disk_entries[path] = len(value)
+        self._disk_bytes += len(value)
+        while self._disk_bytes > self.max_disk_bytes:
+            oldest = next(iter(self._disk_entries))
+            self._drop_disk_entry(oldest)
+            self.evictions += 1
+
+    def _drop_disk_entry(self, path, remove=True):
+        size = self._disk_entries.pop(path, None)
+        if size is not None:
+            self._disk_bytes -= size
+        if remove:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            for path in list(self._disk_entries):
+                self._drop_disk_entry(path)
+
+    def stats(self):
+        """Hit/miss counters and current sizes"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'disk_entries': len(self._disk_entries),
+                'disk_bytes': self._disk_bytes
+            }
+
+
+# Create global instance
+report_cache = ReportCache.from_env()
@@ -6,128 +6,187 @@ Generates beautiful visual reports with AI explainability
 import pandas as pd
 import numpy as np
 from lime.lime_tabular import LimeTabularExplainer
+import xgboost as xgb
 import matplotlib
 matplotlib.use('Agg')  # Non-interactive backend for server
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.patches import Circle, Wedge, Rectangle, FancyBboxPatch
-from datetime import datetime
+from datetime import datetime, date
 import io
+import json
+import os
+import threading
 import warnings
+from loanPredictor import FEATURE_NAMES, build_feature_layout
+from reportCache import report_cache, application_key
+from metrics import CACHE_REQUESTS, ERRORS, STAGE_SECONDS
 warnings.filterwarnings('ignore')
 
+# Precomputed LIME background shipped next to the model (see build_background_file)
+BACKGROUND_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'lime_background.npy')
 
-class LoanExplainer:
-    """LIME-based explainability for loan predictions"""
 
-    def __init__(self, model, encoder, expected_columns):
+class LoanExplainer:
+    """Explainability for loan predictions (LIME or XGBoost TreeSHAP backend)"""
+
+    BACKENDS = ('lime', 'shap')
+
+    # Integer codes LIME uses for each categorical feature (by feature index)
+    CATEGORICAL_NAMES = {
+        1: ['female', 'male'],
+        2: ['Associate', 'Bachelor', 'Doctorate', 'High School', 'Master'],
+        5: ['MORTGAGE', 'OTHER', 'OWN', 'RENT'],
+        7: ['DEBTCONSOLIDATION', 'EDUCATION', 'HOMEIMPROVEMENT', 'MEDICAL', 'PERSONAL', 'VENTURE'],
+        11: ['No', 'Yes']
+    }
+
+    def __init__(self, model, encoder, expected_columns, backend='lime'):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown explainer backend: {backend}")
         self.model = model
         self.encoder = encoder
         self.expected_columns = expected_columns
+        self.backend = backend
         self.explainer = None
-
-    def initialize_explainer(self, n_samples=100):
-        """Initialize LIME explainer with synthetic training data"""
-        np.random.seed(42)
-        training_data = self._create_training_data(n_samples)
-
-        feature_names = [
-            'person_age', 'person_gender', 'person_education', 'person_income',
-            'person_emp_exp', 'person_home_ownership', 'loan_amnt', 'loan_intent',
-            'loan_percent_income', 'cb_person_cred_hist_length', 'credit_score',
-            'previous_loan_defaults_on_file'
-        ]
-
-        categorical_features = [1, 2, 5, 7, 11]
-        categorical_names = {
-            1: ['female', 'male'],
-            2: ['Associate', 'Bachelor', 'Doctorate', 'High School', 'Master'],
-            5: ['MORTGAGE', 'OTHER', 'OWN', 'RENT'],
-            7: ['DEBTCONSOLIDATION', 'EDUCATION', 'HOMEIMPROVEMENT', 'MEDICAL', 'PERSONAL', 'VENTURE'],
-            11: ['No', 'Yes']
-        }
+        self._columns = None
+        self._numeric_index = None
+        self._category_lookup = None
+        self._feature_groups = None
+
+    def initialize_explainer(self, n_samples=100, background_path=BACKGROUND_PATH, seed=42):
+        """
+        Initialize LIME explainer with background data
+
+        Uses the precomputed background file when it holds exactly n_samples
+        rows, otherwise generates synthetic data with a local RNG.
+        """
+        if self.backend != 'lime':
+            # TreeSHAP reads the trees directly and needs no background data
+            return True
+
+        training_data = None
+        if background_path and os.path.exists(background_path):
+            background = np.load(background_path)
+            if background.shape == (n_samples, len(FEATURE_NAMES)):
+                training_data = background
+        if training_data is None:
+            training_data = self._create_training_data(n_samples, seed)
 
         self.explainer = LimeTabularExplainer(
             training_data=training_data,
-            feature_names=feature_names,
-            categorical_features=categorical_features,
-            categorical_names=categorical_names,
+            feature_names=FEATURE_NAMES,
+            categorical_features=sorted(self.CATEGORICAL_NAMES),
+            categorical_names=self.CATEGORICAL_NAMES,
             mode='classification',
             random_state=42
         )
 
         return True
 
-    def _create_training_data(self, n_samples):
+    def _create_training_data(self, n_samples, seed=42):
         """Generate synthetic training data for LIME"""
-        data = []
-        for _ in range(n_samples):
-            row = [
-                np.random.randint(18, 70),  # age
-                np.random.choice([0, 1]),  # gender
-                np.random.randint(0, 5),  # education
-                np.random.randint(20000, 150000),  # income
-                np.random.randint(0, 30),  # employment exp
-                np.random.randint(0, 4),  # home ownership
-                np.random.randint(1000, 50000),  # loan amount
-                np.random.randint(0, 6),  # loan intent
-                0,  # loan percent income (calculated below)
-                np.random.randint(0, 30),  # credit history length
-                np.random.randint(300, 850),  # credit score
-                np.random.choice([0, 1])  # defaults
-            ]
-            row[8] = row[6] / row[3]  # Calculate loan_percent_income
-            data.append(row)
-        return np.array(data)
-
-    def _convert_to_encoded_format(self, instance):
-        """Convert LIME instance to model input format"""
-        maps = {
-            'gender': {0: 'female', 1: 'male'},
-            'education': {0: 'Associate', 1: 'Bachelor', 2: 'Doctorate', 3: 'High School', 4: 'Master'},
-            'ownership': {0: 'MORTGAGE', 1: 'OTHER', 2: 'OWN', 3: 'RENT'},
-            'intent': {0: 'DEBTCONSOLIDATION', 1: 'EDUCATION', 2: 'HOMEIMPROVEMENT', 3: 'MEDICAL', 4: 'PERSONAL', 5: 'VENTURE'},
-            'defaults': {0: 'No', 1: 'Yes'}
-        }
-
-        data = pd.DataFrame({
-            'person_age': [instance[0]],
-            'person_gender': [maps['gender'][int(instance[1])]],
-            'person_education': [maps['education'][int(instance[2])]],
-            'person_income': [instance[3]],
-            'person_emp_exp': [instance[4]],
-            'person_home_ownership': [maps['ownership'][int(instance[5])]],
-            'loan_amnt': [instance[6]],
-            'loan_intent': [maps['intent'][int(instance[7])]],
-            'loan_percent_income': [instance[8]],
-            'cb_person_cred_hist_length': [instance[9]],
-            'credit_score': [instance[10]],
-            'previous_loan_defaults_on_file': [maps['defaults'][int(instance[11])]]
-        })
-
-        # Preprocess
-        cat_columns = data.select_dtypes(include=['object']).columns
-        encoded = self.encoder.transform(data[cat_columns])
-        encoded_df = pd.DataFrame(encoded, columns=self.encoder.get_feature_names_out(cat_columns))
-        numerical_df = data.drop(columns=cat_columns).astype(float)
-        encoded_df = encoded_df.astype(float)
-        final_data = pd.concat([encoded_df, numerical_df], axis=1)
-
-        if self.expected_columns is not None:
-            final_data = final_data[self.expected_columns]
-
-        return final_data.astype(np.float32)
+        rng = np.random.default_rng(seed)
+        data = np.column_stack([
+            rng.integers(18, 70, n_samples),  # age
+            rng.integers(0, 2, n_samples),  # gender
+            rng.integers(0, 5, n_samples),  # education
+            rng.integers(20000, 150000, n_samples),  # income
+            rng.integers(0, 30, n_samples),  # employment exp
+            rng.integers(0, 4, n_samples),  # home ownership
+            rng.integers(1000, 50000, n_samples),  # loan amount
+            rng.integers(0, 6, n_samples),  # loan intent
+            np.zeros(n_samples),  # loan percent income (calculated below)
+            rng.integers(0, 30, n_samples),  # credit history length
+            rng.integers(300, 850, n_samples),  # credit score
+            rng.integers(0, 2, n_samples)  # defaults
+        ]).astype(float)
+        data[:, 8] = data[:, 6] / data[:, 3]  # Calculate loan_percent_income
+        return data
+
+    @classmethod
+    def background_from_applications(cls, columns, n_samples=100, seed=42):
+        """
+        LIME background sampled from real applications
+
+        columns maps feature name -> values (e.g. a DataFrame of historical
+        applications); categories become LIME's integer codes.
+        """
+        n_rows = len(columns['person_income'])
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(n_rows, size=min(n_samples, n_rows), replace=False)
+
+        data = np.zeros((len(rows), len(FEATURE_NAMES)))
+        for i, feature in enumerate(FEATURE_NAMES):
+            if feature == 'loan_percent_income':
+                continue
+            values = np.asarray(columns[feature])[rows]
+            if i in cls.CATEGORICAL_NAMES:
+                codes = {name: code for code, name in enumerate(cls.CATEGORICAL_NAMES[i])}
+                data[:, i] = [codes[value] for value in values]
+            else:
+                data[:, i] = values
+        data[:, 8] = data[:, 6] / data[:, 3]
+        return data
+
+    def _build_category_lookup(self):
+        """Precompute LIME category code -> model column lookup tables"""
+        columns, numeric_index, category_index = build_feature_layout(
+            self.encoder, self.expected_columns
+        )
+        self._columns = columns
+        self._numeric_index = numeric_index
+        self._category_lookup = {}
+        for i, names in self.CATEGORICAL_NAMES.items():
+            feature_columns = category_index[FEATURE_NAMES[i]]
+            # -1 marks the category dropped by the encoder (all zeros)
+            lookup = [feature_columns[name] for name in names]
+            self._category_lookup[i] = np.array(
+                [-1 if col is None else col for col in lookup], dtype=np.intp
+            )
+
+        # Sums model-column contributions back into the original features
+        self._feature_groups = np.zeros((len(columns), len(FEATURE_NAMES)), dtype=np.float32)
+        for i, feature in enumerate(FEATURE_NAMES):
+            if feature in numeric_index:
+                self._feature_groups[numeric_index[feature], i] = 1.0
+            else:
+                for col in category_index[feature].values():
+                    if col is not None:
+                        self._feature_groups[col, i] = 1.0
+
+    def _encode_batch(self, instances):
+        """Convert a matrix of LIME instances to model input format"""
+        if self._category_lookup is None:
+            self._build_category_lookup()
+
+        instances = np.asarray(instances, dtype=float)
+        n_rows = instances.shape[0]
+        rows = np.arange(n_rows)
+        encoded = np.zeros((n_rows, len(self._columns)), dtype=np.float32)
+
+        for i, feature in enumerate(FEATURE_NAMES):
+            lookup = self._category_lookup.get(i)
+            if lookup is None:
+                encoded[:, self._numeric_index[feature]] = instances[:, i]
+                continue
+
+            codes = instances[:, i].astype(np.intp)
+            if n_rows and (codes.min() < 0 or codes.max() >= len(lookup)):
+                raise ValueError(f"Unknown category code for {feature}")
+            cols = lookup[codes]
+            hot = cols >= 0
+            encoded[rows[hot], cols[hot]] = 1.0
+
+        return encoded
 
     def predict_fn(self, instances):
-        """Prediction function for LIME"""
-        predictions = []
-        for instance in instances:
-            processed = self._convert_to_encoded_format(instance)
-            prob = self.model.predict_proba(processed)[0]
-            predictions.append(prob)
-        return np.array(predictions)
+        """Prediction function for LIME (scores all perturbations in one call)"""
+        return self.model.predict_proba(self._encode_batch(instances))
 
-    def explain_prediction(self, application_data, prediction_result, num_features=10):
-        """Generate explanation for a prediction"""
+    def _to_instance(self, application_data):
+        """Application dict -> LIME instance (categories as integer codes)"""
         maps = {
             'gender': {'female': 0, 'male': 1},
             'education': {'Associate': 0, 'Bachelor': 1, 'Doctorate': 2, 'High School': 3, 'Master': 4},
@@ -151,9 +210,53 @@ class LoanExplainer:
             maps['defaults'][application_data['previous_loan_defaults_on_file']]
         ])
 
-        exp = self.explainer.explain_instance(instance, self.predict_fn, num_features=num_features)
-        explanation_list = exp.as_list()
+        return instance
 
+    def explain_prediction(self, application_data, prediction_result, num_features=10):
+        """Generate explanation for a prediction"""
+        with STAGE_SECONDS.labels(f'explain_{self.backend}').time():
+            if self.backend == 'shap':
+                return self.explain_batch([application_data], [prediction_result], num_features)[0]
+
+            instance = self._to_instance(application_data)
+            exp = self.explainer.explain_instance(instance, self.predict_fn, num_features=num_features)
+            return self._build_explanation(prediction_result, exp.as_list())
+
+    def explain_batch(self, applications, prediction_results, num_features=10, approximate=False):
+        """
+        TreeSHAP explanations for many applications with one booster call
+
+        Contributions are in log-odds and summed over each feature's one-hot
+        columns; factors are labelled 'feature=value'. approximate=True uses
+        XGBoost's much cheaper per-path (Saabas) attribution for bulk runs.
+        """
+        if self._category_lookup is None:
+            self._build_category_lookup()
+
+        instances = np.array([self._to_instance(a) for a in applications], dtype=float)
+        matrix = xgb.DMatrix(self._encode_batch(instances), feature_names=self._columns)
+        contributions = self.model.get_booster().predict(
+            matrix, pred_contribs=True, approx_contribs=approximate
+        )
+        # Last column is the bias term
+        grouped = contributions[:, :-1] @ self._feature_groups
+
+        explanations = []
+        for application_data, prediction_result, instance, weights in zip(
+                applications, prediction_results, instances, grouped):
+            order = np.argsort(-np.abs(weights), kind='stable')[:num_features]
+            explanation_list = []
+            for i in order:
+                feature = FEATURE_NAMES[i]
+                if feature == 'loan_percent_income':
+                    value = f'{instance[i]:.2f}'
+                else:
+                    value = application_data[feature]
+                explanation_list.append((f'{feature}={value}', float(weights[i])))
+            explanations.append(self._build_explanation(prediction_result, explanation_list))
+        return explanations
+
+    def _build_explanation(self, prediction_result, explanation_list):
         top_positive = [{'feature': f, 'weight': float(w)} for f, w in explanation_list if w > 0]
         top_negative = [{'feature': f, 'weight': float(w)} for f, w in explanation_list if w < 0]
 
@@ -163,14 +266,18 @@ class LoanExplainer:
             'top_positive_factors': top_positive,
             'top_negative_factors': top_negative,
             'risk_factors': prediction_result['risk_factors'],
-            'all_factors': explanation_list
+            'all_factors': explanation_list,
+            'counterfactuals': prediction_result.get('counterfactuals', [])
         }
 
 
 class UltraModernVisualizer:
     """Ultra-modern report visualizer"""
 
-    def __init__(self):
+    # A4: 8.27 x 11.69 inches
+    FIGSIZE = (8.27, 11.69)
+
+    def __init__(self, dpi=300, fast=True):
         # Minimal modern color palette
         self.bg = '#FFFFFF'
         self.dark = '#1A1A2E'
@@ -179,62 +286,119 @@ class UltraModernVisualizer:
         self.gray = '#E8E8E8'
         self.text = '#2E3440'
 
-    def create_report(self, explanation, app_data, filename=None):
+        # fast: reuse a prebuilt figure per DPI and only swap the per-report
+        # artists; otherwise build a new pyplot figure for every report
+        self.dpi = dpi
+        self.fast = fast
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def create_report(self, explanation, app_data, filename=None, dpi=None):
         """Create ultra-modern A4 report"""
+        dpi = dpi or self.dpi
+        if self.fast:
+            return self._create_report_fast(explanation, app_data, dpi)
 
-        # A4: 8.27 x 11.69 inches
-        fig = plt.figure(figsize=(8.27, 11.69), facecolor=self.bg)
+        with STAGE_SECONDS.labels('render').time():
+            fig = plt.figure(figsize=self.FIGSIZE, facecolor=self.bg)
+            axes = self._build_layout(fig)
+            self._draw_report(fig, axes, explanation, app_data)
 
-        # ==== HEADER ====
-        decision = "APPROVED" if explanation['prediction'] == 1 else "REJECTED"
-        color = self.green if explanation['prediction'] == 1 else self.red
+        # Save to buffer
+        buffer = io.BytesIO()
+        with STAGE_SECONDS.labels('savefig').time():
+            plt.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight', facecolor=self.bg)
+        buffer.seek(0)
+        plt.close()
 
-        # Ultra-bold heading
-        fig.text(0.5, 0.96, decision, ha='center', fontsize=56,
-                fontweight='black', color=color, family='sans-serif')
+        return buffer
+
+    def _build_layout(self, fig):
+        """Static parts of the report: quadrant axes, titles and backgrounds"""
+        # ==== HEADER ====
         fig.text(0.5, 0.92, 'LOAN APPLICATION ANALYSIS', ha='center',
                 fontsize=14, color=self.text, alpha=0.6)
 
         # ==== 4 QUADRANTS ====
 
         # QUADRANT 1: APPROVAL RING (Top Left)
-        ax1 = plt.axes([0.08, 0.58, 0.38, 0.3])
-        self._draw_approval_ring(ax1, explanation)
+        ax1 = fig.add_axes([0.08, 0.58, 0.38, 0.3])
+        self._setup_approval_ring(ax1)
 
         # QUADRANT 2: FEATURE SPLIT (Top Right)
-        ax2 = plt.axes([0.54, 0.58, 0.38, 0.3])
-        self._draw_feature_split(ax2, explanation)
+        ax2 = fig.add_axes([0.54, 0.58, 0.38, 0.3])
+        self._setup_feature_split(ax2)
 
         # QUADRANT 3: KEY METRICS (Bottom Left)
-        ax3 = plt.axes([0.08, 0.15, 0.38, 0.38])
-        self._draw_key_metrics(ax3, app_data, explanation)
+        ax3 = fig.add_axes([0.08, 0.15, 0.38, 0.38])
+        self._setup_key_metrics(ax3)
 
         # QUADRANT 4: IMPROVEMENT (Bottom Right)
-        ax4 = plt.axes([0.54, 0.15, 0.38, 0.38])
+        ax4 = fig.add_axes([0.54, 0.15, 0.38, 0.38])
+        self._setup_improvements(ax4)
+
+        return ax1, ax2, ax3, ax4
+
+    def _draw_report(self, fig, axes, explanation, app_data):
+        """Dynamic parts of the report for one application"""
+        ax1, ax2, ax3, ax4 = axes
+
+        decision = "APPROVED" if explanation['prediction'] == 1 else "REJECTED"
+        color = self.green if explanation['prediction'] == 1 else self.red
+
+        # Ultra-bold heading
+        fig.text(0.5, 0.96, decision, ha='center', fontsize=56,
+                fontweight='black', color=color, family='sans-serif')
+
+        self._draw_approval_ring(ax1, explanation)
+        self._draw_feature_split(ax2, explanation)
+        self._draw_key_metrics(ax3, app_data, explanation)
         self._draw_improvements(ax4, app_data, explanation)
 
         # Footer
         fig.text(0.5, 0.05, datetime.now().strftime("%B %d, %Y"),
                 ha='center', fontsize=9, color=self.text, alpha=0.4)
 
-        # Save to buffer
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight', facecolor=self.bg)
-        buffer.seek(0)
-        plt.close()
-
-        return buffer
-
-    def _draw_approval_ring(self, ax, explanation):
-        """Circular progress ring"""
+    def _get_template(self, dpi):
+        """Prebuilt figure with the static layout, one per DPI"""
+        template = self._templates.get(dpi)
+        if template is None:
+            fig = Figure(figsize=self.FIGSIZE, facecolor=self.bg, dpi=dpi)
+            FigureCanvasAgg(fig)
+            axes = self._build_layout(fig)
+            # Everything added after this point is per-report and removed again
+            static_counts = [(len(fig.texts), 0)] + [(len(ax.texts), len(ax.patches)) for ax in axes]
+            template = (fig, axes, static_counts)
+            self._templates[dpi] = template
+        return template
+
+    def _create_report_fast(self, explanation, app_data, dpi):
+        with self._lock:
+            fig, axes, static_counts = self._get_template(dpi)
+            try:
+                with STAGE_SECONDS.labels('render').time():
+                    self._draw_report(fig, axes, explanation, app_data)
+
+                # Save to buffer
+                buffer = io.BytesIO()
+                with STAGE_SECONDS.labels('savefig').time():
+                    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight', facecolor=self.bg)
+                buffer.seek(0)
+                return buffer
+            finally:
+                (n_fig_texts, _), *axes_counts = static_counts
+                dynamic = list(fig.texts[n_fig_texts:])
+                for ax, (n_texts, n_patches) in zip(axes, axes_counts):
+                    dynamic += ax.texts[n_texts:] + ax.patches[n_patches:]
+                for artist in dynamic:
+                    artist.remove()
+
+    def _setup_approval_ring(self, ax):
         ax.set_xlim(-1.3, 1.3)
         ax.set_ylim(-1.3, 1.3)
         ax.set_aspect('equal')
         ax.axis('off')
 
-        prob = explanation['probability']
-        color = self.green if explanation['prediction'] == 1 else self.red
-
         # Title
         ax.text(0, 1.2, 'APPROVAL SCORE', ha='center', fontsize=13,
                fontweight='bold', color=self.text)
@@ -243,12 +407,15 @@ class UltraModernVisualizer:
         bg_circle = Circle((0, 0), 1, fill=False, edgecolor=self.gray, linewidth=20)
         ax.add_patch(bg_circle)
 
-        # Progress arc (thick ring)
-        angle = prob * 360
-        theta = np.linspace(90, 90 - angle, 200)
+    def _draw_approval_ring(self, ax, explanation):
+        """Circular progress ring"""
+        prob = explanation['probability']
+        color = self.green if explanation['prediction'] == 1 else self.red
 
-        for i in range(len(theta) - 1):
-            wedge = Wedge((0, 0), 1, theta[i+1], theta[i],
+        # Progress arc (thick ring) as a single patch, clockwise from 12 o'clock
+        angle = prob * 360
+        if angle > 0:
+            wedge = Wedge((0, 0), 1, 90 - angle, 90,
                          width=0.2, facecolor=color, edgecolor='none', alpha=0.9)
             ax.add_patch(wedge)
 
@@ -261,23 +428,25 @@ class UltraModernVisualizer:
         ax.text(0, -0.4, status, ha='center', fontsize=12,
                color=color, fontweight='bold')
 
-    def _draw_feature_split(self, ax, explanation):
-        """Split positive/negative features"""
+    def _setup_feature_split(self, ax):
         ax.axis('off')
 
         # Title
         ax.text(0.5, 0.95, 'IMPACT ANALYSIS', transform=ax.transAxes,
                ha='center', fontsize=13, fontweight='bold', color=self.text)
+        ax.text(0.25, 0.85, 'POSITIVE', transform=ax.transAxes, ha='center',
+               fontsize=11, fontweight='bold', color=self.green)
+        ax.text(0.75, 0.85, 'NEGATIVE', transform=ax.transAxes, ha='center',
+               fontsize=11, fontweight='bold', color=self.red)
 
+    def _draw_feature_split(self, ax, explanation):
+        """Split positive/negative features"""
         # Get factors
         factors = sorted(explanation['all_factors'], key=lambda x: abs(x[1]), reverse=True)[:8]
         positive = [(f, w) for f, w in factors if w > 0][:4]
         negative = [(f, w) for f, w in factors if w < 0][:4]
 
         # LEFT: Positive (Green)
-        ax.text(0.25, 0.85, 'POSITIVE', transform=ax.transAxes, ha='center',
-               fontsize=11, fontweight='bold', color=self.green)
-
         y = 0.75
         max_w = max([abs(w) for _, w in factors]) if factors else 1
 
@@ -298,9 +467,6 @@ class UltraModernVisualizer:
             y -= 0.15
 
         # RIGHT: Negative (Red)
-        ax.text(0.75, 0.85, 'NEGATIVE', transform=ax.transAxes, ha='center',
-               fontsize=11, fontweight='bold', color=self.red)
-
         y = 0.75
         for feat, weight in negative:
             # Clean name
@@ -318,14 +484,19 @@ class UltraModernVisualizer:
 
             y -= 0.15
 
-    def _draw_key_metrics(self, ax, app_data, explanation):
-        """Key metrics visualization"""
+    def _setup_key_metrics(self, ax):
         ax.axis('off')
 
         # Title
         ax.text(0.5, 0.95, 'KEY METRICS', transform=ax.transAxes, ha='center',
                fontsize=13, fontweight='bold', color=self.text)
 
+        # Score bar background
+        rect_bg = Rectangle((0.1, 0.78), 0.8, 0.1, facecolor=self.gray, transform=ax.transAxes)
+        ax.add_patch(rect_bg)
+
+    def _draw_key_metrics(self, ax, app_data, explanation):
+        """Key metrics visualization"""
         # Credit Score - Large visual
         score = app_data['credit_score']
         score_pct = (score - 300) / (850 - 300)
@@ -344,8 +515,6 @@ class UltraModernVisualizer:
             rating = 'POOR'
 
         # Score bar
-        rect_bg = Rectangle((0.1, 0.78), 0.8, 0.1, facecolor=self.gray, transform=ax.transAxes)
-        ax.add_patch(rect_bg)
         rect_fill = Rectangle((0.1, 0.78), 0.8 * score_pct, 0.1,
                              facecolor=s_color, alpha=0.9, transform=ax.transAxes)
         ax.add_patch(rect_fill)
@@ -393,17 +562,37 @@ class UltraModernVisualizer:
             ax.text(0.5, 0.02, risk_text[:40], transform=ax.transAxes, ha='center',
                    fontsize=8, color=self.red)
 
-    def _draw_improvements(self, ax, app_data, explanation):
-        """Improvement recommendations"""
+    def _setup_improvements(self, ax):
         ax.axis('off')
 
         # Title
         ax.text(0.5, 0.95, 'HOW TO IMPROVE', transform=ax.transAxes, ha='center',
                fontsize=13, fontweight='bold', color=self.text)
 
-        # Generate tips
-        tips = []
+    @staticmethod
+    def _format_change(change):
+        # Escaped: two plain dollar signs in one string turn on mathtext
+        value_format = {
+            'loan_amnt': r'\${:,.0f}', 'person_income': r'\${:,.0f}',
+            'cb_person_cred_hist_length': '{}y', 'person_emp_exp': '{}y'
+        }.get(change['feature'], '{}')
+        return f"{change['label']} {value_format.format(change['from'])} → {value_format.format(change['to'])}"
 
+    def _draw_improvements(self, ax, app_data, explanation):
+        """Improvement recommendations"""
+        # Changes the model itself approves, when the counterfactual search found any
+        tips = []
+        if explanation['prediction'] == 0:
+            for option in explanation.get('counterfactuals', []):
+                changes = [self._format_change(change) for change in option['changes']]
+                if len(changes) > 2:
+                    changes = [' · '.join(changes[:2])] + changes[2:]
+                tips.append((f"OPTION {len(tips) + 1}: {option['probability']:.1%} APPROVAL", '\n'.join(changes)))
+        if tips:
+            self._draw_tips(ax, tips)
+            return
+
+        # Otherwise general advice from fixed thresholds
         if app_data['credit_score'] < 700:
             tips.append(('CREDIT SCORE', f'Target 700+\nCurrent: {app_data["credit_score"]}'))
 
@@ -427,7 +616,10 @@ class UltraModernVisualizer:
                 ('SAVE', 'Build emergency fund')
             ]
 
-        # Draw tips
+        self._draw_tips(ax, tips)
+
+    def _draw_tips(self, ax, tips):
+        """Up to five titled advice boxes"""
         y = 0.85
         for title, desc in tips[:5]:
             # Box
@@ -456,7 +648,43 @@ class UltraModernVisualizer:
 _explainer = None
 _visualizer = None
 
-def generate_loan_report(prediction_result, model, encoder, expected_columns):
+# Rows of LIME background data (initialization cost only, not per request)
+LIME_BACKGROUND_SIZE = int(os.environ.get('LOAN_LIME_BACKGROUND', '100'))
+
+# Bump when explanation or report output changes so stale cache entries miss
+REPORT_CACHE_VERSION = 3
+
+# Output resolution of generated reports
+REPORT_DPI = int(os.environ.get('LOAN_REPORT_DPI', '300'))
+
+# Explanation backend: 'lime' (sampled) or 'shap' (exact XGBoost TreeSHAP)
+EXPLAINER_BACKEND = os.environ.get('LOAN_EXPLAINER', 'lime')
+
+def build_background_file(csv_path, output_path=BACKGROUND_PATH, n_samples=LIME_BACKGROUND_SIZE, seed=42):
+    """Offline: sample a LIME background from a CSV of real applications"""
+    data = pd.read_csv(csv_path)
+    background = LoanExplainer.background_from_applications(data, n_samples, seed)
+    np.save(output_path, background)
+    return background.shape[0]
+
+def initialize_report_generator(model, encoder, expected_columns):
+    """Build the explainer and figure template up front (e.g. at worker start)"""
+    global _explainer, _visualizer
+
+    # Rebuilt when a reloaded model version is passed in
+    if _explainer is None or _explainer.model is not model:
+        print("Initializing explainer...")
+        _explainer = LoanExplainer(model, encoder, expected_columns, backend=EXPLAINER_BACKEND)
+        _explainer.initialize_explainer(LIME_BACKGROUND_SIZE)
+        print("Explainer initialized")
+
+    if _visualizer is None:
+        print("Initializing visualizer...")
+        _visualizer = UltraModernVisualizer(dpi=REPORT_DPI)
+        _visualizer._get_template(REPORT_DPI)
+        print("Visualizer initialized")
+
+def generate_loan_report(prediction_result, model, encoder, expected_columns, model_fingerprint=None):
     """
     Generate ultra-modern visual loan report
 
@@ -465,11 +693,11 @@ def generate_loan_report(prediction_result, model, encoder, expected_columns):
         model: The loaded XGBoost model
         encoder: The loaded OneHotEncoder
         expected_columns: List of expected column names
+        model_fingerprint: Model version hash; enables the report cache when given
 
     Returns:
         BytesIO object containing the PNG image report
     """
-    global _explainer, _visualizer
 
     try:
         print("Starting report generation...")
@@ -482,26 +710,44 @@ def generate_loan_report(prediction_result, model, encoder, expected_columns):
         if 'application_data' not in prediction_result:
             raise ValueError("application_data not in prediction_result")
 
+        # Serve repeat requests from the cache. The PNG footer shows today's
+        # date, so rendered reports are keyed by date as well.
+        explanation_key = report_key = None
+        if model_fingerprint is not None:
+            key = application_key(prediction_result['application_data'], model_fingerprint)
+            explanation_key = f"explanation:v{REPORT_CACHE_VERSION}:{EXPLAINER_BACKEND}:{key}"
+            report_key = (f"report:v{REPORT_CACHE_VERSION}:{EXPLAINER_BACKEND}:{key}:"
+                          f"{REPORT_DPI}:{date.today().isoformat()}")
+
+            cached_report = report_cache.get(report_key)
+            CACHE_REQUESTS.labels('report', 'miss' if cached_report is None else 'hit').inc()
+            if cached_report is not None:
+                print("Report served from cache")
+                return io.BytesIO(cached_report)
+
         # Initialize explainer and visualizer (once)
-        if _explainer is None:
-            print("Initializing explainer...")
-            _explainer = LoanExplainer(model, encoder, expected_columns)
-            _explainer.initialize_explainer(100)
-            print("Explainer initialized")
-
-        if _visualizer is None:
-            print("Initializing visualizer...")
-            _visualizer = UltraModernVisualizer()
-            print("Visualizer initialized")
-
-        # Generate explanation using LIME
-        print("Generating LIME explanation...")
-        explanation = _explainer.explain_prediction(
-            prediction_result['application_data'],
-            prediction_result,
-            num_features=10
-        )
-        print("Explanation generated")
+        initialize_report_generator(model, encoder, expected_columns)
+
+        # Generate explanation (LIME or TreeSHAP)
+        explanation = None
+        if explanation_key is not None:
+            cached_explanation = report_cache.get(explanation_key)
+            CACHE_REQUESTS.labels('explanation', 'miss' if cached_explanation is None else 'hit').inc()
+            if cached_explanation is not None:
+                explanation = json.loads(cached_explanation)
+                explanation['all_factors'] = [tuple(factor) for factor in explanation['all_factors']]
+                print("Explanation served from cache")
+
+        if explanation is None:
+            print(f"Generating {EXPLAINER_BACKEND.upper()} explanation...")
+            explanation = _explainer.explain_prediction(
+                prediction_result['application_data'],
+                prediction_result,
+                num_features=10
+            )
+            print("Explanation generated")
+            if explanation_key is not None:
+                report_cache.put(explanation_key, json.dumps(explanation).encode('utf-8'))
 
         # Create visual report
         print("Creating visual report...")
@@ -511,12 +757,16 @@ def generate_loan_report(prediction_result, model, encoder, expected_columns):
         )
         print("Visual report created")
 
+        if report_key is not None:
+            report_cache.put(report_key, report_buffer.getvalue())
+
         # Ensure buffer is at start
         report_buffer.seek(0)
 
         return report_buffer
 
     except Exception as e:
+        ERRORS.labels('report').inc()
         print(f"ERROR in generate_loan_report: {str(e)}")
         import traceback
         traceback.print_exc()
@@ -0,0 +1,389 @@
+"""
+REPORT JOBS MODULE
+Runs report generation in a process pool behind short-lived job ids
+"""
+
+import contextlib
+import multiprocessing
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from reportCache import application_key
+from sqliteConnection import ForkSafeSQLite
+from metrics import REGISTRY
+
+
+class QueueFullError(Exception):
+    """Raised when too many report jobs are already pending"""
+
+
+class ReportError(Exception):
+    """A failed report, carrying the metric updates made before it failed"""
+
+    def __init__(self, message, observations=()):
+        super().__init__(message)
+        self.observations = list(observations)
+
+    def __reduce__(self):
+        return type(self), (str(self), self.observations)
+
+
+# Per-process predictor, loaded once by _init_worker
+_worker_predictor = None
+
+
+def _load_worker_predictor(version=None):
+    """Load (or switch) this worker's model version"""
+    global _worker_predictor
+    from loanPredictor import LoanPredictor
+    # LIME and TreeSHAP need the real booster, whatever LOAN_MODEL_BACKEND says
+    candidate = LoanPredictor(backend='xgboost')
+    if not candidate.load_model(version):
+        raise RuntimeError(f"Failed to load model and encoder: {candidate.load_error}")
+    _worker_predictor = candidate
+
+
+def _init_worker():
+    """Load the model once in each report worker process"""
+    _load_worker_predictor()
+    # Report functions only run here, so the hot-function sampler has to as well
+    if os.environ.get('LOAN_PROFILE_SAMPLER', '0') == '1':
+        from profiler import hot_sampler
+        hot_sampler.start()
+    # Pay for LIME, matplotlib and the figure template now, not on the first job
+    from reportGenerator import initialize_report_generator
+    initialize_report_generator(
+        _worker_predictor.model,
+        _worker_predictor.encoder,
+        _worker_predictor.expected_column_order
+    )
+
+
+def _worker_state():
+    """What a report worker sends back with each finished job"""
+    from profiler import hot_sampler
+    from reportCache import report_cache
+    state = {'pid': os.getpid(), 'report_cache': report_cache.stats()}
+    if hot_sampler.running:
+        state['hot_functions'] = hot_sampler.drain()
+    return state
+
+
+def _run_report(prediction_result, profile_id=None):
+    """Generate one report in a worker; returns the PNG bytes, the metric updates and the worker's state"""
+    from counterfactuals import find_counterfactuals
+    from reportGenerator import generate_loan_report
+    # Explain the prediction with the model version that made it
+    version = prediction_result.get('model_version')
+    if version is not None and version != _worker_predictor.model_version:
+        try:
+            _load_worker_predictor(version)
+        except Exception as e:
+            raise ReportError(str(e)) from None
+    fingerprint = prediction_result.get('model_fingerprint')
+    if fingerprint is not None and fingerprint != _worker_predictor.model_fingerprint:
+        raise ReportError(f"Model version {version} has changed since this prediction was made")
+    predictor = _worker_predictor
+    profile = contextlib.nullcontext()
+    if profile_id is not None:
+        from profiler import request_profiler
+        profile = request_profiler.profile(f'{profile_id}.worker', label='report worker')
+    # Stage timings and cache hits are recorded here but reported by the web process
+    with profile, REGISTRY.capture() as observations:
+        # Rejected applications get model-driven "what would get me approved" advice
+        if prediction_result.get('prediction') == 0 and 'counterfactuals' not in prediction_result:
+            try:
+                search = find_counterfactuals(predictor, prediction_result['application_data'])
+                prediction_result = dict(prediction_result, counterfactuals=search['counterfactuals'])
+            except Exception as e:
+                print(f"Counterfactual search failed, using general advice: {str(e)}")
+        try:
+            buffer = generate_loan_report(
+                prediction_result,
+                predictor.model,
+                predictor.encoder,
+                predictor.expected_column_order,
+                model_fingerprint=predictor.model_fingerprint
+            )
+        except Exception as e:
+            raise ReportError(str(e), observations) from None
+    return buffer.getvalue(), observations, _worker_state()
+
+
+class ReportJob:
+    """State of one report generation job"""
+
+    def __init__(self, job_id, key):
+        self.id = job_id
+        self.key = key
+        self.status = 'queued'
+        self.created = time.time()
+        self.finished = None
+        self.error = None
+        self.png = None
+        self.future = None
+        self.model_version = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        state = self.status
+        if state == 'queued' and self.future is not None and self.future.running():
+            state = 'running'
+        status = {'job_id': self.id, 'status': state, 'model_version': self.model_version}
+        if self.error is not None:
+            status['message'] = self.error
+        if self.finished is not None:
+            status['seconds'] = round(self.finished - self.created, 3)
+        return status
+
+
+class SQLiteJobStore(ForkSafeSQLite):
+    """
+    Job states and finished PNGs in SQLite, so any web worker can answer for
+    a job another one submitted (gunicorn runs several).
+
+    Only the submitting process runs and waits for a job; the others see a
+    snapshot of the row, "queued" until it finishes.
+    """
+
+    def __init__(self, path, ttl=600, max_results=64):
+        self.path = path
+        self.ttl = ttl
+        self.max_results = max_results
+        self._lock = threading.Lock()
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS report_jobs ('
+            'job_id TEXT PRIMARY KEY, status TEXT NOT NULL, model_version TEXT, error TEXT, png BLOB, '
+            'created REAL NOT NULL, finished REAL)'
+        )
+        self._conn.commit()
+
+    def save(self, job):
+        """Insert or update a job's row and drop expired and excess finished ones"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO report_jobs (job_id, status, model_version, error, png, created, finished) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job.id, job.status, job.model_version, job.error, job.png, job.created, job.finished)
+            )
+            # Unfinished rows expire too, in case their worker died with them
+            self._conn.execute(
+                'DELETE FROM report_jobs WHERE COALESCE(finished, created) < ?', (time.time() - self.ttl,)
+            )
+            self._conn.execute(
+                'DELETE FROM report_jobs WHERE job_id IN ('
+                'SELECT job_id FROM report_jobs WHERE finished IS NOT NULL '
+                'ORDER BY finished DESC LIMIT -1 OFFSET ?)',
+                (self.max_results,)
+            )
+            self._conn.commit()
+
+    def load(self, job_id):
+        """Snapshot of a job submitted by any process, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status, model_version, error, png, created, finished FROM report_jobs '
+                'WHERE job_id = ? AND COALESCE(finished, created) >= ?',
+                (job_id, time.time() - self.ttl)
+            ).fetchone()
+        if row is None:
+            return None
+        job = ReportJob(job_id, None)
+        job.status, job.model_version, job.error, job.png, job.created, job.finished = row
+        if job.finished is not None:
+            job.done.set()
+        return job
+
+
+class ReportJobManager:
+    """
+    Submits reports to a process pool and tracks them by job id.
+
+    Identical applications (same content key, model and day) share one job
+    while it is in flight or its result is retained. At most max_pending jobs
+    may be unfinished; beyond that submit raises QueueFullError. With a
+    store, job states are also written there for other web processes to read;
+    de-duplication and the pending limit stay per process.
+    """
+
+    def __init__(self, max_workers=2, max_pending=16, result_ttl=600, max_results=64, store=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self.store = store
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._jobs = OrderedDict()
+        self._by_key = {}
+        # Each report worker's cache counters, as of its last finished job
+        self._worker_caches = {}
+
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.failed = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build the manager from LOAN_REPORT_* environment variables"""
+        store = None
+        if os.environ.get('LOAN_REPORT_JOB_STORE', 'memory') == 'sqlite':
+            store = SQLiteJobStore(os.environ.get('LOAN_REPORT_JOB_SQLITE_PATH', 'report_jobs.db'))
+        return cls(
+            max_workers=int(os.environ.get('LOAN_REPORT_WORKERS', '2')),
+            max_pending=int(os.environ.get('LOAN_REPORT_MAX_PENDING', '16')),
+            store=store
+        )
+
+    def _get_executor(self):
+        if self._executor is None or self._pid != os.getpid():
+            # spawn: forking a threaded server with xgboost/matplotlib loaded is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+            self._pid = os.getpid()
+            self._worker_caches = {}
+        return self._executor
+
+    def submit(self, prediction_result, model_fingerprint, profile_id=None):
+        """Return the job for this report, starting one if needed
+
+        With a profile_id the report always gets a job of its own, profiled in
+        the worker and saved under that id.
+        """
+        key = f"{application_key(prediction_result['application_data'], model_fingerprint)}:{date.today().isoformat()}"
+
+        with self._lock:
+            self._prune()
+
+            job = self._jobs.get(self._by_key.get(key))
+            if job is not None and job.status != 'failed' and profile_id is None:
+                self.deduplicated += 1
+                return job
+
+            pending = sum(1 for j in self._jobs.values() if not j.done.is_set())
+            if pending >= self.max_pending:
+                self.rejected += 1
+                raise QueueFullError(f"{pending} reports already pending")
+
+            job = ReportJob(secrets.token_urlsafe(12), key)
+            job.model_version = prediction_result.get('model_version')
+            self._jobs[job.id] = job
+            if profile_id is None:
+                self._by_key[key] = job.id
+            self.submitted += 1
+
+            try:
+                future = self._get_executor().submit(_run_report, prediction_result, profile_id)
+            except BrokenProcessPool:
+                self._executor = None
+                future = self._get_executor().submit(_run_report, prediction_result, profile_id)
+
+        self._share(job)
+        job.future = future
+        future.add_done_callback(lambda f: self._finish(job, f))
+        return job
+
+    def _finish(self, job, future):
+        try:
+            job.png, observations, worker = future.result()
+            REGISTRY.replay(observations)
+            with self._lock:
+                self._worker_caches[worker['pid']] = worker['report_cache']
+            if 'hot_functions' in worker:
+                from profiler import hot_sampler
+                hot_sampler.merge(*worker['hot_functions'])
+            job.status = 'done'
+        except Exception as e:
+            if isinstance(e, ReportError):
+                REGISTRY.replay(e.observations)
+            job.error = f'Error generating report: {str(e)}'
+            job.status = 'failed'
+            with self._lock:
+                self.failed += 1
+                if isinstance(e, BrokenProcessPool):
+                    self._executor = None
+        job.finished = time.time()
+        self._share(job)
+        job.done.set()
+
+    def _share(self, job):
+        """Write a job's current state to the shared store, if there is one"""
+        if self.store is None:
+            return
+        try:
+            self.store.save(job)
+        except sqlite3.Error as e:
+            print(f"Could not share report job {job.id}: {str(e)}")
+
+    def _prune(self):
+        """Forget finished jobs past their TTL or beyond the retention limit"""
+        now = time.time()
+        finished = [j for j in self._jobs.values() if j.done.is_set()]
+        excess = len(finished) - self.max_results
+        for i, job in enumerate(finished):
+            if i < excess or now - job.finished > self.result_ttl:
+                del self._jobs[job.id]
+                if self._by_key.get(job.key) == job.id:
+                    del self._by_key[job.key]
+
+    def get(self, job_id):
+        """Look up a job by id (None if unknown or expired), in the shared store if not local"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = self.store.load(job_id)
+        return job
+
+    def stats(self):
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if not j.done.is_set())
+            return {
+                'pending': pending,
+                'max_pending': self.max_pending,
+                'workers': self.max_workers,
+                'retained': len(self._jobs) - pending,
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+                'rejected': self.rejected,
+                'failed': self.failed
+            }
+
+    def cache_stats(self):
+        """Report cache counters summed over this process's report workers
+
+        Each worker has its own memory tier; the disk tier is one shared
+        directory, so its size is the largest any worker has seen.
+        """
+        with self._lock:
+            caches = list(self._worker_caches.values())
+        stats = {key: sum(cache[key] for cache in caches)
+                 for key in ('hits', 'disk_hits', 'misses', 'evictions', 'entries', 'bytes')}
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        stats['workers'] = len(caches)
+        stats['max_bytes_per_worker'] = caches[0]['max_bytes'] if caches else None
+        stats['disk_entries'] = max((cache['disk_entries'] for cache in caches), default=0)
+        stats['disk_bytes'] = max((cache['disk_bytes'] for cache in caches), default=0)
+        return stats
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+
+# Create global instance
+report_jobs = ReportJobManager.from_env()
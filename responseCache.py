@@ -0,0 +1,140 @@
+"""
+RESPONSE CACHE MODULE
+Reuses chatbot answers to repeated first-turn finance questions
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from metrics import CACHE_REQUESTS
+
+_NON_WORD = re.compile(r"[^a-z0-9%$ ]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_question(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = _NON_WORD.sub(' ', text.lower())
+    return _SPACES.sub(' ', text).strip()
+
+
+def question_ngrams(normalized, n=3):
+    """Character n-grams of a normalized question, padded at word edges"""
+    padded = f" {normalized} "
+    return frozenset(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+class ResponseCache:
+    """
+    LRU cache of answers keyed by normalized question, with a TTL.
+
+    Exact matches are looked up by key. When similarity is above zero, a miss
+    falls back to the cached question with the highest character-trigram
+    Jaccard similarity, if it reaches that threshold.
+    """
+
+    def __init__(self, max_entries=512, ttl=3600, similarity=0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build the cache from LOAN_CHAT_CACHE_* environment variables"""
+        return cls(
+            max_entries=int(os.environ.get('LOAN_CHAT_CACHE_SIZE', '512')),
+            ttl=float(os.environ.get('LOAN_CHAT_CACHE_TTL', '3600')),
+            similarity=float(os.environ.get('LOAN_CHAT_CACHE_SIMILARITY', '0'))
+        )
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _nearest(self, ngrams, now):
+        best_key, best_score = None, self.similarity
+        for key, (_, stored_at, entry_ngrams) in self._entries.items():
+            if now - stored_at > self.ttl:
+                continue
+            union = len(ngrams | entry_ngrams)
+            score = len(ngrams & entry_ngrams) / union if union else 0.0
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def get(self, question):
+        """Return the cached answer for a question, or None"""
+        if not self.enabled:
+            return None
+        key = normalize_question(question)
+        with self._lock:
+            now = time.time()
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+
+            if entry is not None:
+                self.hits += 1
+                CACHE_REQUESTS.labels('chat', 'hit').inc()
+            elif self.similarity > 0 and key:
+                key = self._nearest(question_ngrams(key), now)
+                entry = self._entries.get(key) if key is not None else None
+                if entry is not None:
+                    self.near_hits += 1
+                    CACHE_REQUESTS.labels('chat', 'near_hit').inc()
+
+            if entry is None:
+                self.misses += 1
+                CACHE_REQUESTS.labels('chat', 'miss').inc()
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, question, answer):
+        """Cache an answer, evicting the least recently used entries"""
+        if not self.enabled:
+            return
+        key = normalize_question(question)
+        if not key:
+            return
+        with self._lock:
+            self._entries[key] = (answer, time.time(), question_ngrams(key))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'hit_rate': (self.hits + self.near_hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries
+            }
@@ -0,0 +1,216 @@
+"""
+OFFLINE BATCH SCORER - Loan Eligibility Advisor
+Scores large application files with the loan model without starting Flask
+
+Usage:
+    python scoreApplications.py applications.csv results.csv
+    python scoreApplications.py applications.csv results.csv --workers 4
+    python scoreApplications.py encoded.npy results.csv --chunk-size 200000
+    python scoreApplications.py applications.parquet results.parquet  (needs pyarrow)
+
+Inputs:
+    .csv      read in chunks with pandas
+    .parquet  one task per row group (optional: pip install pyarrow)
+    .npy      memory-mapped; either a structured array with one field per
+              application feature, or a 2-D float matrix already in the
+              model's encoded column order
+
+Outputs (.csv, or .parquet with pyarrow) hold prediction, probability and, when the raw
+features are available, risk_factors; an 'id' input column is passed through.
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+from multiprocessing import Pool
+from loanPredictor import LoanPredictor
+
+DEFAULT_CHUNK_SIZE = 100000
+
+# Per-process predictor, loaded once by _init_worker
+_predictor = None
+
+
+def _init_worker(threads):
+    """Load the model and encoder once in each worker process"""
+    global _predictor
+    _predictor = LoanPredictor()
+    if not _predictor.load_model():
+        raise RuntimeError("Failed to load model and encoder")
+    # One booster thread per worker unless asked otherwise, to avoid oversubscription
+    _predictor.model.set_params(n_jobs=threads)
+
+
+def _read_task(task):
+    """Materialize the columns (or encoded matrix) for one task
+
+    A task is (kind, source, start, stop): source is a parsed DataFrame for
+    'csv' chunks and a file path for 'parquet' row groups and 'npy' slices.
+    """
+    kind, source, start, stop = task
+
+    if kind == 'csv':
+        return {name: source[name].to_numpy() for name in source.columns}, None
+
+    if kind == 'parquet':
+        import pyarrow.parquet as pq
+        table = pq.ParquetFile(source).read_row_group(start)
+        return {name: table.column(name).to_numpy(zero_copy_only=False) for name in table.column_names}, None
+
+    if kind == 'npy':
+        array = np.load(source, mmap_mode='r')[start:stop]
+        if array.dtype.names:
+            return {name: array[name] for name in array.dtype.names}, None
+        return None, np.asarray(array, dtype=np.float32)
+
+    raise ValueError(f"Unknown task kind: {kind}")
+
+
+def _score_task(task):
+    """Encode and score one chunk; returns a dict of output columns"""
+    columns, matrix = _read_task(task)
+
+    if matrix is None:
+        matrix = _predictor.encode_columns(columns)
+    elif matrix.ndim != 2 or matrix.shape[1] != _predictor.n_columns:
+        raise ValueError(
+            f"Encoded .npy input must have {_predictor.n_columns} columns, got shape {matrix.shape}"
+        )
+
+    probabilities, predictions = _predictor.score_matrix(matrix)
+    result = {'prediction': predictions, 'probability': probabilities}
+    if columns is not None:
+        result['risk_factors'] = _predictor.risk_factor_labels(columns)
+        if 'id' in columns:
+            result = dict({'id': np.asarray(columns['id'])}, **result)
+    return result
+
+
+def iter_tasks(path, chunk_size):
+    """Split an input file into scoring tasks without loading it whole"""
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext == '.csv':
+        import pandas as pd
+        for frame in pd.read_csv(path, chunksize=chunk_size):
+            yield ('csv', frame, None, None)
+
+    elif ext == '.parquet':
+        import pyarrow.parquet as pq
+        for row_group in range(pq.ParquetFile(path).num_row_groups):
+            yield ('parquet', path, row_group, None)
+
+    elif ext == '.npy':
+        n_rows = np.load(path, mmap_mode='r').shape[0]
+        for start in range(0, n_rows, chunk_size):
+            yield ('npy', path, start, min(start + chunk_size, n_rows))
+
+    else:
+        raise ValueError(f"Unsupported input format: {ext} (use .csv, .parquet or .npy)")
+
+
+class ResultWriter:
+    """Append scored chunks to a .parquet or .csv file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.ext = os.path.splitext(path)[1].lower()
+        if self.ext not in ('.parquet', '.csv'):
+            raise ValueError(f"Unsupported output format: {self.ext} (use .parquet or .csv)")
+        self._writer = None
+        self._first = True
+
+    def write(self, result):
+        if self.ext == '.parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.table(result)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            import pandas as pd
+            pd.DataFrame(result).to_csv(self.path, mode='w' if self._first else 'a',
+                                        header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def check_dependencies(*paths):
+    """Raise ImportError up front if a Parquet path needs pyarrow and it is missing"""
+    if any(path.lower().endswith('.parquet') for path in paths):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("Parquet input/output requires pyarrow, which is not in requirements.txt")
+
+
+def score_file(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, workers=1, threads=1):
+    """Score every row of input_path into output_path; returns the row count"""
+    # Fail here rather than in a worker process halfway through the pool
+    check_dependencies(input_path, output_path)
+    writer = ResultWriter(output_path)
+    tasks = iter_tasks(input_path, chunk_size)
+    n_rows = 0
+
+    try:
+        if workers > 1:
+            with Pool(workers, initializer=_init_worker, initargs=(threads,)) as pool:
+                # imap keeps output in input order while chunks score in parallel
+                for result in pool.imap(_score_task, tasks):
+                    writer.write(result)
+                    n_rows += len(result['probability'])
+        else:
+            _init_worker(threads)
+            for task in tasks:
+                result = _score_task(task)
+                writer.write(result)
+                n_rows += len(result['probability'])
+    finally:
+        writer.close()
+
+    return n_rows
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Score a file of loan applications offline")
+    parser.add_argument('input', help="Input file (.csv, .parquet or .npy)")
+    parser.add_argument('output', help="Output file (.parquet or .csv)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Rows per scoring chunk (default {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument('--threads', type=int, default=1,
+                        help="XGBoost threads per worker (default 1)")
+    args = parser.parse_args(argv)
+
+    try:
+        check_dependencies(args.input, args.output)
+    except ImportError as e:
+        print(f"❌ {str(e)}")
+        print("\n💡 Install it using: pip install pyarrow (or use .csv)")
+        return 1
+
+    print(f"🔄 Scoring {args.input} with {args.workers} worker(s)...")
+    start = time.perf_counter()
+    try:
+        n_rows = score_file(args.input, args.output, args.chunk_size, args.workers, args.threads)
+    except Exception as e:
+        print(f"❌ Scoring failed: {str(e)}")
+        return 1
+    elapsed = time.perf_counter() - start
+
+    rate = n_rows / elapsed if elapsed > 0 else float('inf')
+    print(f"✓ Scored {n_rows:,} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    print(f"✓ Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+"""
+SHADOW SCORING MODULE
+Scores live traffic with a challenger model in the background and compares decisions
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+import numpy as np
+from metrics import Counter, Histogram, STAGE_SECONDS
+
+SHADOW_ROWS = Counter(
+    'loan_shadow_rows_total', 'Shadow-scored rows by outcome (agree, disagree, dropped, error)', ['result']
+)
+SHADOW_DELTA = Histogram(
+    'loan_shadow_probability_delta', 'Absolute challenger - champion approval probability difference',
+    buckets=(0.001, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0)
+)
+
+_AGREE = SHADOW_ROWS.labels('agree')
+_DISAGREE = SHADOW_ROWS.labels('disagree')
+_DROPPED = SHADOW_ROWS.labels('dropped')
+_ERROR = SHADOW_ROWS.labels('error')
+_SHADOW_SECONDS = STAGE_SECONDS.labels('shadow_score')
+_DELTA = SHADOW_DELTA.labels()
+_DELTA_BUCKETS = np.array(SHADOW_DELTA.buckets)
+
+
+def column_map(champion_columns, challenger_columns, numeric_columns):
+    """
+    Index of each challenger column in the champion's encoded row.
+
+    One-hot columns the champion doesn't have map to -1 (always 0); a missing
+    numeric column makes the rows unusable and raises ValueError.
+    """
+    position = {name: i for i, name in enumerate(champion_columns)}
+    index = np.empty(len(challenger_columns), dtype=np.intp)
+    for j, name in enumerate(challenger_columns):
+        if name in position:
+            index[j] = position[name]
+        elif name not in numeric_columns:
+            index[j] = -1
+        else:
+            raise ValueError(f"Champion rows have no column {name!r} for the challenger")
+    return index
+
+
+class ShadowScorer:
+    """
+    Champion-challenger comparison off the request path.
+
+    The live predictor hands over the rows it already encoded, with its own
+    probabilities; offer() only copies them into a bounded buffer. A daemon
+    thread wakes every flush_ms, scores everything buffered with the
+    challenger in one call, and records decision agreement, probability
+    deltas and its own latency. When max_pending rows are already waiting,
+    new rows are dropped and counted instead of slowing the caller down.
+    """
+
+    def __init__(self, challenger, max_pending=4096, max_batch_size=1024, flush_ms=50.0,
+                 sample_rate=1.0, stats_window=10000):
+        self.challenger = challenger
+        self.max_pending = max_pending
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_ms / 1000.0
+        self.sample_rate = sample_rate
+
+        self._lock = threading.Lock()
+        self._buffer = deque()
+        self._pending_rows = 0
+        self._thread = None
+        self._pid = None
+        self._column_maps = {}
+
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self._abs_deltas = deque(maxlen=stats_window)
+        self._batch_times = deque(maxlen=1000)
+        # Enqueue-to-scored time of each offer
+        self._lags = deque(maxlen=stats_window)
+        self.offered = 0
+        self.scored = 0
+        self.dropped = 0
+        self.errors = 0
+        self.agreements = 0
+        self.approve_to_reject = 0
+        self.reject_to_approve = 0
+        self.champion_approvals = 0
+        self.challenger_approvals = 0
+        self.delta_sum = 0.0
+
+    @classmethod
+    def from_env(cls, backend=None):
+        """Challenger from LOAN_SHADOW_VERSION (a model registry version), or None"""
+        version = os.environ.get('LOAN_SHADOW_VERSION')
+        if not version:
+            return None
+        from loanPredictor import LoanPredictor
+        challenger = LoanPredictor(backend)
+        if not challenger.load_model(version):
+            print(f"❌ Shadow model {version} failed to load; shadow scoring disabled")
+            return None
+        # One core at most, so the comparison never competes with live traffic for CPUs
+        challenger.model.set_params(n_jobs=1)
+        challenger.warm_up()
+        return cls(
+            challenger,
+            max_pending=int(os.environ.get('LOAN_SHADOW_MAX_PENDING', '4096')),
+            flush_ms=float(os.environ.get('LOAN_SHADOW_FLUSH_MS', '50')),
+            sample_rate=float(os.environ.get('LOAN_SHADOW_SAMPLE', '1.0'))
+        )
+
+    def _ensure_started(self):
+        """Start the scoring thread lazily (and again in a forked child)"""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._buffer.clear()
+            self._pending_rows = 0
+            self._thread = threading.Thread(target=self._run, name='loan-shadow-scorer', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def offer(self, matrix, probabilities, columns):
+        """Queue encoded rows the champion scored; never blocks on the challenger"""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self._ensure_started()
+        n_rows = len(matrix)
+        with self._lock:
+            self.offered += n_rows
+            if self._pending_rows + n_rows > self.max_pending:
+                self.dropped += n_rows
+                _DROPPED.inc(n_rows)
+                return
+            self._pending_rows += n_rows
+            # Copies: the caller reuses its row buffers
+            self._buffer.append((np.array(matrix, dtype=np.float32), np.array(probabilities, dtype=np.float64),
+                                 columns, time.perf_counter()))
+
+    def _take(self):
+        """Everything buffered, up to max_batch_size rows (at least one offer)"""
+        items = []
+        rows = 0
+        with self._lock:
+            while self._buffer and (not items or rows + len(self._buffer[0][0]) <= self.max_batch_size):
+                item = self._buffer.popleft()
+                items.append(item)
+                rows += len(item[0])
+            self._pending_rows -= rows
+        return items
+
+    def _run(self):
+        # Linux: lower this thread's CPU priority below the request threads
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            time.sleep(self.flush_interval)
+            items = self._take()
+            while items:
+                try:
+                    self._score(items)
+                except Exception as e:
+                    n_rows = sum(len(item[0]) for item in items)
+                    with self._stats_lock:
+                        self.errors += n_rows
+                    _ERROR.inc(n_rows)
+                    print(f"Shadow scoring error: {str(e)}")
+                items = self._take()
+
+    def _challenger_rows(self, matrix, columns):
+        """Champion rows laid out for the challenger"""
+        challenger_columns = self.challenger.columns
+        if columns is challenger_columns or columns == challenger_columns:
+            return matrix
+        index = self._column_maps.get(id(columns))
+        if index is None or index[0] is not columns:
+            index = (columns, column_map(columns, challenger_columns, self.challenger._numeric_index))
+            self._column_maps[id(columns)] = index
+        mapped = matrix[:, np.maximum(index[1], 0)]
+        mapped[:, index[1] < 0] = 0.0
+        return mapped
+
+    def _score(self, items):
+        started = time.perf_counter()
+        matrix = np.concatenate([self._challenger_rows(m, columns) for m, _, columns, _ in items])
+        champion = np.concatenate([p for _, p, _, _ in items])
+        with _SHADOW_SECONDS.time():
+            challenger = self.challenger.model.predict_proba(matrix)[:, 1]
+        finished = time.perf_counter()
+
+        champion_approved = champion >= self.challenger.THRESHOLD
+        challenger_approved = challenger >= self.challenger.THRESHOLD
+        deltas = challenger - champion
+        agree = int(np.count_nonzero(champion_approved == challenger_approved))
+
+        with self._stats_lock:
+            self.scored += len(matrix)
+            self.agreements += agree
+            self.approve_to_reject += int(np.count_nonzero(champion_approved & ~challenger_approved))
+            self.reject_to_approve += int(np.count_nonzero(~champion_approved & challenger_approved))
+            self.champion_approvals += int(np.count_nonzero(champion_approved))
+            self.challenger_approvals += int(np.count_nonzero(challenger_approved))
+            self.delta_sum += float(deltas.sum())
+            self._abs_deltas.extend(np.abs(deltas).tolist())
+            self._batch_times.append(finished - started)
+            self._lags.extend(finished - enqueued for _, _, _, enqueued in items)
+
+        _AGREE.inc(agree)
+        _DISAGREE.inc(len(matrix) - agree)
+        # Bucketed in one NumPy call rather than observe() per row
+        abs_deltas = np.abs(deltas)
+        buckets = np.searchsorted(_DELTA_BUCKETS, abs_deltas, side='left')
+        _DELTA.observe_counts(np.bincount(buckets, minlength=len(_DELTA_BUCKETS) + 1), float(abs_deltas.sum()))
+
+    def stats(self):
+        """Agreement, probability deltas and shadow latency over the recent window"""
+        with self._lock:
+            pending = self._pending_rows
+        with self._stats_lock:
+            abs_deltas = np.array(self._abs_deltas, dtype=float)
+            batch_times = np.array(self._batch_times, dtype=float) * 1000.0
+            lags = np.array(self._lags, dtype=float) * 1000.0
+            scored = self.scored
+            stats = {
+                'challenger_version': self.challenger.model_version,
+                'challenger_fingerprint': self.challenger.model_fingerprint,
+                'sample_rate': self.sample_rate,
+                'offered': self.offered,
+                'scored': scored,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'pending': pending,
+                'max_pending': self.max_pending
+            }
+            if scored:
+                stats['agreement_rate'] = self.agreements / scored
+                stats['approve_to_reject'] = self.approve_to_reject
+                stats['reject_to_approve'] = self.reject_to_approve
+                stats['champion_approval_rate'] = self.champion_approvals / scored
+                stats['challenger_approval_rate'] = self.challenger_approvals / scored
+                stats['mean_delta'] = self.delta_sum / scored
+        if len(abs_deltas):
+            p50, p95, p99 = np.percentile(abs_deltas, [50, 95, 99])
+            stats['abs_delta'] = {'p50': float(p50), 'p95': float(p95), 'p99': float(p99),
+                                  'max': float(abs_deltas.max())}
+        if len(batch_times):
+            p50, p99 = np.percentile(batch_times, [50, 99])
+            stats['batch_ms'] = {'p50': float(p50), 'p99': float(p99)}
+        if len(lags):
+            p50, p99 = np.percentile(lags, [50, 99])
+            stats['lag_ms'] = {'p50': float(p50), 'p99': float(p99)}
+        return stats
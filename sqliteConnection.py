@@ -0,0 +1,26 @@
+"""
+SQLITE CONNECTION MODULE
+Per-process SQLite connection for the stores that gunicorn workers share
+"""
+
+import os
+import sqlite3
+
+
+class ForkSafeSQLite:
+    """
+    Mixin giving a store self._conn, a connection to self.path for the
+    current process. Forked workers open their own on first use.
+    """
+    _db = None
+    _inherited = None
+    _pid = None
+
+    @property
+    def _conn(self):
+        if self._pid != os.getpid():
+            # Never reuse (or close) a connection inherited across fork()
+            self._inherited = self._db
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._pid = os.getpid()
+        return self._db
@@ -0,0 +1,42 @@
+"""
+STARTUP TIMING MODULE
+Records how long each start-up phase (and each lazily loaded subsystem) took
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Named phase durations in milliseconds, in the order they finished"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as one phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._phases[name] = round((time.perf_counter() - start) * 1000.0, 1)
+
+    def timings(self):
+        with self._lock:
+            return dict(self._phases)
+
+    def report(self):
+        """Print the phase breakdown"""
+        print("⏱  Startup timings:")
+        for name, ms in self.timings().items():
+            print(f"   • {name:<24} {ms:>8.1f} ms")
+        print(f"   • {'total':<24} {(time.perf_counter() - self.started) * 1000.0:>8.1f} ms")
+
+
+# Create global instance
+startup_timer = StartupTimer()
@@ -91,6 +91,9 @@ window.addEventListener('scroll', function() {
 // FORM SUBMISSION & PREDICTION
 // ============================================================================
 
+// Server-side id of the latest prediction, used to request its report
+let lastPredictionId = null;
+
 document.getElementById('loanForm').addEventListener('submit', async function(e) {
     e.preventDefault();
 
@@ -131,6 +134,7 @@ document.getElementById('loanForm').addEventListener('submit', async function(e)
         const data = await response.json();
 
         if (data.success) {
+            lastPredictionId = data.prediction_id;
             displayResult(data.result);
 
             // Trigger confetti if approved
@@ -291,7 +295,25 @@ document.getElementById('downloadReport').addEventListener('click', async functi
         button.innerHTML = '<span>Generating Report...</span>';
         button.disabled = true;
 
-        const response = await fetch('/api/download-report');
+        // Queue the report, then poll until the job has finished
+        let job = await fetch('/api/reports', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ prediction_id: lastPredictionId })
+        });
+        let jobData = await job.json().catch(() => ({}));
+
+        while (job.ok && (jobData.status === 'queued' || jobData.status === 'running')) {
+            await new Promise(resolve => setTimeout(resolve, 500));
+            job = await fetch(jobData.status_url);
+            jobData = await job.json().catch(() => ({}));
+        }
+
+        const response = job.ok && jobData.status === 'done'
+            ? await fetch(jobData.download_url)
+            : new Response(JSON.stringify(jobData), { status: job.ok ? 500 : job.status });
 
         if (response.ok) {
             const blob = await response.blob();
@@ -394,23 +416,45 @@ chatForm.addEventListener('submit', async function(e) {
     const typingIndicator = addTypingIndicator();
 
     try {
-        // Send message to backend
+        // Send message to backend and stream the reply as it is generated
         const response = await fetch('/api/chat', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
             },
-            body: JSON.stringify({ message: message })
+            body: JSON.stringify({ message: message, stream: true })
         });
 
-        const data = await response.json();
+        if (!response.ok || !response.body) {
+            const data = await response.json();
+            typingIndicator.remove();
+            addChatMessage('bot', data.success ? data.message : 'Sorry, I encountered an error. Please try again.');
+            return;
+        }
 
-        // Remove typing indicator
-        typingIndicator.remove();
+        let reply = '';
+        let contentDiv = null;
+        let failed = false;
+
+        await readChatStream(response, function(event, payload) {
+            if (event === 'delta') {
+                reply += payload.text;
+                if (!contentDiv) {
+                    // First chunk: swap the typing indicator for the reply
+                    typingIndicator.remove();
+                    contentDiv = addChatMessage('bot', reply);
+                } else {
+                    contentDiv.innerHTML = formatChatMessage(reply);
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                }
+            } else if (event === 'error') {
+                failed = true;
+            }
+        });
 
-        if (data.success) {
-            addChatMessage('bot', data.message);
-        } else {
+        typingIndicator.remove();
+        if (failed || !contentDiv) {
             addChatMessage('bot', 'Sorry, I encountered an error. Please try again.');
         }
     } catch (error) {
@@ -419,6 +463,33 @@ chatForm.addEventListener('submit', async function(e) {
     }
 });
 
+// Read a Server-Sent Events response, calling onEvent(event, payload) per event
+async function readChatStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
 // Add chat message to UI
 function addChatMessage(sender, message) {
     const messageDiv = document.createElement('div');
@@ -436,6 +507,8 @@ function addChatMessage(sender, message) {
 
     // Scroll to bottom
     chatMessages.scrollTop = chatMessages.scrollHeight;
+
+    return contentDiv;
 }
 
 // Format chat message for better display
@@ -0,0 +1,133 @@
+"""
+Shared test fixtures: a stub chat completion API served from 127.0.0.1
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+def json_reply(content='Hello', status=200, headers=None, delay=0.0):
+    """A non-streamed completion (or an error status) sent after delay seconds"""
+    if status < 400:
+        body = {'choices': [{'message': {'role': 'assistant', 'content': content}}]}
+    else:
+        body = {'error': content}
+    return {'kind': 'json', 'status': status, 'body': body, 'headers': headers or {}, 'delay': delay}
+
+
+def stream_reply(deltas, error=None, cut=False, delay=0.0, gap=0.0):
+    """
+    An SSE stream of one chunk per delta, then [DONE].
+
+    error sends an error event after the deltas instead of [DONE]; cut drops
+    the connection there instead. delay comes before the headers, gap
+    between chunks.
+    """
+    return {'kind': 'stream', 'deltas': list(deltas), 'error': error, 'cut': cut,
+            'delay': delay, 'gap': gap}
+
+
+class StubUpstream:
+    """Chat completion API answering each POST with the next queued reply"""
+
+    def __init__(self):
+        self.replies = []
+        self.requests = []
+        # (host, port) of the client connection behind each request
+        self.connections = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/v1/chat/completions'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def queue(self, *replies):
+        with self._lock:
+            self.replies.extend(replies)
+
+    def _next(self, payload, address):
+        with self._lock:
+            self.requests.append(payload)
+            self.connections.append(address)
+            if self.replies:
+                return self.replies.pop(0)
+        return json_reply('No reply queued', status=500)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so the client's connection pool can reuse connections
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                reply = stub._next(json.loads(body), self.client_address)
+                time.sleep(reply['delay'])
+                try:
+                    if reply['kind'] == 'json':
+                        self._send_json(reply)
+                    else:
+                        self._send_stream(reply)
+                except OSError:
+                    # The client went away mid-reply
+                    self.close_connection = True
+
+            def _send_json(self, reply):
+                data = json.dumps(reply['body']).encode()
+                self.send_response(reply['status'])
+                for name, value in reply['headers'].items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, reply):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for delta in reply['deltas']:
+                    self._chunk({'choices': [{'delta': {'content': delta}}]})
+                    time.sleep(reply['gap'])
+                if reply['cut']:
+                    self.close_connection = True
+                    return
+                if reply['error'] is not None:
+                    self._chunk({'error': reply['error']})
+                else:
+                    self._write(b'data: [DONE]\n\n')
+                self._write(b'')
+
+            def _chunk(self, event):
+                self._write(f'data: {json.dumps(event)}\n\n'.encode())
+
+            def _write(self, data):
+                # One HTTP chunk per write, so the client sees each event as it is sent
+                self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+                self.wfile.flush()
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def upstream():
+    stub = StubUpstream().start()
+    yield stub
+    stub.close()
@@ -0,0 +1,162 @@
+"""
+Streamed chat replies against a stub upstream: tokens, saved history,
+client disconnects and upstream errors mid-stream
+"""
+
+import json
+
+import pytest
+
+from chatbot import FinanceChatbot, OFF_TOPIC_MESSAGE
+from conftest import json_reply, stream_reply
+from conversationStore import InMemoryConversationStore
+from fallbackResponder import FallbackResponder
+from inferenceClient import ChatCompletionClient, CircuitBreaker, UpstreamError
+from responseCache import ResponseCache
+
+QUESTION = 'How much of my income should go to savings?'
+
+
+@pytest.fixture
+def bot(upstream):
+    chatbot = FinanceChatbot(store=InMemoryConversationStore(), cache=ResponseCache(),
+                             fallback=FallbackResponder(), deadline=2.0)
+    chatbot.client = ChatCompletionClient(url=upstream.url, read_timeout=1.0, total_timeout=5.0,
+                                          max_retries=0, breaker=CircuitBreaker())
+    return chatbot
+
+
+def _sse_events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_stream_yields_each_token(bot, upstream):
+    upstream.queue(stream_reply(['Save ', 'about ', '20%.']))
+
+    assert list(bot.stream_response(QUESTION, 's1')) == ['Save ', 'about ', '20%.']
+    assert upstream.requests[0]['stream'] is True
+    assert bot.client.in_flight == 0
+
+
+def test_history_saved_after_stream_finishes(bot, upstream):
+    upstream.queue(stream_reply(['Save ', 'about ', '20%.']), stream_reply(['Yes.']))
+
+    stream = bot.stream_response(QUESTION, 's1')
+    assert next(stream) == 'Save '
+    # Nothing is saved while the reply is still coming in
+    assert bot.store.get('s1') == []
+    list(stream)
+
+    assert bot.store.get('s1') == [
+        {'role': 'user', 'content': QUESTION},
+        {'role': 'assistant', 'content': 'Save about 20%.'}
+    ]
+    # The next turn sends the saved one along
+    list(bot.stream_response('Even with debt?', 's1'))
+    assert [m['content'] for m in upstream.requests[1]['messages'][1:]] == [
+        QUESTION, 'Save about 20%.', 'Even with debt?'
+    ]
+
+
+def test_cached_first_turn_is_streamed_without_upstream_call(bot, upstream):
+    upstream.queue(stream_reply(['Save ', 'about ', '20%.']))
+    list(bot.stream_response(QUESTION, 's1'))
+
+    assert list(bot.stream_response(QUESTION, 's2')) == ['Save about 20%.']
+    assert len(upstream.requests) == 1
+    assert bot.store.get('s2')[-1]['content'] == 'Save about 20%.'
+
+
+def test_client_disconnect_mid_stream_saves_nothing(bot, upstream):
+    upstream.queue(stream_reply(['Save ', 'about ', '20%.'], gap=0.2))
+
+    stream = bot.stream_response(QUESTION, 's1')
+    assert next(stream) == 'Save '
+    stream.close()
+
+    assert bot.store.get('s1') == []
+    assert bot.client.in_flight == 0
+    assert bot.client.stats()['circuit'] == 'closed'
+    # A later question is not answered from a half-finished reply
+    assert bot.cache.get(QUESTION) is None
+
+
+@pytest.mark.parametrize('reply', [
+    stream_reply(['Save '], error='model overloaded'),
+    stream_reply(['Save '], cut=True),
+], ids=['error_event', 'connection_dropped'])
+def test_upstream_error_mid_stream_is_raised(bot, upstream, reply):
+    upstream.queue(reply)
+
+    stream = bot.stream_response(QUESTION, 's1')
+    assert next(stream) == 'Save '
+    with pytest.raises(UpstreamError):
+        next(stream)
+
+    assert bot.store.get('s1') == []
+    assert bot.client.in_flight == 0
+    assert bot.client.stats()['failures'] == 1
+
+
+def test_upstream_error_before_first_token_falls_back(bot, upstream):
+    upstream.queue(json_reply('unavailable', status=503))
+
+    deltas = list(bot.stream_response(QUESTION, 's1'))
+
+    assert len(deltas) == 1
+    assert bot.store.get('s1')[-1] == {'role': 'assistant', 'content': deltas[0]}
+    assert bot.fallback_stats()['answered'] == 1
+
+
+def test_off_topic_refusal_is_not_streamed_from_upstream(bot, upstream):
+    assert list(bot.stream_response('Give me a recipe for chocolate cake', 's1')) == [OFF_TOPIC_MESSAGE]
+    assert upstream.requests == []
+    assert bot.store.get('s1') == []
+
+
+@pytest.fixture
+def client(bot, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, '_chatbot', bot)
+    return app_module.app.test_client()
+
+
+def test_chat_endpoint_sends_sse_events(client, upstream):
+    upstream.queue(stream_reply(['Save ', 'about ', '20%.']))
+
+    response = client.post('/api/chat', json={'message': QUESTION, 'stream': True})
+
+    assert response.mimetype == 'text/event-stream'
+    assert _sse_events(response.get_data(as_text=True)) == [
+        ('delta', {'text': 'Save '}),
+        ('delta', {'text': 'about '}),
+        ('delta', {'text': '20%.'}),
+        ('done', {'success': True})
+    ]
+
+
+def test_chat_endpoint_ends_with_error_event_mid_stream(client, upstream):
+    upstream.queue(stream_reply(['Save '], error='model overloaded'))
+
+    response = client.post('/api/chat', json={'message': QUESTION, 'stream': True})
+
+    events = _sse_events(response.get_data(as_text=True))
+    assert events[0] == ('delta', {'text': 'Save '})
+    assert events[-1][0] == 'error'
+    assert events[-1][1]['success'] is False
+
+
+def test_chat_endpoint_disconnect_closes_upstream(client, bot, upstream):
+    upstream.queue(stream_reply(['Save ', 'about ', '20%.'], gap=0.2))
+
+    response = client.post('/api/chat', json={'message': QUESTION, 'stream': True}, buffered=False)
+    first = next(response.response)
+    response.close()
+
+    assert b'event: delta' in first
+    assert bot.client.in_flight == 0
+    assert bot.stats()['sessions'] == 0
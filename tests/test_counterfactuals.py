@@ -0,0 +1,82 @@
+"""
+find_counterfactuals only returns options the model really approves
+"""
+
+import pytest
+
+from counterfactuals import ACTIONABLE_FEATURES, find_counterfactuals
+from loanPredictor import LoanPredictor
+
+REJECTED = [
+    {'person_age': 52, 'person_income': 98904, 'person_emp_exp': 33, 'loan_amnt': 622,
+     'cb_person_cred_hist_length': 19, 'credit_score': 741, 'person_gender': 'male',
+     'person_education': 'Bachelor', 'person_home_ownership': 'RENT', 'loan_intent': 'DEBTCONSOLIDATION',
+     'previous_loan_defaults_on_file': 'No'},
+    {'person_age': 25, 'person_income': 243646, 'person_emp_exp': 20, 'loan_amnt': 23837,
+     'cb_person_cred_hist_length': 12, 'credit_score': 577, 'person_gender': 'male',
+     'person_education': 'Master', 'person_home_ownership': 'OWN', 'loan_intent': 'EDUCATION',
+     'previous_loan_defaults_on_file': 'No'},
+]
+
+
+@pytest.fixture
+def predictor():
+    predictor = LoanPredictor(backend='xgboost')
+    assert predictor.load_model(), predictor.load_error
+    return predictor
+
+
+def apply_changes(application, changes):
+    """The application as it would be after an option's changes (waiting ages the applicant)"""
+    changed = dict(application)
+    waited = 0
+    for change in changes:
+        changed[change['feature']] = change['to']
+        if change['feature'] in ('cb_person_cred_hist_length', 'person_emp_exp'):
+            waited = max(waited, change['to'] - change['from'])
+    changed['person_age'] += waited
+    return changed
+
+
+@pytest.mark.parametrize('threshold', [0.5, 0.53])
+@pytest.mark.parametrize('application', REJECTED, ids=['rejected_1', 'rejected_2'])
+def test_every_option_scores_at_or_above_the_threshold(predictor, application, threshold):
+    predictor.THRESHOLD = threshold
+
+    result = find_counterfactuals(predictor, application)
+
+    assert not result['approved']
+    assert result['probability'] < threshold
+    for option in result['counterfactuals']:
+        assert option['probability'] >= threshold
+        rescored = predictor.make_prediction(apply_changes(application, option['changes']))
+        assert rescored['probability'] == pytest.approx(option['probability'], abs=1e-6)
+        assert rescored['probability'] >= threshold
+        assert rescored['prediction'] == 1
+
+
+def test_finds_options_for_the_rejected_applications(predictor):
+    for application in REJECTED:
+        assert find_counterfactuals(predictor, application)['counterfactuals']
+
+
+@pytest.mark.parametrize('application', REJECTED, ids=['rejected_1', 'rejected_2'])
+def test_changes_move_only_in_the_allowed_direction(predictor, application):
+    for option in find_counterfactuals(predictor, application)['counterfactuals']:
+        assert option['changes']
+        for change in option['changes']:
+            spec = ACTIONABLE_FEATURES[change['feature']]
+            assert (change['to'] - change['from']) * spec['direction'] > 0
+            assert spec.get('minimum', float('-inf')) <= change['to'] <= spec.get('maximum', float('inf'))
+
+
+def test_approved_application_gets_no_options(predictor):
+    application = {'person_age': 22, 'person_income': 71948, 'person_emp_exp': 0, 'loan_amnt': 35000,
+                   'cb_person_cred_hist_length': 3, 'credit_score': 561, 'person_gender': 'female',
+                   'person_education': 'Master', 'person_home_ownership': 'RENT', 'loan_intent': 'PERSONAL',
+                   'previous_loan_defaults_on_file': 'No'}
+
+    result = find_counterfactuals(predictor, application)
+
+    assert result['approved']
+    assert result['counterfactuals'] == []
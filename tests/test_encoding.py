@@ -0,0 +1,86 @@
+"""
+The array encoding used by make_prediction and predict_batch against the
+original DataFrame path (encoder.transform plus column reorder)
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from loanPredictor import FEATURE_NAMES, LoanPredictor
+
+APPLICATIONS = [
+    {'person_age': 22, 'person_gender': 'female', 'person_education': 'Master', 'person_income': 71948,
+     'person_emp_exp': 0, 'person_home_ownership': 'RENT', 'loan_amnt': 35000, 'loan_intent': 'PERSONAL',
+     'cb_person_cred_hist_length': 3, 'credit_score': 561, 'previous_loan_defaults_on_file': 'No'},
+    {'person_age': 41, 'person_gender': 'male', 'person_education': 'Associate', 'person_income': 120000,
+     'person_emp_exp': 18, 'person_home_ownership': 'MORTGAGE', 'loan_amnt': 8000, 'loan_intent': 'HOMEIMPROVEMENT',
+     'cb_person_cred_hist_length': 15, 'credit_score': 742, 'previous_loan_defaults_on_file': 'No'},
+    {'person_age': 30, 'person_gender': 'female', 'person_education': 'High School', 'person_income': 28000,
+     'person_emp_exp': 5, 'person_home_ownership': 'OWN', 'loan_amnt': 12500.5, 'loan_intent': 'MEDICAL',
+     'cb_person_cred_hist_length': 7, 'credit_score': 610, 'previous_loan_defaults_on_file': 'Yes'},
+    {'person_age': 58, 'person_gender': 'male', 'person_education': 'Doctorate', 'person_income': 250000,
+     'person_emp_exp': 30, 'person_home_ownership': 'OTHER', 'loan_amnt': 1000, 'loan_intent': 'VENTURE',
+     'cb_person_cred_hist_length': 29, 'credit_score': 810, 'previous_loan_defaults_on_file': 'No'},
+    {'person_age': 25, 'person_gender': 'male', 'person_education': 'Bachelor', 'person_income': 45000,
+     'person_emp_exp': 2, 'person_home_ownership': 'RENT', 'loan_amnt': 20000, 'loan_intent': 'DEBTCONSOLIDATION',
+     'cb_person_cred_hist_length': 1, 'credit_score': 590, 'previous_loan_defaults_on_file': 'Yes'},
+    {'person_age': 35, 'person_gender': 'female', 'person_education': 'Bachelor', 'person_income': 60000,
+     'person_emp_exp': 10, 'person_home_ownership': 'MORTGAGE', 'loan_amnt': 15000, 'loan_intent': 'EDUCATION',
+     'cb_person_cred_hist_length': 9, 'credit_score': 700, 'previous_loan_defaults_on_file': 'No'},
+]
+
+
+@pytest.fixture(scope='module')
+def predictor():
+    predictor = LoanPredictor(backend='xgboost')
+    assert predictor.load_model(), predictor.load_error
+    return predictor
+
+
+def dataframe_probabilities(predictor, applications):
+    """Probabilities through encoder.transform, as before the array encoding"""
+    frame = pd.DataFrame([
+        dict(application, loan_percent_income=application['loan_amnt'] / application['person_income'])
+        for application in applications
+    ])[FEATURE_NAMES]
+    return predictor.model.predict_proba(predictor.preprocess_input(frame))[:, 1]
+
+
+def test_make_prediction_matches_the_dataframe_path(predictor):
+    expected = dataframe_probabilities(predictor, APPLICATIONS)
+
+    probabilities = [predictor.make_prediction(application)['probability'] for application in APPLICATIONS]
+
+    np.testing.assert_array_equal(np.float32(probabilities), np.float32(expected))
+
+
+def test_predict_batch_matches_the_dataframe_path(predictor):
+    expected = dataframe_probabilities(predictor, APPLICATIONS)
+
+    results = predictor.predict_batch(APPLICATIONS)
+
+    np.testing.assert_array_equal(np.float32([r['probability'] for r in results]), np.float32(expected))
+    assert [r['prediction'] for r in results] == [int(p >= predictor.THRESHOLD) for p in expected]
+
+
+def test_encoded_matrix_matches_the_encoder(predictor):
+    frame = pd.DataFrame([
+        dict(application, loan_percent_income=application['loan_amnt'] / application['person_income'])
+        for application in APPLICATIONS
+    ])[FEATURE_NAMES]
+
+    expected = predictor.preprocess_input(frame).to_numpy(dtype=np.float32)
+
+    np.testing.assert_array_equal(predictor.encode_batch(APPLICATIONS), expected)
+
+
+def test_unknown_category_is_rejected_by_both_paths(predictor):
+    application = dict(APPLICATIONS[0], loan_intent='WEDDING')
+
+    with pytest.raises(ValueError, match='unknown categories'):
+        dataframe_probabilities(predictor, [application])
+    with pytest.raises(Exception, match="Unknown category 'WEDDING' for loan_intent"):
+        predictor.make_prediction(application)
+    with pytest.raises(Exception, match="Unknown category 'WEDDING' for loan_intent"):
+        predictor.predict_batch(APPLICATIONS[1:] + [application])
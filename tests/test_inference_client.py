@@ -0,0 +1,212 @@
+"""
+ChatCompletionClient against a stub upstream: retries with backoff, the
+circuit breaker, timeouts and connection reuse
+"""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import inferenceClient
+from conftest import json_reply, stream_reply
+from inferenceClient import ChatCompletionClient, CircuitBreaker, CircuitOpenError, UpstreamError
+
+MESSAGES = [{'role': 'user', 'content': 'What is an APR?'}]
+
+
+def make_client(upstream, **kwargs):
+    kwargs.setdefault('breaker', CircuitBreaker())
+    return ChatCompletionClient(url=upstream.url, **kwargs)
+
+
+def ask(client, **kwargs):
+    return client.chat_completion('stub-model', MESSAGES, **kwargs)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays the client asked for, at the top of each jitter range"""
+    delays = []
+    monkeypatch.setattr(inferenceClient, 'random', SimpleNamespace(uniform=lambda low, high: high))
+    monkeypatch.setattr(inferenceClient, 'time', SimpleNamespace(monotonic=time.monotonic, sleep=delays.append))
+    return delays
+
+
+def test_retries_retryable_statuses_with_exponential_backoff(upstream, sleeps):
+    upstream.queue(json_reply(status=503), json_reply(status=502), json_reply('An APR is...'))
+    client = make_client(upstream, max_retries=2, backoff=0.1)
+
+    result = ask(client)
+
+    assert result['choices'][0]['message']['content'] == 'An APR is...'
+    assert len(upstream.requests) == 3
+    assert sleeps == [0.1, 0.2]
+    assert client.stats()['retries'] == 2
+    assert client.stats()['failures'] == 0
+
+
+def test_backoff_is_capped_and_honours_retry_after(upstream, sleeps):
+    upstream.queue(json_reply(status=429, headers={'Retry-After': '3'}), json_reply(status=503),
+                   json_reply(status=503), json_reply())
+    client = make_client(upstream, max_retries=3, backoff=1.0, max_backoff=2.0)
+
+    ask(client)
+
+    # Retry-After is capped at max_backoff too
+    assert sleeps == [2.0, 2.0, 2.0]
+
+
+def test_gives_up_after_max_retries(upstream, sleeps):
+    upstream.queue(*[json_reply(status=503)] * 3)
+    client = make_client(upstream, max_retries=2, backoff=0.01)
+
+    with pytest.raises(UpstreamError) as error:
+        ask(client)
+
+    assert error.value.status == 503
+    assert error.value.retryable
+    assert len(upstream.requests) == 3
+    assert client.stats()['failures'] == 1
+
+
+def test_client_errors_are_not_retried_and_keep_the_circuit_closed(upstream, sleeps):
+    upstream.queue(*[json_reply('bad token', status=401)] * 3)
+    client = make_client(upstream, max_retries=2, breaker=CircuitBreaker(failure_threshold=1))
+
+    for _ in range(3):
+        with pytest.raises(UpstreamError) as error:
+            ask(client)
+        assert error.value.status == 401
+
+    assert len(upstream.requests) == 3
+    assert sleeps == []
+    assert client.stats()['circuit'] == 'closed'
+
+
+def test_breaker_opens_then_half_opens_and_closes(upstream):
+    upstream.queue(json_reply(status=503), json_reply(status=503))
+    client = make_client(upstream, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.3))
+
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            ask(client)
+    assert client.stats()['circuit'] == 'open'
+
+    # Open: refused without a request reaching the upstream
+    with pytest.raises(CircuitOpenError):
+        ask(client)
+    assert len(upstream.requests) == 2
+    assert client.stats()['short_circuited'] == 1
+
+    time.sleep(0.35)
+    assert client.stats()['circuit'] == 'half_open'
+    upstream.queue(json_reply('Back'))
+    assert ask(client)['choices'][0]['message']['content'] == 'Back'
+    assert client.stats()['circuit'] == 'closed'
+    assert client.stats()['circuit_opened'] == 1
+
+
+def test_failed_half_open_trial_opens_the_breaker_again(upstream):
+    upstream.queue(json_reply(status=503), json_reply(status=503))
+    client = make_client(upstream, max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.3))
+
+    with pytest.raises(UpstreamError):
+        ask(client)
+    time.sleep(0.35)
+    assert client.stats()['circuit'] == 'half_open'
+
+    with pytest.raises(UpstreamError) as error:
+        ask(client)
+    assert not isinstance(error.value, CircuitOpenError)
+    assert client.stats()['circuit'] == 'open'
+    assert client.stats()['circuit_opened'] == 2
+    with pytest.raises(CircuitOpenError):
+        ask(client)
+    assert len(upstream.requests) == 2
+
+
+def test_half_open_lets_one_trial_through(upstream):
+    client = make_client(upstream, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.0))
+    client.breaker.record_failure()
+
+    assert client.breaker.allow()
+    assert not client.breaker.allow()
+    client.breaker.record_success()
+    assert client.breaker.allow()
+
+
+def test_read_timeout_raises_retryable_error(upstream):
+    upstream.queue(json_reply(delay=1.0))
+    client = make_client(upstream, read_timeout=0.2, max_retries=0)
+
+    started = time.monotonic()
+    with pytest.raises(UpstreamError) as error:
+        ask(client)
+
+    assert time.monotonic() - started < 0.8
+    assert error.value.retryable
+    assert client.stats()['in_flight'] == 0
+    assert client.stats()['failures'] == 1
+
+
+def test_timeout_bounds_the_whole_call_including_retries(upstream):
+    upstream.queue(*[json_reply(delay=1.0)] * 5)
+    client = make_client(upstream, read_timeout=0.3, max_retries=4, backoff=0.01)
+
+    started = time.monotonic()
+    with pytest.raises(UpstreamError):
+        ask(client, timeout=0.5)
+
+    assert time.monotonic() - started < 0.9
+    assert len(upstream.requests) < 5
+
+
+def test_stream_times_out_waiting_for_first_chunk(upstream):
+    upstream.queue(stream_reply(['Late'], delay=1.0))
+    client = make_client(upstream, max_retries=0)
+
+    started = time.monotonic()
+    with pytest.raises(UpstreamError):
+        list(ask(client, stream=True, timeout=0.3))
+
+    assert time.monotonic() - started < 0.8
+    assert client.stats()['in_flight'] == 0
+
+
+def test_stream_times_out_on_a_stalled_chunk(upstream):
+    upstream.queue(stream_reply(['An APR ', 'is...'], gap=1.0))
+    client = make_client(upstream, read_timeout=0.3, max_retries=0)
+
+    stream = ask(client, stream=True)
+    assert next(stream)['choices'][0]['delta']['content'] == 'An APR '
+    with pytest.raises(UpstreamError, match='interrupted'):
+        list(stream)
+    assert client.stats()['in_flight'] == 0
+
+
+def test_connections_are_reused_from_the_pool(upstream):
+    upstream.queue(json_reply(), stream_reply(['An APR ', 'is...']), json_reply(), json_reply())
+    client = make_client(upstream)
+
+    ask(client)
+    list(ask(client, stream=True))
+    ask(client)
+    ask(client)
+
+    assert len(upstream.connections) == 4
+    assert len(set(upstream.connections)) == 1
+
+
+def test_concurrent_calls_above_the_cap_are_rejected(upstream):
+    upstream.queue(stream_reply(['An APR ', 'is...'], gap=0.5))
+    client = make_client(upstream, max_in_flight=1, queue_timeout=0.05)
+
+    stream = ask(client, stream=True)
+    next(stream)
+    with pytest.raises(UpstreamError, match='Too many'):
+        ask(client)
+    stream.close()
+
+    assert client.stats()['rejected'] == 1
+    assert client.stats()['in_flight'] == 0
@@ -0,0 +1,43 @@
+"""
+Report cache keys: stable for the same applicant and model, different otherwise
+"""
+
+from reportCache import application_key
+
+APPLICATION = {
+    'person_age': 30, 'person_gender': 'female', 'person_education': 'Bachelor', 'person_income': 60000,
+    'person_emp_exp': 5, 'person_home_ownership': 'RENT', 'loan_amnt': 15000, 'loan_intent': 'EDUCATION',
+    'cb_person_cred_hist_length': 6, 'credit_score': 680, 'previous_loan_defaults_on_file': 'No'
+}
+FINGERPRINT = 'a' * 64
+
+
+def test_key_is_stable_across_field_order():
+    reordered = dict(reversed(list(APPLICATION.items())))
+
+    assert list(reordered) != list(APPLICATION)
+    assert application_key(reordered, FINGERPRINT) == application_key(APPLICATION, FINGERPRINT)
+
+
+def test_key_ignores_int_float_spelling_and_extra_fields():
+    as_floats = {k: float(v) if isinstance(v, int) else v for k, v in APPLICATION.items()}
+    with_extras = dict(APPLICATION, loan_percent_income=0.25, prediction_id='abc')
+
+    key = application_key(APPLICATION, FINGERPRINT)
+    assert application_key(as_floats, FINGERPRINT) == key
+    assert application_key(with_extras, FINGERPRINT) == key
+
+
+def test_key_changes_with_the_model_fingerprint():
+    assert application_key(APPLICATION, FINGERPRINT) != application_key(APPLICATION, 'b' * 64)
+
+
+def test_key_changes_with_any_application_field():
+    key = application_key(APPLICATION, FINGERPRINT)
+    changed = [
+        dict(APPLICATION, credit_score=681),
+        dict(APPLICATION, loan_intent='MEDICAL'),
+        dict(APPLICATION, previous_loan_defaults_on_file='Yes')
+    ]
+
+    assert len({application_key(application, FINGERPRINT) for application in changed} | {key}) == 4
@@ -0,0 +1,29 @@
+"""
+WSGI ENTRY POINT - Production serving
+Run with: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import gc
+import os
+
+from app import app, predictor
+from startupTiming import startup_timer
+
+# Preload health gate: with preload_app the master imports this module before
+# forking, so a failed model load stops the server before any worker takes traffic
+if predictor.model is None or predictor.encoder is None:
+    raise RuntimeError("Model and encoder failed to load; refusing to start workers")
+
+# Each worker gets its own cores, so keep XGBoost from spawning a thread per CPU
+# (model_params are applied again to every reloaded model version)
+predictor.model_params['n_jobs'] = int(os.environ.get('LOAN_MODEL_THREADS', '1'))
+predictor.model.set_params(**predictor.model_params)
+
+# Move everything loaded so far out of the collector's reach so workers don't
+# dirty the shared model pages (and copy them) just by running gc
+gc.collect()
+gc.freeze()
+
+startup_timer.report()
+
+application = app